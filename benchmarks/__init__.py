@@ -0,0 +1,7 @@
+# benchmarks/__init__.py
+"""Benchmarks for DBMindful's own cost against a local PostgreSQL.
+
+    python -m benchmarks --dsn "postgresql://postgres@localhost/bench?sslmode=disable" seed --relations 10000
+    python -m benchmarks --dsn ... run --output baseline.json
+    python -m benchmarks --dsn ... run --compare baseline.json --threshold 0.2
+"""
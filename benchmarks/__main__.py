@@ -0,0 +1,98 @@
+# benchmarks/__main__.py
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from config.settings import settings
+from benchmarks.seed import BENCH_SCHEMA, SchemaSeeder, Workload
+from benchmarks.suite import compare, load_results, run_benchmarks, save_results
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(prog='python -m benchmarks',
+                                     description="DBMindful collector and dashboard benchmarks")
+    parser.add_argument('--dsn', default=os.getenv('DATABASE_URL'),
+                        help="benchmark database, e.g. postgresql://postgres@localhost/bench?sslmode=disable")
+    parser.add_argument('--schema', default=BENCH_SCHEMA)
+    parser.add_argument('--log-level', default='INFO')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    seed = commands.add_parser('seed', help="create the synthetic schema and statement history")
+    seed.add_argument('--relations', type=int, default=1000, help="tables to create (each adds a pkey index)")
+    seed.add_argument('--hot-tables', type=int, default=100, help="tables that get rows and the workload")
+    seed.add_argument('--rows', type=int, default=1000, help="rows per hot table")
+    seed.add_argument('--statements', type=int, default=3000, help="distinct statements to run once each")
+    seed.add_argument('--clients', type=int, default=4)
+    seed.add_argument('--workload-seconds', type=float, default=10.0, help="workload to run after seeding")
+
+    commands.add_parser('drop', help="drop the synthetic schema")
+
+    run = commands.add_parser('run', help="run the suite and write a JSON result file")
+    run.add_argument('--repeat', type=int, default=5)
+    run.add_argument('--clients', type=int, default=4, help="background workload clients (0 = idle database)")
+    run.add_argument('--hot-tables', type=int, default=100, help="as passed to seed")
+    run.add_argument('--rows', type=int, default=1000, help="as passed to seed")
+    run.add_argument('--warmup', type=float, default=5.0, help="seconds of workload before measuring")
+    run.add_argument('--analyzer-statements', type=int, default=1000)
+    run.add_argument('--no-dashboard', action='store_true', help="skip the headless Dashboard renders")
+    run.add_argument('--output', help="result file (default: print to stdout)")
+    run.add_argument('--compare', metavar='BASELINE', help="fail if results regress against this file")
+    run.add_argument('--threshold', type=float, default=0.2, help="allowed relative regression (0.2 = 20%%)")
+
+    diff = commands.add_parser('compare', help="compare two result files")
+    diff.add_argument('baseline')
+    diff.add_argument('current')
+    diff.add_argument('--threshold', type=float, default=0.2)
+    return parser.parse_args()
+
+
+def report(baseline, current, threshold: float) -> int:
+    changes = compare(baseline, current, threshold)
+    regressions = [change for change in changes if change['regression']]
+    for change in changes:
+        if change['regression'] or abs(change['change']) > threshold:
+            flag = 'REGRESSION' if change['regression'] else 'improved' if change['change'] < 0 else 'noise'
+            print(f"{flag:>10}  {change['case']:<45} {change['metric']:<18} "
+                  f"{change['baseline']:>12.1f} -> {change['current']:>12.1f} ({change['change']:+.0%})")
+    print(f"{len(regressions)} regression(s) over {threshold:.0%} in {len(changes)} comparisons")
+    return 1 if regressions else 0
+
+
+def main():
+    args = parse_args()
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s %(levelname)s %(message)s")
+    if args.command == 'compare':
+        sys.exit(report(load_results(args.baseline), load_results(args.current), args.threshold))
+    if not args.dsn:
+        raise SystemExit("No database: pass --dsn or set DATABASE_URL")
+    settings.DATABASE_URL = args.dsn
+
+    seeder = SchemaSeeder(settings.db_params_for(args.dsn), schema=args.schema)
+    if args.command == 'seed':
+        seeder.seed(args.relations, args.hot_tables, args.rows)
+        ran = seeder.populate_statements(args.statements, args.relations)
+        if args.workload_seconds > 0:
+            workload = Workload(settings.db_params_for(args.dsn), clients=args.clients,
+                                hot_tables=args.hot_tables, rows=args.rows, schema=args.schema).start()
+            time.sleep(args.workload_seconds)
+            logging.info(f"Workload: {workload.stop():.0f} tps")
+        logging.info(f"Seeded {seeder.relation_count()} relations in {args.schema}, ran {ran} distinct statements")
+    elif args.command == 'drop':
+        seeder.drop()
+    else:
+        results = run_benchmarks(args.dsn, repeat=args.repeat, clients=args.clients, warmup=args.warmup,
+                                 hot_tables=args.hot_tables, rows=args.rows,
+                                 analyzer_statements=args.analyzer_statements,
+                                 dashboard=not args.no_dashboard, schema=args.schema)
+        if args.output:
+            save_results(results, args.output)
+        else:
+            print(json.dumps(results, indent=2, sort_keys=True, default=str))
+        if args.compare:
+            sys.exit(report(load_results(args.compare), results, args.threshold))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+# benchmarks/instrument.py
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from psycopg2 import extensions
+from typing import Dict, Iterator, Optional
+from core.tracing import TracingConnection
+
+
+class WireCounters:
+    """Connections, round trips, rows and COPY bytes seen by every CountingConnection"""
+
+    def __init__(self):
+        self.connections = 0
+        self.round_trips = 0
+        self.rows = 0
+        self.copy_bytes = 0
+        self._lock = threading.Lock()
+
+    def add(self, connections: int = 0, round_trips: int = 0, rows: int = 0, copy_bytes: int = 0):
+        with self._lock:
+            self.connections += connections
+            self.round_trips += round_trips
+            self.rows += max(rows, 0)
+            self.copy_bytes += copy_bytes
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return {'connections': self.connections, 'round_trips': self.round_trips,
+                    'rows': self.rows, 'copy_bytes': self.copy_bytes}
+
+
+counters = WireCounters()
+
+
+class CountingConnection(TracingConnection):
+    """Traced connection that also adds every statement to `counters`"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        counters.add(connections=1)
+
+    def _observe(self, query, start_ns: int, rows: int, nbytes: Optional[int] = None):
+        super()._observe(query, start_ns, rows, nbytes)
+        counters.add(round_trips=1, rows=rows, copy_bytes=nbytes or 0)
+
+    def commit(self):
+        in_transaction = self.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE
+        super().commit()
+        counters.add(round_trips=int(in_transaction))
+
+    def rollback(self):
+        in_transaction = self.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE
+        super().rollback()
+        counters.add(round_trips=int(in_transaction))
+
+
+@contextmanager
+def measure(trace_memory: bool = False) -> Iterator[Dict[str, float]]:
+    """Fill the yielded dict with wire counters and either wall time or peak traced memory.
+
+    tracemalloc slows allocation-heavy code several times over, so a pass
+    either times the block or traces its memory, never both.
+    """
+    result: Dict[str, float] = {}
+    tracing = tracemalloc.is_tracing()
+    if trace_memory:
+        if not tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        baseline_memory = tracemalloc.get_traced_memory()[0]
+    before = counters.snapshot()
+    started = time.perf_counter()
+    try:
+        yield result
+    finally:
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        after = counters.snapshot()
+        result.update({key: after[key] - before[key] for key in after})
+        if trace_memory:
+            peak = tracemalloc.get_traced_memory()[1]
+            if not tracing:
+                tracemalloc.stop()
+            result['peak_memory_kb'] = max(peak - baseline_memory, 0) / 1024
+        else:
+            result['wall_ms'] = elapsed_ms
@@ -0,0 +1,207 @@
+# benchmarks/seed.py
+import logging
+import random
+import threading
+import time
+import psycopg2
+from typing import Dict, List
+
+BENCH_SCHEMA = 'dbmindful_bench'
+
+# One DO block per step; COMMIT inside the loop keeps each transaction's lock
+# count bounded, so 100k relations don't exhaust max_locks_per_transaction
+CREATE_TABLES_SQL = """
+    DO $$
+    BEGIN
+        FOR i IN {start}..{end} LOOP
+            EXECUTE format(
+                'CREATE TABLE IF NOT EXISTS {schema}.%I (id int PRIMARY KEY, v int NOT NULL DEFAULT 0, payload text)',
+                't_' || lpad(i::text, 6, '0')
+            );
+            IF i % {batch} = 0 THEN
+                COMMIT;
+            END IF;
+        END LOOP;
+    END $$;
+"""
+
+FILL_TABLES_SQL = """
+    DO $$
+    BEGIN
+        FOR i IN 1..{tables} LOOP
+            EXECUTE format(
+                'INSERT INTO {schema}.%I SELECT g, g %% 100, md5(g::text) FROM generate_series(1, {rows}) g '
+                'ON CONFLICT DO NOTHING',
+                't_' || lpad(i::text, 6, '0')
+            );
+            EXECUTE format('ANALYZE {schema}.%I', 't_' || lpad(i::text, 6, '0'));
+            COMMIT;
+        END LOOP;
+    END $$;
+"""
+
+DROP_TABLES_SQL = """
+    DO $$
+    DECLARE
+        r record;
+        n int := 0;
+    BEGIN
+        FOR r IN SELECT tablename FROM pg_tables WHERE schemaname = '{schema}' LOOP
+            EXECUTE format('DROP TABLE {schema}.%I', r.tablename);
+            n := n + 1;
+            IF n % {batch} = 0 THEN
+                COMMIT;
+            END IF;
+        END LOOP;
+    END $$;
+"""
+
+# Statement shapes for pg_stat_statements; each table gives a distinct queryid
+STATEMENT_TEMPLATES = [
+    "SELECT v FROM {schema}.{table} WHERE id = %s",
+    "SELECT count(*) FROM {schema}.{table} WHERE v > %s",
+    "UPDATE {schema}.{table} SET v = v + 1 WHERE id = %s",
+]
+
+
+def table_name(i: int) -> str:
+    return f"t_{i:06d}"
+
+
+class SchemaSeeder:
+    """Creates (and drops) the synthetic benchmark schema"""
+
+    def __init__(self, connect_params: Dict, schema: str = BENCH_SCHEMA, batch: int = 250):
+        self.connect_params = connect_params
+        self.schema = schema
+        self.batch = batch
+
+    def _connect(self):
+        conn = psycopg2.connect(**self.connect_params)
+        # DO blocks may only COMMIT outside an explicit transaction
+        conn.autocommit = True
+        return conn
+
+    def seed(self, relations: int, hot_tables: int = 100, rows: int = 1000):
+        """Create `relations` tables (each with a primary key index); fill the first `hot_tables`"""
+        hot_tables = min(hot_tables, relations)
+        conn = self._connect()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(f"CREATE SCHEMA IF NOT EXISTS {self.schema}")
+                cur.execute(f"""
+                    CREATE TABLE IF NOT EXISTS {self.schema}.history (
+                        tid int, delta int, mtime timestamptz DEFAULT now()
+                    )
+                """)
+                for start in range(1, relations + 1, 10 * self.batch):
+                    end = min(start + 10 * self.batch - 1, relations)
+                    cur.execute(CREATE_TABLES_SQL.format(schema=self.schema, start=start, end=end,
+                                                         batch=self.batch))
+                    logging.info(f"Created tables {start}-{end} of {relations}")
+                cur.execute(FILL_TABLES_SQL.format(schema=self.schema, tables=hot_tables, rows=int(rows)))
+        finally:
+            conn.close()
+
+    def populate_statements(self, statements: int, relations: int) -> int:
+        """Run `statements` distinct statements once each; returns how many ran.
+
+        Top-level client statements, since pg_stat_statements (track = top)
+        ignores the ones issued inside DO blocks.
+        """
+        conn = self._connect()
+        count = 0
+        try:
+            with conn.cursor() as cur:
+                for count, (template, i) in enumerate(self.statement_shapes(statements, relations), 1):
+                    cur.execute(template.format(schema=self.schema, table=table_name(i)), (i % 100,))
+        finally:
+            conn.close()
+        return count
+
+    @staticmethod
+    def statement_shapes(statements: int, relations: int) -> List:
+        return [
+            (STATEMENT_TEMPLATES[n // relations], n % relations + 1)
+            for n in range(min(statements, relations * len(STATEMENT_TEMPLATES)))
+        ]
+
+    def relation_count(self) -> int:
+        conn = self._connect()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT count(*) FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace "
+                            "WHERE n.nspname = %s", (self.schema,))
+                return cur.fetchone()[0]
+        finally:
+            conn.close()
+
+    def drop(self):
+        conn = self._connect()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(DROP_TABLES_SQL.format(schema=self.schema, batch=self.batch))
+                cur.execute(f"DROP SCHEMA IF EXISTS {self.schema} CASCADE")
+        finally:
+            conn.close()
+
+
+class Workload:
+    """pgbench-style TPC-B-ish transactions from `clients` threads, until stop()"""
+
+    def __init__(self, connect_params: Dict, clients: int = 4, hot_tables: int = 100,
+                 rows: int = 1000, schema: str = BENCH_SCHEMA):
+        self.connect_params = connect_params
+        self.clients = clients
+        self.hot_tables = hot_tables
+        self.rows = rows
+        self.schema = schema
+        self.transactions = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._started = 0.0
+
+    def start(self) -> 'Workload':
+        self._started = time.monotonic()
+        for n in range(self.clients):
+            thread = threading.Thread(target=self._client, args=(n,), name=f"bench-client-{n}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self) -> float:
+        """Stop the clients and return the transactions per second they ran"""
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+        elapsed = time.monotonic() - self._started
+        return self.transactions / elapsed if elapsed else 0.0
+
+    def _client(self, n: int):
+        rng = random.Random(n)
+        try:
+            conn = psycopg2.connect(**self.connect_params)
+        except psycopg2.Error as e:
+            logging.error(f"Workload client {n} could not connect: {e}")
+            return
+        try:
+            while not self._stop.is_set():
+                table = f"{self.schema}.{table_name(rng.randint(1, self.hot_tables))}"
+                row, delta = rng.randint(1, self.rows), rng.randint(-5000, 5000)
+                try:
+                    with conn.cursor() as cur:
+                        cur.execute(f"UPDATE {table} SET v = v + %s WHERE id = %s", (delta, row))
+                        cur.execute(f"SELECT v FROM {table} WHERE id = %s", (row,))
+                        cur.execute(f"INSERT INTO {self.schema}.history (tid, delta) VALUES (%s, %s)",
+                                    (row, delta))
+                    conn.commit()
+                    with self._lock:
+                        self.transactions += 1
+                except psycopg2.Error:
+                    conn.rollback()
+                    with self._lock:
+                        self.errors += 1
+        finally:
+            conn.close()
@@ -0,0 +1,237 @@
+# benchmarks/suite.py
+import json
+import logging
+import platform
+import statistics
+import subprocess
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+from config.settings import settings
+from models.database import DatabaseConnection
+from models.result_cache import ResultCache
+from core.db_monitor import DBMonitor
+from core.query_analyzer import QueryAnalyzer
+from core.snapshot import SnapshotCollector
+from benchmarks.instrument import CountingConnection, measure
+from benchmarks.seed import BENCH_SCHEMA, SchemaSeeder, Workload, table_name
+
+# Headless dashboard: AppTest runs this script in-process, so the counting
+# pool installed by BenchmarkSuite is the one the dashboard uses
+DASHBOARD_SCRIPT = """
+from ui.dashboard import Dashboard
+Dashboard({dsn!r}).render()
+"""
+
+# Metrics compared against a baseline; lower is better except where noted
+COMPARED_METRICS = ('wall_ms', 'connections', 'round_trips', 'rows', 'copy_bytes', 'peak_memory_kb')
+HIGHER_IS_BETTER = ('queries_per_second',)
+# Differences below these never count as regressions (timer and allocator noise)
+NOISE_FLOOR = {'wall_ms': 2.0, 'peak_memory_kb': 256.0}
+
+
+class BenchmarkSuite:
+    """Times DBMonitor/DatabaseConnection calls, QueryAnalyzer and a headless Dashboard.
+
+    Every call runs `repeat` times against a cold result cache; wall time
+    is the median and wire counters come from the last run. Peak memory
+    comes from one more run under tracemalloc, kept out of the timings.
+    """
+
+    def __init__(self, dsn: str, repeat: int = 5, schema: str = BENCH_SCHEMA):
+        self.dsn = dsn
+        self.repeat = repeat
+        self.schema = schema
+        self.results: Dict[str, Dict[str, float]] = {}
+        # Must run before anything else touches the pool for this DSN
+        DatabaseConnection.get_pool(dsn, connection_factory=CountingConnection)
+        self.db_monitor = DBMonitor(dsn)
+
+    def method_cases(self) -> List[Tuple[str, Callable]]:
+        monitor, dsn = self.db_monitor, self.dsn
+        cases = [
+            ('DatabaseConnection.get_basic_stats', lambda: DatabaseConnection.get_basic_stats(dsn)),
+            ('DatabaseConnection.setup_monitoring', lambda: DatabaseConnection.setup_monitoring(dsn)),
+            ('DatabaseConnection.test_connection', lambda: DatabaseConnection.test_connection(dsn)),
+            ('DBMonitor.get_monitoring_status', monitor.get_monitoring_status),
+            ('DBMonitor.check_monitoring_prerequisites', monitor.check_monitoring_prerequisites),
+            ('DBMonitor.get_heavy_queries', monitor.get_heavy_queries),
+            ('DBMonitor.get_workload_statements', monitor.get_workload_statements),
+            ('DBMonitor.get_table_stats', monitor.get_table_stats),
+            ('DBMonitor.get_table_stats[search]', lambda: monitor.get_table_stats(search=f"{self.schema}.t_0001")),
+            ('DBMonitor.get_table_stats[page2]', self._second_table_page),
+            ('DBMonitor.get_table_stats[rollup]', lambda: monitor.get_table_stats(rollup_partitions=True)),
+            ('DBMonitor.get_index_usage', monitor.get_index_usage),
+            ('DBMonitor.get_index_usage[by_size]', lambda: monitor.get_index_usage(sort='index_size_bytes')),
+            ('SnapshotCollector.collect', SnapshotCollector(dsn).collect),
+            # What the guarded collector reads per sample at 1/4 of relations
+            ('SnapshotCollector.collect[subset]', lambda: SnapshotCollector(dsn).collect(subset=(4, 0))),
+        ]
+        if monitor.has_pg_stat_statements():
+            cases.append(('DBMonitor.get_statement_counters', monitor.get_statement_counters))
+        return cases
+
+    def _second_table_page(self):
+        first = self.db_monitor.get_table_stats()
+        return self.db_monitor.get_table_stats(after=DBMonitor.next_page_after(first, 'row_count'))
+
+    def run_case(self, name: str, call: Callable, cold: bool = True) -> Dict[str, float]:
+        runs = []
+        for _ in range(self.repeat):
+            if cold:
+                ResultCache.for_dsn(self.dsn).invalidate()
+            with measure() as result:
+                call()
+            runs.append(result)
+        if cold:
+            ResultCache.for_dsn(self.dsn).invalidate()
+        with measure(trace_memory=True) as memory:
+            call()
+        summary = dict(runs[-1])
+        summary['wall_ms'] = statistics.median(run['wall_ms'] for run in runs)
+        summary['wall_ms_min'] = min(run['wall_ms'] for run in runs)
+        summary['peak_memory_kb'] = memory['peak_memory_kb']
+        self.results[name] = summary
+        logging.info(f"{name}: {summary['wall_ms']:.1f} ms, {summary['round_trips']} round trips, "
+                     f"{summary['rows']} rows")
+        return summary
+
+    def run_methods(self):
+        for name, call in self.method_cases():
+            self.run_case(name, call)
+        # What every session after the first pays within the TTL
+        self.db_monitor.get_table_stats()
+        self.run_case('DBMonitor.get_table_stats[cached]', self.db_monitor.get_table_stats, cold=False)
+
+    def run_query_analyzer(self, statements: int = 1000):
+        """Throughput of uncached QueryAnalyzer parsing over workload-like statement texts"""
+        texts = self._statement_texts(statements)
+        analyzer = QueryAnalyzer()
+
+        def analyze_all():
+            for text in texts:
+                analyzer._analyze_query(text)
+
+        summary = self.run_case('QueryAnalyzer.analyze_query', analyze_all, cold=False)
+        summary['statements'] = len(texts)
+        summary['queries_per_second'] = len(texts) / (summary['wall_ms'] / 1000) if summary['wall_ms'] else 0.0
+
+    def _statement_texts(self, statements: int) -> List[str]:
+        try:
+            texts = self.db_monitor.get_workload_statements()['query'].dropna().tolist()
+        except Exception as e:
+            logging.warning(f"Using synthetic statements for QueryAnalyzer: {e}")
+            texts = []
+        if len(texts) < statements:
+            texts += [
+                template.replace('%s', str(i)).format(schema=self.schema, table=table_name(i))
+                for template, i in SchemaSeeder.statement_shapes(statements - len(texts), max(statements, 1))
+            ]
+        return texts[:statements]
+
+    def run_dashboard(self):
+        """Headless end-to-end render: first load, then each panel on its own"""
+        from streamlit.testing.v1 import AppTest
+        from ui.dashboard import PANELS
+        script = DASHBOARD_SCRIPT.format(dsn=self.dsn)
+        try:
+            app = AppTest.from_string(script, default_timeout=120)
+            with measure() as result:
+                app.run()
+            self._check_app(app)
+            # Memory of a first render, traced on a second fresh session
+            ResultCache.for_dsn(self.dsn).invalidate()
+            with measure(trace_memory=True) as memory:
+                AppTest.from_string(script, default_timeout=120).run()
+            self.results['Dashboard.render[first]'] = {**result, 'peak_memory_kb': memory['peak_memory_kb']}
+            for label, name in PANELS.items():
+                app.session_state['dashboard_panel'] = label
+
+                def render(app=app):
+                    app.run()
+                self.run_case(f"Dashboard.render[{name}]", render, cold=False)
+                self._check_app(app)
+        finally:
+            from core.sampler import MetricsSampler
+            from core.ash import ActiveSessionHistory
+            MetricsSampler.stop_dsn(self.dsn)
+            ActiveSessionHistory.stop_dsn(self.dsn)
+
+    @staticmethod
+    def _check_app(app):
+        if app.exception:
+            raise RuntimeError(f"Dashboard raised: {app.exception[0].value}")
+
+    def metadata(self, workload_tps: Optional[float] = None) -> Dict:
+        with DatabaseConnection.get_connection(self.dsn) as conn:
+            with conn.cursor() as cur:
+                cur.execute("SHOW server_version;")
+                server_version = cur.fetchone()[0]
+                cur.execute("SELECT count(*) FROM pg_class")
+                relations = cur.fetchone()[0]
+        try:
+            commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                    text=True, timeout=10).stdout.strip() or None
+        except (OSError, subprocess.SubprocessError):
+            commit = None
+        return {
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'commit': commit,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'server_version': server_version,
+            'relations': relations,
+            'pg_stat_statements': self.db_monitor.has_pg_stat_statements(),
+            'repeat': self.repeat,
+            'workload_tps': workload_tps,
+        }
+
+
+def run_benchmarks(dsn: str, repeat: int = 5, clients: int = 4, warmup: float = 5.0,
+                   hot_tables: int = 100, rows: int = 1000, analyzer_statements: int = 1000,
+                   dashboard: bool = True, schema: str = BENCH_SCHEMA) -> Dict:
+    """Run the whole suite, under a background workload when clients > 0"""
+    suite = BenchmarkSuite(dsn, repeat=repeat, schema=schema)
+    workload = None
+    if clients:
+        workload = Workload(settings.db_params_for(dsn), clients=clients, hot_tables=hot_tables,
+                            rows=rows, schema=schema).start()
+        time.sleep(warmup)
+    try:
+        suite.run_methods()
+        suite.run_query_analyzer(analyzer_statements)
+        if dashboard:
+            suite.run_dashboard()
+    finally:
+        tps = workload.stop() if workload else None
+    return {'meta': suite.metadata(tps), 'results': suite.results}
+
+
+def compare(baseline: Dict, current: Dict, threshold: float = 0.2) -> List[Dict]:
+    """Changes between two result files; `regression` marks those past `threshold`"""
+    changes = []
+    for name, now in current['results'].items():
+        before = baseline['results'].get(name)
+        if before is None:
+            continue
+        for metric in COMPARED_METRICS + HIGHER_IS_BETTER:
+            if metric not in now or metric not in before:
+                continue
+            old, new = float(before[metric]), float(now[metric])
+            worse = old - new if metric in HIGHER_IS_BETTER else new - old
+            ratio = worse / old if old else (float('inf') if worse > 0 else 0.0)
+            changes.append({
+                'case': name, 'metric': metric, 'baseline': old, 'current': new, 'change': ratio,
+                'regression': ratio > threshold and worse > NOISE_FLOOR.get(metric, 0.0),
+            })
+    return changes
+
+
+def load_results(path: str) -> Dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_results(results: Dict, path: str):
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True, default=str)
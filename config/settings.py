@@ -1,32 +1,196 @@
-# config/settings.py
-from pydantic import BaseModel
-from typing import Optional
-from urllib.parse import urlparse
-import streamlit as st
-
-class Settings(BaseModel):
-    DATABASE_URL: Optional[str] = None
-    GROQ_API_KEY: str = st.secrets["GROQ_API_KEY"]
-    
-    @property
-    def db_params(self):
-        if not self.DATABASE_URL:
-            raise ValueError("Database URL not set")
-            
-        url = urlparse(self.DATABASE_URL)
-        return {
-            'dbname': url.path[1:],  # Remove leading '/'
-            'user': url.username,
-            'password': url.password,
-            'host': url.hostname,
-            'port': url.port or 5432,
-            'sslmode': 'require'  # Required for Neon.tech
-        }
-    
-    # Redis settings (optional for caching)
-    # REDIS_HOST: str = os.getenv('REDIS_HOST', 'localhost')
-    # REDIS_PORT: int = int(os.getenv('REDIS_PORT', 6379))    
-
-settings = Settings()
-
-
+# config/settings.py
+import os
+from pydantic import BaseModel
+from typing import Dict, Optional
+from urllib.parse import parse_qsl, urlparse
+
+class Settings(BaseModel):
+    DATABASE_URL: Optional[str] = None
+    # Resolved lazily (see groq_api_key) so headless runs don't need st.secrets
+    GROQ_API_KEY: Optional[str] = os.getenv("GROQ_API_KEY")
+
+    # Connection pool settings (one pool per DSN, shared by all sessions)
+    DB_POOL_MAX_SIZE: int = 8
+    DB_POOL_ACQUIRE_TIMEOUT: float = 10.0  # seconds to wait for a free connection
+    DB_POOL_IDLE_TIMEOUT: float = 300.0  # idle connections older than this are closed
+    DB_POOL_HEALTHCHECK_AFTER: float = 30.0  # ping connections idle longer than this
+    DB_CONNECT_TIMEOUT: int = 10  # seconds, so an unreachable host fails fast
+
+    # Bulk reads (DatabaseConnection.read_frame/read_chunks) stream COPY output
+    COPY_SPOOL_MAX_BYTES: int = 64 * 1024 ** 2  # buffered in memory, then on disk
+    COPY_CHUNK_ROWS: int = 100_000
+
+    # Fleet mode: named targets from the [targets] section of secrets.toml
+    FLEET_MAX_WORKERS: int = 8  # concurrent collections across all targets
+    FLEET_COLLECT_TIMEOUT: float = 20.0  # seconds one target's collection may take
+
+    # Every connection is tagged, so DBMindful's own sessions are easy to spot
+    # (and exclude) in pg_stat_activity and server logs
+    APPLICATION_NAME: str = "dbmindful"
+
+    # Guarded collector mode for busy primaries: short statement/lock
+    # timeouts on the sampler's own queries (interactive pages, EXPLAIN
+    # ANALYZE and the advisors keep theirs), sizes read from a standby when
+    # one is configured, and a sampler that backs off (longer intervals, then
+    # a rotating subset of relations per sample, slower session sampling,
+    # no plan capture) while collecting costs more than its budget or times out
+    COLLECTOR_GUARDED: bool = False
+    GUARDED_STATEMENT_TIMEOUT: float = 5.0  # seconds
+    GUARDED_LOCK_TIMEOUT: float = 0.1  # seconds; catalog locks are never waited on
+    GUARDED_COST_BUDGET: float = 0.01  # collection time as a share of the interval
+    GUARDED_MAX_LEVEL: int = 6  # backoff steps: x2 interval, then 1/2 relations, ...
+    GUARDED_RELAX_AFTER: int = 3  # samples well under budget before stepping back
+    # Primary DSN -> physical standby DSN; also the [standbys] secrets section
+    # (target name = "postgresql://...") and exporter.py --standby
+    STANDBY_URLS: Dict[str, str] = {}
+
+    # Background sampler settings (one sampler per DSN, run by a shared worker pool)
+    SAMPLER_INTERVAL: float = 30.0  # seconds between samples
+    SAMPLER_JITTER: float = 0.1  # +/- fraction of the interval
+    SAMPLER_HISTORY_SIZE: int = 120  # snapshots kept in memory
+
+    # Table and index statistics: filtering, top-N and keyset pages run in SQL
+    SNAPSHOT_MAX_RELATIONS: int = 500  # tables/indexes carried by each sample
+    STATS_PAGE_SIZE: int = 50  # rows per page in the statistics tables
+    CHART_MAX_CATEGORIES: int = 10  # chart slices/bars before the rest become "other"
+
+    # Results of DBMonitor/DatabaseConnection calls shared by all sessions on
+    # a DSN: seconds each method's result is reused (0 or missing = always query)
+    RESULT_CACHE_TTLS: Dict[str, float] = {
+        'capabilities': 600.0,  # pg_stat_statements installed, setup_monitoring
+        'prerequisites': 300.0,
+        'monitoring_status': 30.0,
+        'basic_stats': 30.0,
+        'heavy_queries': 10.0,
+        'workload_statements': 60.0,
+        'table_stats': 30.0,
+        'index_usage': 30.0,
+    }
+
+    # Dashboard panels are fragments that rerun on their own; seconds between
+    # refreshes from the latest sample (0 = only when a panel widget is used)
+    PANEL_REFRESH_SECONDS: Dict[str, float] = {
+        'query_analysis': 30.0,
+        'session_activity': 5.0,
+        'table_analysis': 60.0,
+        'index_analysis': 60.0,
+        'trends': 300.0,
+        'diagnostics': 0.0,
+    }
+
+    # Self-instrumentation: timing spans kept in memory for the Diagnostics
+    # panel (open the dashboard with ?diagnostics=1) and Chrome trace export
+    TRACING_ENABLED: bool = True
+    TRACE_BUFFER_SPANS: int = 20000
+
+    # Active session history: 1 Hz pg_stat_activity samples on a dedicated connection
+    ASH_ENABLED: bool = True
+    ASH_INTERVAL: float = 1.0  # seconds between session samples
+    ASH_BUFFER_SIZE: int = 100_000  # session samples kept in memory
+
+    # On-disk history (SQLite) with raw -> 1 min -> 1 h rollups
+    HISTORY_ENABLED: bool = True
+    HISTORY_DB_PATH: str = ".dbmindful/history.sqlite3"
+    HISTORY_RAW_RETENTION_HOURS: float = 24
+    HISTORY_MINUTE_RETENTION_DAYS: float = 7
+    HISTORY_HOUR_RETENTION_DAYS: float = 90
+    HISTORY_MAX_RELATIONS: int = 500  # tables/indexes recorded per sample
+
+    # AI analysis cache (in-memory LRU + SQLite), shared by all sessions
+    AI_CACHE_ENABLED: bool = True
+    AI_CACHE_PATH: str = ".dbmindful/ai_cache.sqlite3"
+    AI_CACHE_TTL_HOURS: float = 168
+    AI_CACHE_MEMORY_ENTRIES: int = 256
+    AI_CACHE_MAX_DISK_MB: float = 50
+
+    # AI API client (OpenAI-compatible chat completions endpoint)
+    AI_BASE_URL: str = "https://api.groq.com/openai/v1/chat/completions"
+    AI_CONNECT_TIMEOUT: float = 5.0
+    AI_READ_TIMEOUT: float = 60.0
+    AI_MAX_RETRIES: int = 4  # on 429, 5xx and connection errors
+    AI_BACKOFF_BASE: float = 1.0  # seconds, doubled on each retry
+    AI_BACKOFF_MAX: float = 30.0
+    AI_REQUESTS_PER_MINUTE: float = 30  # client-side token bucket; 0 disables it
+    AI_BATCH_CONCURRENCY: int = 4
+
+    # Plan capture (EXPLAIN); ANALYZE runs are rolled back and bounded by this
+    PLAN_STATEMENT_TIMEOUT: float = 10.0  # seconds
+
+    # Plan history: the sampler EXPLAINs the heaviest statements and alerts
+    # when a new plan shape comes with a jump in mean execution time
+    PLAN_TRACKING_ENABLED: bool = True
+    PLAN_CAPTURE_INTERVAL: float = 300.0  # seconds between capture rounds
+    PLAN_CAPTURE_TOP_N: int = 5
+    PLAN_REGRESSION_FACTOR: float = 1.5  # new mean / previous plan's mean
+    PLAN_REGRESSION_MIN_MS: float = 1.0  # ignore jumps smaller than this
+
+    # Index advisor
+    ADVISOR_MAX_STATEMENTS: int = 500  # heaviest statements considered
+    ADVISOR_MIN_TABLE_ROWS: float = 10_000  # smaller tables are fine with seq scans
+    ADVISOR_MAX_COLUMNS: int = 3
+    ADVISOR_MAX_SELECTIVITY: float = 0.2  # above this an index rarely beats a seq scan
+    ADVISOR_HYPOPG_CANDIDATES: int = 10  # top candidates re-checked with hypopg
+
+    # Index health (IndexHealth)
+    INDEX_HEALTH_WINDOW_DAYS: float = 30  # recorded history used for scan counts
+    INDEX_SCAN_CHECK_INTERVAL: float = 3600  # seconds between checks of every index's scan counter
+    INDEX_UNUSED_MAX_SCANS: int = 0  # at or below this an index counts as unused
+    INDEX_UNUSED_MIN_DAYS: float = 7  # evidence needed before calling an index unused
+
+    # Bloat estimation (BloatEstimator)
+    BLOAT_MIN_BYTES: float = 10 * 1024 ** 2  # smaller bloat is not worth a rewrite
+    BLOAT_MIN_RATIO: float = 0.3  # share of the relation that is bloat
+
+    # Headless exporter (exporter.py)
+    EXPORTER_PORT: int = 9187
+    EXPORTER_MAX_STATEMENTS: int = 100  # queryid label values per target; the rest become "__other__"
+    EXPORTER_MAX_TABLES: int = 200
+    EXPORTER_MAX_INDEXES: int = 200
+
+    @property
+    def groq_api_key(self) -> Optional[str]:
+        """GROQ_API_KEY from the environment, else from st.secrets when available"""
+        if self.GROQ_API_KEY:
+            return self.GROQ_API_KEY
+        try:
+            # Imported here so the headless exporter runs without the UI package
+            import streamlit as st
+            return st.secrets.get("GROQ_API_KEY")
+        except Exception:
+            # No streamlit or secrets.toml, e.g. when running headless
+            return None
+
+    @property
+    def db_params(self):
+        return self.db_params_for(self.DATABASE_URL)
+
+    def db_params_for(self, database_url: Optional[str]) -> dict:
+        if not database_url:
+            raise ValueError("Database URL not set")
+            
+        url = urlparse(database_url)
+        params = {
+            'dbname': url.path[1:],  # Remove leading '/'
+            'user': url.username,
+            'password': url.password,
+            'host': url.hostname,
+            'port': url.port or 5432,
+            'sslmode': 'require',  # Required for Neon.tech
+            'connect_timeout': self.DB_CONNECT_TIMEOUT,
+            'application_name': self.APPLICATION_NAME,
+        }
+        # libpq parameters in the query string win, e.g. ?sslmode=disable&host=/tmp
+        params.update(parse_qsl(url.query))
+        return params
+
+    def standby_for(self, database_url: Optional[str]) -> Optional[str]:
+        """Standby DSN configured for a primary, if any"""
+        return self.STANDBY_URLS.get(database_url or self.DATABASE_URL or '')
+    
+    # Redis settings (optional for caching)
+    # REDIS_HOST: str = os.getenv('REDIS_HOST', 'localhost')
+    # REDIS_PORT: int = int(os.getenv('REDIS_PORT', 6379))    
+
+settings = Settings()
+
+
@@ -0,0 +1,155 @@
+# core/ai_cache.py
+import hashlib
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+import logging
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from config.settings import settings
+from core.fingerprint import normalize_query
+
+
+class AnalysisCache:
+    """Two-tier cache for AI analyses: in-memory LRU in front of a SQLite file.
+
+    Entries are content-addressed by the normalized query, model, prompt
+    template version and a bucketed execution time, so the same statement
+    analyzed by any session is answered without calling the API again.
+    """
+
+    _instances: Dict[str, 'AnalysisCache'] = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, path: str, ttl_seconds: float = 7 * 24 * 3600,
+                 max_memory_entries: int = 256, max_disk_bytes: int = 50 * 1024 * 1024):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_bytes = max_disk_bytes
+        self._memory: 'OrderedDict[str, Tuple[Dict, float]]' = OrderedDict()  # key -> (value, expires_at)
+        self._lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        with self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS ai_cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    expires_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS ai_cache_last_access ON ai_cache (last_access)")
+
+    @classmethod
+    def shared(cls, path: Optional[str] = None) -> 'AnalysisCache':
+        """Return the process-wide cache, shared by all Streamlit sessions"""
+        path = path or settings.AI_CACHE_PATH
+        with cls._instances_lock:
+            if path not in cls._instances:
+                cls._instances[path] = cls(
+                    path,
+                    ttl_seconds=settings.AI_CACHE_TTL_HOURS * 3600,
+                    max_memory_entries=settings.AI_CACHE_MEMORY_ENTRIES,
+                    max_disk_bytes=settings.AI_CACHE_MAX_DISK_MB * 1024 * 1024
+                )
+            return cls._instances[path]
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        """Literal-free form of a query, so statements differing only in constants share entries"""
+        return normalize_query(query)
+
+    @staticmethod
+    def execution_time_bucket(execution_time: Optional[float]) -> str:
+        """Power-of-two buckets, so small timing jitter still hits the cache"""
+        if execution_time is None:
+            return 'none'
+        return str(int(math.log2(max(float(execution_time), 1.0))))
+
+    @classmethod
+    def make_key(cls, query: str, model: str, template_version: str,
+                 execution_time: Optional[float] = None, context: str = '') -> str:
+        """`context` is any extra prompt input (e.g. a plan summary) the answer depends on"""
+        parts = [cls.normalize(query), model, template_version, cls.execution_time_bucket(execution_time)]
+        if context:
+            parts.append(context)
+        return hashlib.sha256('\x1f'.join(parts).encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict]:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    return value
+                del self._memory[key]
+
+            try:
+                row = self._conn.execute(
+                    "SELECT value, expires_at FROM ai_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    return None
+                if row[1] <= now:
+                    with self._conn:
+                        self._conn.execute("DELETE FROM ai_cache WHERE key = ?", (key,))
+                    return None
+                with self._conn:
+                    self._conn.execute("UPDATE ai_cache SET last_access = ? WHERE key = ?", (now, key))
+                value = json.loads(row[0])
+            except sqlite3.Error as e:
+                logging.error(f"Error reading AI cache: {e}")
+                return None
+
+            self._remember(key, value, row[1])
+            return value
+
+    def put(self, key: str, value: Dict):
+        now = time.time()
+        expires_at = now + self.ttl_seconds
+        payload = json.dumps(value)
+        with self._lock:
+            self._remember(key, value, expires_at)
+            try:
+                with self._conn:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO ai_cache (key, value, size, expires_at, last_access) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        (key, payload, len(payload), expires_at, now)
+                    )
+                    self._evict_disk(now)
+            except sqlite3.Error as e:
+                logging.error(f"Error writing AI cache: {e}")
+
+    def _remember(self, key: str, value: Dict, expires_at: float):
+        self._memory[key] = (value, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _evict_disk(self, now: float):
+        """Drop expired entries, then least recently used ones until under the size cap"""
+        self._conn.execute("DELETE FROM ai_cache WHERE expires_at <= ?", (now,))
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM ai_cache").fetchone()[0]
+        if total <= self.max_disk_bytes:
+            return
+        # Oldest entries until the bytes they free cover the excess
+        self._conn.execute("""
+            DELETE FROM ai_cache WHERE key IN (
+                SELECT key FROM (
+                    SELECT key, SUM(size) OVER (ORDER BY last_access, key) - size AS freed_before
+                    FROM ai_cache
+                ) WHERE freed_before < ?
+            )
+        """, (total - self.max_disk_bytes,))
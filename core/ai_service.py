@@ -1,78 +1,334 @@
-# core/ai_service.py
-import requests
-from typing import Dict, Optional
-from config.settings import settings
-
-class AIService:
-    def __init__(self, api_key: str = settings.GROQ_API_KEY):
-        self.api_key = api_key
-        self.base_url = "https://api.groq.com/openai/v1/chat/completions"
-                      
-
-    def analyze_query(self, query: str, execution_time: Optional[float] = None) -> Dict:
-        """Basic query analysis using GROQ AI"""
-        prompt = f"""Analizza questa query SQL e suggerisci ottimizzazioni:
-        {query}
-        """
-        return self._call_groq(prompt)
-
-    def deep_analyze_query(self, query: str, execution_time: Optional[float] = None) -> Dict:
-        """Provides a deep, detailed analysis of a SQL query"""
-        context = f"\nTempo di esecuzione: {execution_time}ms" if execution_time else ""
-        
-        prompt = f"""Effettua un'analisi approfondita di questa query SQL:{context}
-
-```sql
-{query}
-```
-
-Fornisci un'analisi dettagliata che copra:
-
-1. ANALISI STRUTTURALE:
-- Tipo di query e operazioni principali
-- Complessità delle join e loro impatto
-- Qualità delle condizioni di filtro
-
-2. PERFORMANCE:
-- Potenziali colli di bottiglia
-- Suggerimenti per gli indici
-- Ottimizzazioni del piano di esecuzione
-
-3. SUGGERIMENTI PRATICI:
-- Riscrittura della query (se applicabile)
-- Modifiche strutturali consigliate
-- Best practices PostgreSQL specifiche
-
-Organizza la risposta in sezioni chiare e fornisci esempi concreti dove possibile."""
-
-        return self._call_groq(prompt)
-
-    def _call_groq(self, prompt: str) -> Dict:
-        """Make API call to GROQ"""
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
-        
-        data = {
-            "model": "mixtral-8x7b-32768",
-            "messages": [
-                {
-                    "role": "system",
-                    "content": "Sei un esperto DBA PostgreSQL che analizza e ottimizza query SQL."
-                },
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ],
-            "temperature": 0.7,
-            "max_tokens": 2000
-        }
-        
-        try:
-            response = requests.post(self.base_url, headers=headers, json=data)
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            return {"error": str(e)}
\ No newline at end of file
+# core/ai_service.py
+import json
+import random
+import re
+import threading
+import time
+import logging
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from requests.adapters import HTTPAdapter
+from typing import Dict, Iterator, List, Optional, Sequence
+from config.settings import settings
+from core.ai_cache import AnalysisCache
+from core.tracing import annotate, record, traced
+
+# Statuses worth retrying: rate limited, or a transient server-side failure
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """Seconds from a retry-after / x-ratelimit-reset-* header.
+
+    Accepts plain seconds ("7"), Go-style durations ("2m59.56s", "500ms")
+    and HTTP dates.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    parts = _DURATION_RE.findall(value)
+    if parts:
+        return sum(float(number) * _DURATION_UNITS[unit] for number, unit in parts)
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` requests per second, bursts up to `capacity`.
+
+    A rate of 0 means no client-side limit. pause() stops all callers until
+    a point in time, for when the server reports the rate limit as exhausted.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        if rate < 0:
+            raise ValueError(f"Token bucket rate must be >= 0, got {rate}")
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if now >= self._paused_until and (self.rate == 0 or self._tokens >= 1):
+                    if self.rate:
+                        self._tokens -= 1
+                    return
+                wait = self._paused_until - now
+                if self.rate:
+                    wait = max(wait, (1 - self._tokens) / self.rate)
+            time.sleep(wait)
+
+    def pause(self, seconds: float):
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+class AIService:
+    MODEL = "mixtral-8x7b-32768"
+
+    # Bump when a prompt template changes so cached analyses are not reused
+    ANALYZE_PROMPT_VERSION = "analyze-1"
+    DEEP_ANALYZE_PROMPT_VERSION = "deep-1"
+
+    # Keep-alive sessions and rate limiters are per endpoint and shared by
+    # every AIService instance, so Streamlit reruns reuse TLS connections
+    _sessions: Dict[str, requests.Session] = {}
+    _rate_limiters: Dict[str, TokenBucket] = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, api_key: Optional[str] = None, cache: Optional[AnalysisCache] = None,
+                 base_url: Optional[str] = None, rate_limiter: Optional[TokenBucket] = None):
+        self.api_key = api_key or settings.groq_api_key
+        self.base_url = base_url or settings.AI_BASE_URL
+        self.cache = cache if cache is not None else (
+            AnalysisCache.shared() if settings.AI_CACHE_ENABLED else None
+        )
+        self.timeout = (settings.AI_CONNECT_TIMEOUT, settings.AI_READ_TIMEOUT)
+        self.max_retries = settings.AI_MAX_RETRIES
+
+        with self._shared_lock:
+            if self.base_url not in self._sessions:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_maxsize=max(settings.AI_BATCH_CONCURRENCY, 1))
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                self._sessions[self.base_url] = session
+            if self.base_url not in self._rate_limiters:
+                self._rate_limiters[self.base_url] = TokenBucket(
+                    settings.AI_REQUESTS_PER_MINUTE / 60.0,
+                    capacity=max(settings.AI_BATCH_CONCURRENCY, 1)
+                )
+            self.session = self._sessions[self.base_url]
+            self.rate_limiter = rate_limiter or self._rate_limiters[self.base_url]
+
+    @traced('ai')
+    def analyze_query(self, query: str, execution_time: Optional[float] = None) -> Dict:
+        """Basic query analysis using GROQ AI"""
+        prompt = f"""Analizza questa query SQL e suggerisci ottimizzazioni:
+        {query}
+        """
+        return self._cached_call(prompt, query, self.ANALYZE_PROMPT_VERSION)
+
+    @traced('ai')
+    def deep_analyze_query(self, query: str, execution_time: Optional[float] = None,
+                           plan_summary: Optional[str] = None) -> Dict:
+        """Provides a deep, detailed analysis of a SQL query"""
+        prompt = self._deep_analysis_prompt(query, execution_time, plan_summary)
+        return self._cached_call(prompt, query, self.DEEP_ANALYZE_PROMPT_VERSION, execution_time,
+                                 context=plan_summary or '')
+
+    def stream_deep_analyze_query(self, query: str, execution_time: Optional[float] = None,
+                                  plan_summary: Optional[str] = None, check_cache: bool = True) -> Iterator[str]:
+        """Deep analysis as a stream of text chunks (SSE), for progressive rendering.
+
+        A cached analysis is yielded in one piece (pass check_cache=False when
+        cached_deep_analysis() was just consulted); a stream the server completed
+        ([DONE] or a finish_reason) is written to the cache in the same shape
+        deep_analyze_query() returns.
+        """
+        # Timed by hand: a with-block span would stay open across the consumer's code
+        started = time.perf_counter_ns()
+        key = self._deep_analysis_key(query, execution_time, plan_summary)
+        cached = self.cache.get(key) if self.cache is not None and check_cache else None
+        if cached is not None:
+            record('AIService.stream_deep_analyze_query', 'ai', started, cache='hit')
+            yield cached['choices'][0]['message']['content']
+            return
+
+        data = self._request_body(self._deep_analysis_prompt(query, execution_time, plan_summary))
+        data['stream'] = True
+        parts = []
+        complete = False
+        response = self._post(data, stream=True)
+        response.encoding = 'utf-8'  # SSE is always UTF-8, whatever the headers say
+        try:
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith('data:'):
+                    continue
+                payload = line[len('data:'):].strip()
+                if payload == '[DONE]':
+                    complete = True
+                    break
+                choices = json.loads(payload).get('choices') or [{}]
+                chunk = (choices[0].get('delta') or {}).get('content')
+                if chunk:
+                    parts.append(chunk)
+                    yield chunk
+                if choices[0].get('finish_reason'):
+                    complete = True
+        finally:
+            response.close()
+            record('AIService.stream_deep_analyze_query', 'ai', started, cache='miss',
+                   bytes=sum(len(part.encode()) for part in parts))
+
+        # Not reached when the consumer stopped early; a dropped connection
+        # ends iter_lines() without [DONE] and leaves a truncated analysis
+        if self.cache is not None and parts and complete:
+            self.cache.put(key, {
+                'model': self.MODEL,
+                'choices': [{'message': {'role': 'assistant', 'content': ''.join(parts)}}]
+            })
+
+    def cached_deep_analysis(self, query: str, execution_time: Optional[float] = None,
+                             plan_summary: Optional[str] = None) -> Optional[Dict]:
+        if self.cache is None:
+            return None
+        return self.cache.get(self._deep_analysis_key(query, execution_time, plan_summary))
+
+    def _deep_analysis_key(self, query: str, execution_time: Optional[float] = None,
+                           plan_summary: Optional[str] = None) -> str:
+        return AnalysisCache.make_key(query, self.MODEL, self.DEEP_ANALYZE_PROMPT_VERSION, execution_time,
+                                      context=plan_summary or '')
+
+    def _deep_analysis_prompt(self, query: str, execution_time: Optional[float] = None,
+                              plan_summary: Optional[str] = None) -> str:
+        context = f"\nTempo di esecuzione: {execution_time}ms" if execution_time else ""
+        if plan_summary:
+            context += f"\n\nPiano di esecuzione (EXPLAIN) e criticità rilevate:\n```\n{plan_summary}\n```"
+        
+        prompt = f"""Effettua un'analisi approfondita di questa query SQL:{context}
+
+```sql
+{query}
+```
+
+Fornisci un'analisi dettagliata che copra:
+
+1. ANALISI STRUTTURALE:
+- Tipo di query e operazioni principali
+- Complessità delle join e loro impatto
+- Qualità delle condizioni di filtro
+
+2. PERFORMANCE:
+- Potenziali colli di bottiglia
+- Suggerimenti per gli indici
+- Ottimizzazioni del piano di esecuzione
+
+3. SUGGERIMENTI PRATICI:
+- Riscrittura della query (se applicabile)
+- Modifiche strutturali consigliate
+- Best practices PostgreSQL specifiche
+
+Organizza la risposta in sezioni chiare e fornisci esempi concreti dove possibile."""
+        return prompt
+
+    def analyze_many(self, queries: Sequence[str],
+                     execution_times: Optional[Sequence[Optional[float]]] = None,
+                     deep: bool = False, max_workers: Optional[int] = None) -> List[Dict]:
+        """Analyze many queries concurrently; results come back in input order.
+
+        Requests share the endpoint's token bucket, so the batch stays within
+        the rate limit, and cached analyses don't consume it at all.
+        """
+        execution_times = execution_times if execution_times is not None else [None] * len(queries)
+        analyze = self.deep_analyze_query if deep else self.analyze_query
+        with ThreadPoolExecutor(max_workers=max_workers or settings.AI_BATCH_CONCURRENCY) as pool:
+            return list(pool.map(analyze, queries, execution_times))
+
+    def _cached_call(self, prompt: str, query: str, template_version: str,
+                     execution_time: Optional[float] = None, context: str = '') -> Dict:
+        """Serve repeat analyses from the shared cache; only successes are stored"""
+        if self.cache is None:
+            return self._call_groq(prompt)
+
+        key = AnalysisCache.make_key(query, self.MODEL, template_version, execution_time, context)
+        cached = self.cache.get(key)
+        annotate(cache='hit' if cached is not None else 'miss')
+        if cached is not None:
+            return {**cached, 'cached': True}
+
+        result = self._call_groq(prompt)
+        if 'error' not in result:
+            self.cache.put(key, result)
+        return result
+
+    @traced('ai')
+    def _call_groq(self, prompt: str) -> Dict:
+        """Make API call to GROQ"""
+        try:
+            response = self._post(self._request_body(prompt))
+            annotate(bytes=len(response.content))
+            return response.json()
+        except (requests.exceptions.RequestException, ValueError) as e:
+            annotate(error=str(e))
+            return {"error": str(e)}
+
+    def _request_body(self, prompt: str) -> Dict:
+        return {
+            "model": self.MODEL,
+            "messages": [
+                {
+                    "role": "system",
+                    "content": "Sei un esperto DBA PostgreSQL che analizza e ottimizza query SQL."
+                },
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ],
+            "temperature": 0.7,
+            "max_tokens": 2000
+        }
+
+    def _post(self, data: Dict, stream: bool = False) -> requests.Response:
+        """POST with timeouts, retrying 429/5xx and connection errors with backoff.
+
+        With stream=True only the request is retried; the body is left unread.
+        """
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.acquire()
+            response = None
+            try:
+                response = self.session.post(self.base_url, headers=headers, json=data,
+                                             timeout=self.timeout, stream=stream)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if attempt == self.max_retries:
+                    raise
+                logging.error(f"AI request failed ({e}), retrying")
+            else:
+                self._apply_rate_limit_headers(response)
+                if response.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                    response.raise_for_status()
+                    return response
+                logging.error(f"AI request returned {response.status_code}, retrying")
+                response.close()
+            time.sleep(self._retry_delay(response, attempt))
+
+    def _apply_rate_limit_headers(self, response: requests.Response):
+        """Hold back every caller when the server says a limit is used up"""
+        for limit in ('requests', 'tokens'):
+            if response.headers.get(f'x-ratelimit-remaining-{limit}') == '0':
+                reset = parse_duration(response.headers.get(f'x-ratelimit-reset-{limit}'))
+                if reset:
+                    self.rate_limiter.pause(min(reset, settings.AI_BACKOFF_MAX))
+
+    @staticmethod
+    def _retry_delay(response: Optional[requests.Response], attempt: int) -> float:
+        """Server-provided wait if any, else exponential backoff with jitter"""
+        if response is not None:
+            delay = parse_duration(response.headers.get('retry-after'))
+            if delay is not None:
+                return min(delay, settings.AI_BACKOFF_MAX)
+        backoff = min(settings.AI_BACKOFF_BASE * 2 ** attempt, settings.AI_BACKOFF_MAX)
+        return backoff * random.uniform(0.5, 1.0)
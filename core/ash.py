@@ -0,0 +1,373 @@
+# core/ash.py
+import threading
+import time
+import logging
+import numpy as np
+import pandas as pd
+import psycopg2
+from typing import Dict, List, Optional
+from config.settings import settings
+from core.collector_guard import CollectorGuard
+from core.fingerprint import fingerprint, normalize_query
+
+# Every non-idle session except our own; pg_blocking_pids() takes the lock
+# manager's partition locks, so it only runs for sessions waiting on a lock
+ACTIVE_SESSIONS_SQL = """
+    SELECT
+        pid,
+        coalesce(state, '') as state,
+        CASE WHEN state = 'active' THEN coalesce(wait_event_type, 'CPU')
+             ELSE coalesce(wait_event_type, '') END as wait_class,
+        coalesce(wait_event, '') as wait_event,
+        coalesce(backend_type, '') as backend_type,
+        coalesce(query, '') as query,
+        CASE WHEN wait_event_type = 'Lock' THEN pg_blocking_pids(pid) END as blockers
+    FROM pg_stat_activity
+    WHERE pid <> pg_backend_pid()
+      AND coalesce(state, '') <> 'idle'
+      AND (datname = current_database() OR datname IS NULL)
+"""
+
+# Dictionary-encoded string columns of the ring buffer
+_CODED_COLUMNS = ('state', 'wait_class', 'wait_event', 'backend_type')
+
+MAX_QUERY_TEXTS = 10_000  # normalized texts kept for display, oldest evicted first
+
+BLOCKING_COLUMNS = ['root_pid', 'root_state', 'root_query', 'blocked_seconds', 'max_blocked_sessions', 'last_seen']
+
+
+class SessionRingBuffer:
+    """Fixed-size, array-backed ring of session samples.
+
+    One row per session per tick, stored column-wise in NumPy arrays with
+    strings dictionary-encoded, so memory is fixed up front and aggregations
+    run over whole columns. Query texts are kept once per fingerprint.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.sample_time = np.zeros(capacity, dtype=np.float64)
+        self.pid = np.zeros(capacity, dtype=np.int32)
+        self.fingerprint = np.zeros(capacity, dtype=np.int64)
+        self.blocker = np.zeros(capacity, dtype=np.int32)  # first blocking pid, 0 if none
+        self.blocker_count = np.zeros(capacity, dtype=np.int16)
+        self.seconds = np.zeros(capacity, dtype=np.float32)  # database time each row stands for
+        self.codes = {name: np.zeros(capacity, dtype=np.int16) for name in _CODED_COLUMNS}
+        self.labels: Dict[str, List[str]] = {name: [] for name in _CODED_COLUMNS}
+        self._label_index: Dict[str, Dict[str, int]] = {name: {} for name in _CODED_COLUMNS}
+        self.queries: Dict[int, str] = {}
+
+        # Tick times, including ticks that found no active session
+        self.tick_time = np.zeros(capacity, dtype=np.float64)
+        self._tick_head = 0
+        self._tick_count = 0
+
+        self._head = 0
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def encode(self, column: str, value: str) -> int:
+        index = self._label_index[column]
+        code = index.get(value)
+        if code is None:
+            code = index[value] = len(self.labels[column])
+            self.labels[column].append(value)
+        return code
+
+    def append(self, tick: float, rows: List[tuple], seconds: float = 1.0):
+        """Add one tick of (pid, state, wait_class, wait_event, backend_type, query, blockers) rows,
+        each standing for `seconds` of session time"""
+        n = min(len(rows), self.capacity)
+        rows = rows[:n]
+        pids = np.fromiter((row[0] for row in rows), dtype=np.int32, count=n)
+        fingerprints = np.fromiter((fingerprint(row[5]) if row[5] else 0 for row in rows), dtype=np.int64, count=n)
+        blockers = np.fromiter(((row[6] or [0])[0] for row in rows), dtype=np.int32, count=n)
+        blocker_counts = np.fromiter((len(row[6] or ()) for row in rows), dtype=np.int16, count=n)
+
+        with self._lock:
+            codes = {
+                name: np.fromiter((self.encode(name, row[i + 1]) for row in rows), dtype=np.int16, count=n)
+                for i, name in enumerate(_CODED_COLUMNS)
+            }
+            for value, row in zip(fingerprints, rows):
+                if value and value not in self.queries:
+                    if len(self.queries) >= MAX_QUERY_TEXTS:
+                        self.queries.pop(next(iter(self.queries)))
+                    self.queries[int(value)] = normalize_query(row[5])
+
+            slots = (self._head + np.arange(n)) % self.capacity
+            self.sample_time[slots] = tick
+            self.pid[slots] = pids
+            self.fingerprint[slots] = fingerprints
+            self.blocker[slots] = blockers
+            self.blocker_count[slots] = blocker_counts
+            self.seconds[slots] = seconds
+            for name in _CODED_COLUMNS:
+                self.codes[name][slots] = codes[name]
+            self._head = (self._head + n) % self.capacity
+            self._size = min(self._size + n, self.capacity)
+
+            self.tick_time[self._tick_head] = tick
+            self._tick_head = (self._tick_head + 1) % self.capacity
+            self._tick_count = min(self._tick_count + 1, self.capacity)
+
+    def frame(self, since: Optional[float] = None) -> Dict[str, np.ndarray]:
+        """Copy of the buffered columns (optionally from `since` on), oldest first"""
+        with self._lock:
+            order = (self._head - self._size + np.arange(self._size)) % self.capacity
+            columns = {
+                'sample_time': self.sample_time[order],
+                'pid': self.pid[order],
+                'fingerprint': self.fingerprint[order],
+                'blocker': self.blocker[order],
+                'blocker_count': self.blocker_count[order],
+                'seconds': self.seconds[order],
+                **{name: self.codes[name][order] for name in _CODED_COLUMNS}
+            }
+            tick_order = (self._tick_head - self._tick_count + np.arange(self._tick_count)) % self.capacity
+            columns['ticks'] = self.tick_time[tick_order]
+        if since is not None:
+            keep = columns['sample_time'] >= since
+            columns = {name: (values[keep] if name != 'ticks' else values[values >= since])
+                       for name, values in columns.items()}
+        return columns
+
+    def label(self, column: str, codes: np.ndarray) -> np.ndarray:
+        with self._lock:
+            labels = np.array(self.labels[column] or [''], dtype=object)
+        return labels[codes]
+
+    def code_of(self, column: str, value: str) -> int:
+        with self._lock:
+            return self._label_index[column].get(value, -1)
+
+
+class ActiveSessionHistory(threading.Thread):
+    """Samples pg_stat_activity about once a second for one DSN (active session history).
+
+    Uses its own connection rather than the pool, so sampling never waits
+    behind the dashboard and always costs exactly one backend. Each sample
+    counts as the seconds until the next one (`interval`, stretched while a
+    guarded collector backs off) of database time for the sessions in it.
+    """
+
+    _registry: Dict[str, 'ActiveSessionHistory'] = {}
+    _registry_lock = threading.Lock()
+
+    def __init__(self, dsn: Optional[str], interval: float = 1.0, capacity: int = 100_000):
+        super().__init__(name="dbmindful-ash", daemon=True)
+        self.dsn = dsn
+        self.interval = interval
+        self.buffer = SessionRingBuffer(capacity)
+        self.last_error: Optional[str] = None
+        self._conn = None
+        self._stopped = threading.Event()
+
+    @classmethod
+    def for_dsn(cls, dsn: Optional[str]) -> 'ActiveSessionHistory':
+        """Return the running sampler for a DSN, starting it on first use"""
+        with cls._registry_lock:
+            sampler = cls._registry.get(dsn or '')
+            if sampler is None or not sampler.is_alive():
+                sampler = cls(dsn, interval=settings.ASH_INTERVAL, capacity=settings.ASH_BUFFER_SIZE)
+                cls._registry[dsn or ''] = sampler
+                sampler.start()
+            return sampler
+
+    @classmethod
+    def stop_dsn(cls, dsn: Optional[str]):
+        with cls._registry_lock:
+            sampler = cls._registry.pop(dsn or '', None)
+        if sampler is not None:
+            sampler.stop()
+
+    def stop(self):
+        self._stopped.set()
+
+    def run(self):
+        failures = 0
+        next_tick = time.monotonic()
+        while not self._stopped.is_set():
+            guard = CollectorGuard.get(self.dsn)
+            interval = self.interval * (guard.activity_factor if guard is not None else 1)
+            try:
+                self.sample(interval)
+                failures = 0
+                self.last_error = None
+            except Exception as e:
+                failures += 1
+                self.last_error = str(e)
+                logging.error(f"Error sampling session activity: {e}")
+                self._close()
+            # Fixed-rate schedule; back off while the database is unreachable
+            next_tick += interval * min(2 ** failures, 60)
+            self._stopped.wait(max(0.0, next_tick - time.monotonic()))
+            next_tick = max(next_tick, time.monotonic())
+        self._close()
+
+    def sample(self, seconds: Optional[float] = None):
+        if self._conn is None or self._conn.closed:
+            options = f"-c statement_timeout={int(max(self.interval, 0.5) * 1000)}"
+            if settings.COLLECTOR_GUARDED:
+                options += f" -c lock_timeout={int(settings.GUARDED_LOCK_TIMEOUT * 1000)}"
+            self._conn = psycopg2.connect(**{
+                **settings.db_params_for(self.dsn or settings.DATABASE_URL),
+                'application_name': f"{settings.APPLICATION_NAME}-ash",
+                'options': options
+            })
+            self._conn.autocommit = True
+        with self._conn.cursor() as cur:
+            cur.execute(ACTIVE_SESSIONS_SQL)
+            rows = cur.fetchall()
+        self.buffer.append(time.time(), rows, seconds or self.interval)
+
+    def _close(self):
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except psycopg2.Error:
+                pass
+            self._conn = None
+
+    # Aggregations, over the whole buffer or the last `seconds`
+
+    def _window(self, seconds: Optional[float]) -> Dict[str, np.ndarray]:
+        return self.buffer.frame(since=time.time() - seconds if seconds else None)
+
+    def db_time_by_wait_class(self, seconds: Optional[float] = None) -> pd.DataFrame:
+        """DB time (active sessions only) per wait class and event, with average active sessions"""
+        frame = self._window(seconds)
+        active = frame['state'] == self.buffer.code_of('state', 'active')
+        keys = frame['wait_class'][active].astype(np.int32) << 16 | frame['wait_event'][active].astype(np.int32)
+        values, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+        ticks = max(len(frame['ticks']), 1)
+        df = pd.DataFrame({
+            'wait_class': self.buffer.label('wait_class', values >> 16),
+            'wait_event': self.buffer.label('wait_event', values & 0xFFFF),
+            'db_time_seconds': np.bincount(inverse, weights=frame['seconds'][active], minlength=len(values)),
+            'avg_active_sessions': counts / ticks
+        })
+        return df.sort_values('db_time_seconds', ascending=False).reset_index(drop=True)
+
+    def top_waiting_fingerprints(self, seconds: Optional[float] = None, limit: int = 10) -> pd.DataFrame:
+        """Statements with the most active-session time, split into CPU and waits"""
+        frame = self._window(seconds)
+        active = (frame['state'] == self.buffer.code_of('state', 'active')) & (frame['fingerprint'] != 0)
+        fingerprints = frame['fingerprint'][active]
+        on_cpu = frame['wait_class'][active] == self.buffer.code_of('wait_class', 'CPU')
+        seconds = frame['seconds'][active]
+        values, inverse = np.unique(fingerprints, return_inverse=True)
+        db_time = np.bincount(inverse, weights=seconds, minlength=len(values))
+        waiting = np.bincount(inverse, weights=seconds * ~on_cpu, minlength=len(values))
+
+        # Most frequent wait event per fingerprint: count (fingerprint, event)
+        # pairs, then keep the largest count of each fingerprint
+        events = frame['wait_event'][active]
+        has_event = events != self.buffer.code_of('wait_event', '')
+        pairs, pair_counts = np.unique(
+            inverse[has_event].astype(np.int64) << 16 | events[has_event], return_counts=True
+        )
+        pairs = pairs[np.lexsort((pair_counts, pairs >> 16))]
+        groups = pairs >> 16
+        last = np.r_[groups[1:] != groups[:-1], True] if len(pairs) else np.zeros(0, dtype=bool)
+        top_event = np.full(len(values), -1, dtype=np.int64)
+        top_event[groups[last]] = pairs[last] & 0xFFFF
+
+        df = pd.DataFrame({
+            'fingerprint': values,
+            'query': [self.buffer.queries.get(int(v), '') for v in values],
+            'db_time_seconds': db_time,
+            'wait_seconds': waiting,
+            'top_wait_event': np.where(top_event >= 0, self.buffer.label('wait_event', top_event.clip(min=0)), None)
+        })
+        df['wait_share'] = df['wait_seconds'] / df['db_time_seconds']
+        return df.sort_values('wait_seconds', ascending=False).head(limit).reset_index(drop=True)
+
+    def blocking_summary(self, seconds: Optional[float] = None) -> pd.DataFrame:
+        """Root blockers and the session time spent waiting behind them.
+
+        Each blocked sample is walked up its chain of blockers within the
+        same tick (pointer jumping over sorted keys) to the root session.
+        """
+        frame = self._window(seconds)
+        if not (frame['blocker'] != 0).any():
+            return pd.DataFrame(columns=BLOCKING_COLUMNS)
+        _, tick = np.unique(frame['sample_time'], return_inverse=True)
+        keys = tick.astype(np.int64) << 32 | frame['pid'].astype(np.int64)
+        order = np.argsort(keys)
+        sorted_keys = keys[order]
+
+        def row_of(pids: np.ndarray, ticks: np.ndarray) -> np.ndarray:
+            """Row index of each (tick, pid), or -1 when that session was not sampled"""
+            wanted = ticks.astype(np.int64) << 32 | pids.astype(np.int64)
+            pos = np.searchsorted(sorted_keys, wanted).clip(max=len(sorted_keys) - 1)
+            return np.where(sorted_keys[pos] == wanted, order[pos], -1)
+
+        blocked = np.flatnonzero(frame['blocker'] != 0)
+        root_pid = frame['blocker'][blocked]
+        for _ in range(16):  # deeper chains are cut off
+            parent = row_of(root_pid, tick[blocked])
+            has_parent = parent >= 0
+            has_parent[has_parent] = frame['blocker'][parent[has_parent]] != 0
+            if not has_parent.any():
+                break
+            root_pid = np.where(has_parent, frame['blocker'][np.where(has_parent, parent, 0)], root_pid)
+
+        root_row = row_of(root_pid, tick[blocked])
+        df = pd.DataFrame({
+            'root_pid': root_pid,
+            'tick': tick[blocked],
+            'sample_time': frame['sample_time'][blocked],
+            'seconds': frame['seconds'][blocked],
+            'root_state': np.where(root_row >= 0, self.buffer.label('state', frame['state'][root_row]), None),
+            'root_fingerprint': np.where(root_row >= 0, frame['fingerprint'][root_row], 0)
+        })
+        per_tick = df.groupby(['root_pid', 'tick']).size()
+        summary = df.groupby('root_pid').agg(
+            root_state=('root_state', 'last'),
+            root_fingerprint=('root_fingerprint', 'last'),
+            blocked_seconds=('seconds', 'sum'),
+            last_seen=('sample_time', 'max')
+        )
+        summary['max_blocked_sessions'] = per_tick.groupby('root_pid').max()
+        summary['root_query'] = [self.buffer.queries.get(int(v), '') for v in summary['root_fingerprint']]
+        summary['last_seen'] = pd.to_datetime(summary['last_seen'], unit='s')
+        return summary.reset_index().sort_values('blocked_seconds', ascending=False)[BLOCKING_COLUMNS] \
+            .reset_index(drop=True)
+
+    def blocking_tree(self) -> pd.DataFrame:
+        """Blocking tree at the latest tick, depth-first from each root"""
+        frame = self.buffer.frame()
+        if not len(frame['ticks']):
+            return pd.DataFrame(columns=['depth', 'pid', 'state', 'wait_event', 'query'])
+        latest = frame['sample_time'] == frame['ticks'][-1]
+        pids = frame['pid'][latest]
+        blockers = frame['blocker'][latest]
+        info = {
+            int(pid): (state, event, self.buffer.queries.get(int(fp), ''))
+            for pid, state, event, fp in zip(
+                pids, self.buffer.label('state', frame['state'][latest]),
+                self.buffer.label('wait_event', frame['wait_event'][latest]), frame['fingerprint'][latest]
+            )
+        }
+        children: Dict[int, List[int]] = {}
+        for pid, blocker in zip(pids, blockers):
+            if blocker:
+                children.setdefault(int(blocker), []).append(int(pid))
+        roots = [pid for pid in children if pid not in set(int(p) for p, b in zip(pids, blockers) if b)]
+
+        rows = []
+
+        def visit(pid: int, depth: int, seen: set):
+            state, event, query = info.get(pid, ('', '', ''))
+            rows.append({'depth': depth, 'pid': pid, 'state': state, 'wait_event': event, 'query': query})
+            for child in children.get(pid, []):
+                if child not in seen:
+                    visit(child, depth + 1, seen | {child})
+
+        for root in roots:
+            visit(root, 0, {root})
+        return pd.DataFrame(rows, columns=['depth', 'pid', 'state', 'wait_event', 'query'])
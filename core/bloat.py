@@ -0,0 +1,249 @@
+# core/bloat.py
+import pandas as pd
+from typing import Dict, Optional
+from config.settings import settings
+from models.database import DatabaseConnection
+
+# Heap and btree bloat estimated from catalog statistics alone (no
+# pgstattuple): the size each relation would have if its tuples, at their
+# pg_stats average width, were packed at the relation's fillfactor,
+# compared to its actual size. Every step is a set-wise join or GROUP BY,
+# so the cost stays linear in the number of relations.
+BLOAT_SQL = """
+    WITH constants AS (
+        SELECT current_setting('block_size')::numeric AS bs,
+               current_setting('autovacuum_vacuum_threshold')::float8 AS av_threshold,
+               current_setting('autovacuum_vacuum_scale_factor')::float8 AS av_scale_factor,
+               current_setting('autovacuum')::bool AS av_enabled
+    ),
+    rels AS (
+        SELECT c.oid, n.nspname, c.relname, c.reltuples, c.relpages, c.reloptions
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE c.relkind IN ('r', 'm')
+          AND n.nspname NOT IN ('pg_catalog', 'information_schema')
+          AND n.nspname !~ '^pg_toast'
+    ),
+    rel_options AS (
+        SELECT r.oid,
+               max(o.option_value) FILTER (WHERE o.option_name = 'fillfactor')::int AS fillfactor,
+               max(o.option_value) FILTER (WHERE o.option_name = 'autovacuum_enabled')::bool AS av_enabled,
+               max(o.option_value) FILTER (WHERE o.option_name = 'autovacuum_vacuum_threshold')::float8 AS av_threshold,
+               max(o.option_value) FILTER (WHERE o.option_name = 'autovacuum_vacuum_scale_factor')::float8 AS av_scale_factor
+        FROM rels r, pg_options_to_table(r.reloptions) o
+        GROUP BY r.oid
+    ),
+    col_stats AS (
+        SELECT a.attrelid AS oid, a.attnum, s.null_frac, s.avg_width
+        FROM pg_attribute a
+        JOIN rels r ON r.oid = a.attrelid
+        LEFT JOIN pg_stats s
+          ON s.schemaname = r.nspname AND s.tablename = r.relname AND s.attname = a.attname AND NOT s.inherited
+        WHERE a.attnum > 0 AND NOT a.attisdropped
+    ),
+    heap AS (
+        SELECT oid,
+               sum((1 - coalesce(null_frac, 0)) * coalesce(avg_width, 0)) AS data_width,
+               bool_or(null_frac > 0) AS has_nulls,
+               count(*) AS natts,
+               bool_and(avg_width IS NOT NULL) AS has_stats
+        FROM col_stats
+        GROUP BY oid
+    ),
+    heap_size AS (
+        SELECT h.oid, h.has_stats,
+               -- line pointer + aligned header (with null bitmap) + aligned data
+               4 + ceil((23 + CASE WHEN h.has_nulls THEN ceil(h.natts / 8.0) ELSE 0 END) / 8.0) * 8
+                 + ceil(h.data_width / 8.0) * 8 AS tuple_bytes
+        FROM heap h
+    ),
+    tables AS (
+        SELECT 'table'::text AS kind, r.nspname || '.' || r.relname AS table_name, NULL::text AS index_name,
+               format('%I.%I', r.nspname, r.relname) AS qualified_name,
+               r.relpages::numeric * k.bs AS real_bytes,
+               CASE WHEN hs.has_stats THEN ceil(
+                   r.reltuples / greatest(floor((k.bs - 24) * coalesce(o.fillfactor, 100) / 100 / hs.tuple_bytes), 1)
+               ) * k.bs END AS expected_bytes,
+               hs.tuple_bytes,
+               greatest(r.reltuples, 0)::float8 AS estimated_rows,
+               st.n_live_tup, st.n_dead_tup, st.last_autovacuum, st.last_vacuum,
+               coalesce(o.av_enabled, k.av_enabled) AS autovacuum_enabled,
+               coalesce(o.av_threshold, k.av_threshold)
+                 + coalesce(o.av_scale_factor, k.av_scale_factor) * greatest(r.reltuples, 0) AS vacuum_threshold,
+               p.phase AS vacuum_phase,
+               p.heap_blks_scanned::float8 / nullif(p.heap_blks_total, 0) AS vacuum_progress
+        FROM rels r
+        CROSS JOIN constants k
+        JOIN heap_size hs ON hs.oid = r.oid
+        LEFT JOIN rel_options o ON o.oid = r.oid
+        LEFT JOIN pg_stat_user_tables st ON st.relid = r.oid
+        LEFT JOIN pg_stat_progress_vacuum p ON p.relid = r.oid
+        WHERE r.relpages > 0
+    ),
+    idx AS (
+        SELECT i.indexrelid, i.indrelid, i.indkey, r.nspname, r.relname, ic.relname AS index_name,
+               ic.reltuples, ic.relpages, ic.reloptions
+        FROM pg_index i
+        JOIN rels r ON r.oid = i.indrelid
+        JOIN pg_class ic ON ic.oid = i.indexrelid
+        JOIN pg_am am ON am.oid = ic.relam
+        WHERE am.amname = 'btree' AND ic.relpages > 0
+    ),
+    idx_cols AS (
+        -- Plain columns use the table's statistics, expressions the index's own
+        SELECT x.indexrelid,
+               sum((1 - coalesce(cs.null_frac, es.null_frac, 0)) * coalesce(cs.avg_width, es.avg_width, 0)) AS data_width,
+               bool_or(coalesce(cs.null_frac, es.null_frac) > 0) AS has_nulls,
+               bool_and(coalesce(cs.avg_width, es.avg_width) IS NOT NULL) AS has_stats
+        FROM idx x
+        JOIN pg_attribute a ON a.attrelid = x.indexrelid AND a.attnum > 0
+        LEFT JOIN col_stats cs ON cs.oid = x.indrelid AND cs.attnum = x.indkey[a.attnum - 1]
+        LEFT JOIN pg_stats es
+          ON x.indkey[a.attnum - 1] = 0
+         AND es.schemaname = x.nspname AND es.tablename = x.index_name AND es.attname = a.attname
+        GROUP BY x.indexrelid
+    ),
+    indexes AS (
+        SELECT 'index'::text AS kind, x.nspname || '.' || x.relname AS table_name, x.index_name,
+               format('%I.%I', x.nspname, x.index_name) AS qualified_name,
+               x.relpages::numeric * k.bs AS real_bytes,
+               CASE WHEN c.has_stats THEN (ceil(
+                   -- line pointer + aligned IndexTupleData (with null bitmap) and key data,
+                   -- on pages without header and btree special space, plus the metapage
+                   x.reltuples * (4 + ceil((8 + CASE WHEN c.has_nulls THEN 4 ELSE 0 END + c.data_width) / 8.0) * 8)
+                   / ((k.bs - 24 - 16) * coalesce(
+                       (SELECT o.option_value::int FROM pg_options_to_table(x.reloptions) o
+                        WHERE o.option_name = 'fillfactor'), 90) / 100)
+               ) + 1) * k.bs END AS expected_bytes,
+               NULL::numeric AS tuple_bytes,
+               greatest(x.reltuples, 0)::float8 AS estimated_rows,
+               NULL::bigint AS n_live_tup, NULL::bigint AS n_dead_tup,
+               NULL::timestamptz AS last_autovacuum, NULL::timestamptz AS last_vacuum,
+               NULL::bool AS autovacuum_enabled, NULL::float8 AS vacuum_threshold,
+               NULL::text AS vacuum_phase, NULL::float8 AS vacuum_progress
+        FROM idx x
+        CROSS JOIN constants k
+        JOIN idx_cols c ON c.indexrelid = x.indexrelid
+    )
+    SELECT *,
+           greatest(real_bytes - expected_bytes, 0)::float8 AS bloat_bytes,
+           (greatest(real_bytes - expected_bytes, 0) / nullif(real_bytes, 0))::float8 AS bloat_ratio
+    FROM (SELECT * FROM tables UNION ALL SELECT * FROM indexes) relations
+"""
+
+BLOAT_DTYPES = {
+    'kind': str, 'table_name': str, 'index_name': str, 'qualified_name': str, 'real_bytes': 'float64',
+    'expected_bytes': 'float64', 'tuple_bytes': 'float64', 'estimated_rows': 'float64',
+    'n_live_tup': 'float64', 'n_dead_tup': 'float64', 'last_autovacuum': 'datetime64[ns, UTC]',
+    'last_vacuum': 'datetime64[ns, UTC]', 'autovacuum_enabled': 'boolean', 'vacuum_threshold': 'float64',
+    'vacuum_phase': str, 'vacuum_progress': 'float64', 'bloat_bytes': 'float64', 'bloat_ratio': 'float64'
+}
+
+WORKLIST_COLUMNS = [
+    'priority', 'kind', 'table_name', 'index_name', 'action', 'reason', 'reclaimable_bytes',
+    'bloat_ratio', 'n_dead_tup', 'vacuum_threshold', 'last_autovacuum', 'vacuum_phase'
+]
+
+
+class BloatEstimator:
+    """Estimates table and index bloat and turns it into a vacuum/reindex worklist.
+
+    Estimates assume tuples of pg_stats average width; relations never
+    analyzed have no estimate. Deduplicated btree indexes (PG13+) can be
+    smaller than the estimate, which then reports no bloat.
+    """
+
+    def __init__(self, dsn: Optional[str] = None):
+        self.dsn = dsn
+        self.db_connection = DatabaseConnection
+
+    def estimate(self, timeout: Optional[float] = None) -> pd.DataFrame:
+        """Per-relation real size, expected size and estimated bloat, in bytes"""
+        with self.db_connection.get_connection(self.dsn) as conn:
+            if timeout:
+                with conn.cursor() as cur:
+                    cur.execute(f"SET LOCAL statement_timeout = {int(timeout * 1000)};")
+            return self.db_connection.read_frame(conn, BLOAT_SQL, BLOAT_DTYPES)
+
+    def worklist(self, estimates: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+        """Maintenance actions ranked by the bytes they would reclaim.
+
+        A table whose dead tuples passed its autovacuum threshold gets a
+        VACUUM (the space becomes reusable); heavy heap bloat needs a table
+        rewrite and btree bloat a REINDEX CONCURRENTLY. Relations with a
+        vacuum already running are listed last, with its progress.
+        """
+        estimates = estimates if estimates is not None else self.estimate()
+        items = []
+        for row in estimates.to_dict('records'):
+            if row['kind'] == 'table':
+                items.extend(self._table_items(row))
+            else:
+                items.extend(self._index_items(row))
+
+        worklist = pd.DataFrame(items, columns=WORKLIST_COLUMNS[1:])
+        worklist['running'] = worklist['vacuum_phase'].notna()
+        worklist = worklist.sort_values(['running', 'reclaimable_bytes'], ascending=[True, False]) \
+            .drop(columns='running').reset_index(drop=True)
+        worklist.insert(0, 'priority', range(1, len(worklist) + 1))
+        return worklist
+
+    @staticmethod
+    def summarize(worklist: pd.DataFrame) -> Dict:
+        return {
+            'actions': len(worklist),
+            'reclaimable_bytes': float(worklist['reclaimable_bytes'].sum()) if not worklist.empty else 0.0,
+            'overdue_vacuums': int((worklist['action'].str.startswith('VACUUM (')).sum()) if not worklist.empty else 0
+        }
+
+    @staticmethod
+    def _is_bloated(row: Dict) -> bool:
+        return not pd.isna(row['bloat_bytes']) \
+            and row['bloat_bytes'] >= settings.BLOAT_MIN_BYTES \
+            and row['bloat_ratio'] >= settings.BLOAT_MIN_RATIO
+
+    def _table_items(self, row: Dict) -> list:
+        items = []
+        base = {
+            'kind': 'table', 'table_name': row['table_name'], 'index_name': None,
+            'bloat_ratio': row['bloat_ratio'], 'n_dead_tup': row['n_dead_tup'],
+            'vacuum_threshold': row['vacuum_threshold'], 'last_autovacuum': row['last_autovacuum'],
+            'vacuum_phase': row['vacuum_phase']
+        }
+        dead = 0 if pd.isna(row['n_dead_tup']) else row['n_dead_tup']
+        if dead > (0 if pd.isna(row['vacuum_threshold']) else row['vacuum_threshold']):
+            last = row['last_autovacuum']
+            reason = (f"{dead:,.0f} dead tuples, past the autovacuum threshold of {row['vacuum_threshold']:,.0f}; "
+                      + (f"last autovacuum {last:%Y-%m-%d %H:%M}" if not pd.isna(last) else "never autovacuumed"))
+            if row['autovacuum_enabled'] is False:
+                reason += " (autovacuum is disabled for this table)"
+            if not pd.isna(row['vacuum_phase']):
+                reason += f"; vacuum running: {row['vacuum_phase']}" + (
+                    f" ({row['vacuum_progress']:.0%} scanned)" if not pd.isna(row['vacuum_progress']) else "")
+            items.append({
+                **base,
+                'action': f"VACUUM (ANALYZE) {row['qualified_name']};",
+                'reason': reason,
+                # Reusable by new rows once vacuumed, not returned to the OS
+                'reclaimable_bytes': float(dead * (0 if pd.isna(row['tuple_bytes']) else row['tuple_bytes']))
+            })
+        if self._is_bloated(row):
+            items.append({
+                **base,
+                'action': f"VACUUM FULL {row['qualified_name']}; -- or pg_repack, without the exclusive lock",
+                'reason': (f"~{row['bloat_ratio']:.0%} of the heap is free space a plain VACUUM "
+                           f"does not return to the operating system"),
+                'reclaimable_bytes': float(row['bloat_bytes'])
+            })
+        return items
+
+    def _index_items(self, row: Dict) -> list:
+        if not self._is_bloated(row):
+            return []
+        return [{
+            'kind': 'index', 'table_name': row['table_name'], 'index_name': row['index_name'],
+            'action': f"REINDEX INDEX CONCURRENTLY {row['qualified_name']};",
+            'reason': f"~{row['bloat_ratio']:.0%} of the btree is empty or sparse pages",
+            'reclaimable_bytes': float(row['bloat_bytes']), 'bloat_ratio': row['bloat_ratio'],
+            'n_dead_tup': None, 'vacuum_threshold': None, 'last_autovacuum': None, 'vacuum_phase': None
+        }]
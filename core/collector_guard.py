@@ -0,0 +1,108 @@
+# core/collector_guard.py
+import logging
+import threading
+from psycopg2 import errors
+from typing import Dict, Optional, Tuple
+from config.settings import settings
+
+# Cancellations by statement_timeout/lock_timeout: the server is too busy
+# (or a catalog lock is held) for a full collection right now
+PRESSURE_ERRORS = (errors.QueryCanceled, errors.LockNotAvailable)
+
+
+class CollectorGuard:
+    """Adaptive backoff for one sampler in guarded mode.
+
+    Every collection reports its own cost. Going over GUARDED_COST_BUDGET
+    (a share of the effective interval) or being cancelled by a timeout
+    raises the level by one; GUARDED_RELAX_AFTER collections in a row under
+    a quarter of the budget lower it again. Odd levels double the interval,
+    even levels halve the relations read per sample (a rotating oid subset),
+    so at level 3 the sampler runs every 4 intervals on half the relations.
+    Session sampling (ASH) slows down and plan capture pauses while the
+    level is above 0, since they query the same primary.
+    """
+
+    _registry: Dict[str, 'CollectorGuard'] = {}
+    _registry_lock = threading.Lock()
+
+    def __init__(self, max_level: int = 6, budget: float = 0.01, relax_after: int = 3):
+        self.max_level = max_level
+        self.budget = budget
+        self.relax_after = relax_after
+        self.level = 0
+        self.last_cost_ms = 0.0
+        self.last_reason: Optional[str] = None
+        self._cheap = 0
+        self._phase = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_dsn(cls, dsn: Optional[str]) -> 'CollectorGuard':
+        """The guard shared by everything that samples a DSN, created on first use"""
+        with cls._registry_lock:
+            guard = cls._registry.get(dsn or '')
+            if guard is None:
+                guard = cls(settings.GUARDED_MAX_LEVEL, settings.GUARDED_COST_BUDGET, settings.GUARDED_RELAX_AFTER)
+                cls._registry[dsn or ''] = guard
+            return guard
+
+    @classmethod
+    def get(cls, dsn: Optional[str]) -> Optional['CollectorGuard']:
+        """The DSN's guard if its sampler runs in guarded mode"""
+        with cls._registry_lock:
+            return cls._registry.get(dsn or '')
+
+    @property
+    def interval_factor(self) -> int:
+        return 2 ** ((self.level + 1) // 2)
+
+    @property
+    def relation_subsets(self) -> int:
+        return 2 ** (self.level // 2)
+
+    @property
+    def activity_factor(self) -> int:
+        """Stretch of the 1 Hz session sampling interval"""
+        return min(4 ** self.level, 60)
+
+    def next_subset(self) -> Tuple[int, int]:
+        """(n, phase) for the next collection; every relation is read once per n samples"""
+        with self._lock:
+            n = self.relation_subsets
+            phase = self._phase % n
+            self._phase = phase + 1
+            return n, phase
+
+    def observe(self, cost_ms: float, interval: float, error: Optional[Exception] = None):
+        """Record one collection's cost (ms) against the interval (s) it ran at"""
+        budget_ms = self.budget * interval * 1000
+        with self._lock:
+            self.last_cost_ms = cost_ms
+            if isinstance(error, PRESSURE_ERRORS):
+                self._step_up(f"cancelled ({type(error).__name__})")
+            elif error is None and cost_ms > budget_ms:
+                self._step_up(f"{cost_ms:.0f} ms over the {budget_ms:.0f} ms budget")
+            elif error is None and cost_ms < budget_ms / 4:
+                self._cheap += 1
+                if self._cheap >= self.relax_after and self.level > 0:
+                    self.level -= 1
+                    self._cheap = 0
+                    self.last_reason = None
+                    logging.info(f"Collector back to guard level {self.level}")
+            else:
+                self._cheap = 0
+
+    def _step_up(self, reason: str):
+        self._cheap = 0
+        self.last_reason = reason
+        if self.level < self.max_level:
+            self.level += 1
+            logging.warning(f"Collector guard level {self.level}: {reason}")
+
+    def describe(self) -> str:
+        if self.level == 0:
+            return f"Guarded collector: last collection {self.last_cost_ms:.0f} ms, within budget"
+        return (f"Guarded collector backing off ({self.last_reason}): sampling every "
+                f"{self.interval_factor}x the interval, 1/{self.relation_subsets} of relations per sample, "
+                f"sessions every {self.activity_factor}x as long, plan capture paused")
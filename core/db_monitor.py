@@ -1,185 +1,565 @@
-# core/db_monitor.py
-import pandas as pd
-from models.database import DatabaseConnection
-
-class DBMonitor:
-    def __init__(self):
-        self.db_connection = DatabaseConnection
-
-# core/db_monitor.py
-import pandas as pd
-from models.database import DatabaseConnection
-import logging
-from typing import Optional, Dict
-
-class DBMonitor:
-    def __init__(self):
-        self.db_connection = DatabaseConnection
-
-    def get_heavy_queries(self) -> Optional[pd.DataFrame]:
-        """Fetch the most resource-intensive queries with graceful fallback"""
-        try:
-            with self.db_connection.get_connection() as conn:
-                # First check if pg_stat_statements is available
-                with conn.cursor() as cur:
-                    cur.execute("""
-                        SELECT EXISTS (
-                            SELECT 1 FROM pg_extension WHERE extname = 'pg_stat_statements'
-                        );
-                    """)
-                    has_pg_stat = cur.fetchone()[0]
-                    
-                    if not has_pg_stat:
-                        # Fallback to basic query monitoring
-                        query = """
-                        SELECT 
-                            query as query_preview,
-                            pid as calls,
-                            EXTRACT(EPOCH FROM (now() - query_start)) * 1000 as total_exec_time,
-                            EXTRACT(EPOCH FROM (now() - query_start)) * 1000 as avg_exec_time,
-                            0 as rows,
-                            0 as total_blocks
-                        FROM pg_stat_activity 
-                        WHERE state = 'active'
-                        AND query NOT LIKE '%pg_stat_activity%'
-                        ORDER BY query_start DESC
-                        LIMIT 10;
-                        """
-                    else:
-                        # Use full pg_stat_statements query
-                        query = """
-                        SELECT 
-                            query as query_preview,
-                            calls,
-                            total_exec_time,
-                            total_exec_time/calls as avg_exec_time,
-                            rows,
-                            shared_blks_hit + shared_blks_read as total_blocks
-                        FROM pg_stat_statements s
-                        JOIN pg_database d ON d.oid = s.dbid
-                        WHERE d.datname = current_database()
-                        AND query NOT ILIKE 'BEGIN%'
-                        AND query NOT ILIKE 'COMMIT%'
-                        ORDER BY total_exec_time DESC
-                        LIMIT 10;
-                        """
-                        
-                return pd.read_sql(query, conn)
-                
-        except Exception as e:
-            logging.error(f"Error fetching query data: {e}")
-            return None
-
-    def get_monitoring_status(self) -> Dict:
-        """Get comprehensive monitoring status with basic stats"""
-        try:
-            # Get basic stats that don't require pg_stat_statements
-            basic_stats = self.db_connection.get_basic_stats()
-            
-            # Try to get pg_stat_statements status
-            with self.db_connection.get_connection() as conn:
-                with conn.cursor() as cur:
-                    cur.execute("""
-                        SELECT EXISTS (
-                            SELECT 1 FROM pg_extension WHERE extname = 'pg_stat_statements'
-                        );
-                    """)
-                    has_extension = cur.fetchone()[0]
-                    
-                    status = {
-                        **basic_stats,
-                        'pg_stat_statements_enabled': has_extension,
-                        'monitoring_level': 'Full' if has_extension else 'Basic'
-                    }
-                    
-                    if has_extension:
-                        # Get additional pg_stat_statements specific info
-                        cur.execute("SELECT pg_stat_statements_reset();")
-                        status['stats_reset'] = True
-                        
-                    return status
-                    
-        except Exception as e:
-            logging.error(f"Error checking monitoring status: {e}")
-            return {'error': str(e)}
-
-    def reset_query_stats(self):
-        """Reset query statistics in pg_stat_statements"""
-        with self.db_connection.get_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute("SELECT pg_stat_statements_reset();")
-                conn.commit()
-
-    def check_monitoring_prerequisites(self) -> dict:
-        """Check if all prerequisites for query monitoring are met"""
-        with self.db_connection.get_connection() as conn:
-            with conn.cursor() as cur:
-                results = {}
-                
-                try:
-                    # Check if extension exists
-                    cur.execute("""
-                        SELECT EXISTS (
-                            SELECT 1 
-                            FROM pg_extension 
-                            WHERE extname = 'pg_stat_statements'
-                        );
-                    """)
-                    results['extension_installed'] = cur.fetchone()[0]
-                    
-                    # Check tracking settings
-                    cur.execute("SHOW pg_stat_statements.track;")
-                    results['track_setting'] = cur.fetchone()[0]
-                    
-                    cur.execute("SHOW pg_stat_statements.track_utility;")
-                    results['track_utility'] = cur.fetchone()[0]
-                    
-                    # Check if statements are being tracked
-                    cur.execute("""
-                        SELECT COUNT(*) 
-                        FROM pg_stat_statements 
-                        WHERE query NOT ILIKE 'BEGIN%' 
-                        AND query NOT ILIKE 'COMMIT%'
-                    """)
-                    results['tracked_queries'] = cur.fetchone()[0]
-                    
-                    # Get current configuration
-                    cur.execute("SHOW shared_preload_libraries;")
-                    results['shared_preload'] = cur.fetchone()[0]
-                    
-                except Exception as e:
-                    results['error'] = str(e)
-                
-                return results
-
-    def get_table_stats(self) -> pd.DataFrame:
-        """Fetch table statistics including sequential reads"""
-        with self.db_connection.get_connection() as conn:
-            query = """
-            SELECT
-                schemaname || '.' || relname as table_name,
-                seq_tup_read::bigint as row_count,
-                n_dead_tup::bigint as dead_tuples,
-                pg_total_relation_size(relid)::bigint as total_size,
-                pg_relation_size(relid)::bigint as table_size,
-                pg_indexes_size(relid)::bigint as index_size
-            FROM pg_stat_user_tables
-            ORDER BY seq_tup_read DESC;
-            """
-            return pd.read_sql(query, conn)
-
-    def get_index_usage(self) -> pd.DataFrame:
-        """Fetch index usage statistics"""
-        with self.db_connection.get_connection() as conn:
-            query = """
-            SELECT
-                schemaname || '.' || relname as table_name,
-                indexrelname as index_name,
-                idx_scan as number_of_scans,
-                idx_tup_read as tuples_read,
-                idx_tup_fetch as tuples_fetched,
-                pg_size_pretty(pg_relation_size(indexrelid)) as index_size
-            FROM pg_stat_user_indexes
-            ORDER BY idx_scan DESC;
-            """
-            return pd.read_sql(query, conn)
\ No newline at end of file
+# core/db_monitor.py
+import pandas as pd
+from models.database import DatabaseConnection
+
+class DBMonitor:
+    def __init__(self):
+        self.db_connection = DatabaseConnection
+
+# core/db_monitor.py
+import pandas as pd
+from models.database import DatabaseConnection
+from models.result_cache import ResultCache
+from core.tracing import traced
+from core.fingerprint import fingerprint_many, normalize_many
+import logging
+from typing import Optional, Dict, Tuple
+from config.settings import settings
+
+
+def with_sizes(relations_sql: str, sizes: Dict[str, str]) -> str:
+    """Add size columns (expressions on {key}) to a per-relation query keyed by oid"""
+    if not sizes:
+        return relations_sql
+    columns = ", ".join(f"{expr.format(key='r.key')} as {name}" for name, expr in sizes.items())
+    return f"SELECT r.*, {columns} FROM ({relations_sql}) r"
+
+
+class DBMonitor:
+    # Monitoring queries are class constants so SnapshotCollector can batch them
+    HAS_PG_STAT_STATEMENTS_SQL = """
+        SELECT EXISTS (
+            SELECT 1 FROM pg_extension WHERE extname = 'pg_stat_statements'
+        )
+    """
+
+    HEAVY_QUERIES_SQL = """
+        SELECT 
+            queryid,
+            query as query_preview,
+            calls,
+            total_exec_time,
+            total_exec_time/calls as avg_exec_time,
+            rows,
+            shared_blks_hit + shared_blks_read as total_blocks
+        FROM pg_stat_statements s
+        JOIN pg_database d ON d.oid = s.dbid
+        WHERE d.datname = current_database()
+        AND query NOT ILIKE 'BEGIN%'
+        AND query NOT ILIKE 'COMMIT%'
+        ORDER BY total_exec_time DESC
+        LIMIT 10
+    """
+
+    # Explicit result dtypes for DatabaseConnection.read_frame (COPY), so
+    # columns don't depend on what the first rows happen to look like
+    HEAVY_QUERIES_DTYPES = {
+        'queryid': 'Int64', 'query_preview': str, 'calls': 'int64', 'total_exec_time': 'float64',
+        'avg_exec_time': 'float64', 'rows': 'int64', 'total_blocks': 'int64'
+    }
+
+    # Every statement of the current database, for workload-wide audits
+    WORKLOAD_STATEMENTS_SQL = """
+        SELECT
+            queryid,
+            query,
+            calls,
+            total_exec_time
+        FROM pg_stat_statements s
+        JOIN pg_database d ON d.oid = s.dbid
+        WHERE d.datname = current_database()
+        AND query NOT ILIKE 'BEGIN%'
+        AND query NOT ILIKE 'COMMIT%'
+        ORDER BY total_exec_time DESC
+    """
+
+    WORKLOAD_STATEMENTS_DTYPES = {'queryid': 'Int64', 'query': str, 'calls': 'int64', 'total_exec_time': 'float64'}
+
+    # Statement texts sampled with the counters are cut to this many characters
+    QUERY_TEXT_LIMIT = 2000
+
+    # Cumulative counters for every statement, keyed by (userid, dbid, queryid);
+    # StatementDeltaEngine diffs successive samples of this into per-interval rates
+    STATEMENT_COUNTERS_SQL = f"""
+        SELECT
+            userid,
+            dbid,
+            queryid,
+            left(query, {QUERY_TEXT_LIMIT}) as query,
+            calls,
+            total_exec_time,
+            rows,
+            shared_blks_hit,
+            shared_blks_read,
+            shared_blks_dirtied,
+            shared_blks_written,
+            temp_blks_read,
+            temp_blks_written
+        FROM pg_stat_statements s
+        JOIN pg_database d ON d.oid = s.dbid
+        WHERE d.datname = current_database()
+        AND queryid IS NOT NULL
+    """
+
+    # Full texts of a few statements whose sampled text was cut off
+    STATEMENT_TEXTS_SQL = """
+        SELECT DISTINCT ON (queryid) queryid, query
+        FROM pg_stat_statements s
+        JOIN pg_database d ON d.oid = s.dbid
+        WHERE d.datname = current_database()
+        AND queryid = ANY(%(queryids)s)
+    """
+
+    STATEMENT_COUNTERS_DTYPES = {
+        'userid': 'int64', 'dbid': 'int64', 'queryid': 'int64', 'query': str, 'calls': 'int64',
+        'total_exec_time': 'float64', 'rows': 'int64', 'shared_blks_hit': 'int64', 'shared_blks_read': 'int64',
+        'shared_blks_dirtied': 'int64', 'shared_blks_written': 'int64', 'temp_blks_read': 'int64',
+        'temp_blks_written': 'int64'
+    }
+
+    # pg_stat_statements_info only exists from PostgreSQL 14 on
+    HAS_STATEMENTS_INFO_SQL = """
+        SELECT to_regclass('pg_stat_statements_info') IS NOT NULL
+    """
+
+    STATEMENTS_INFO_SQL = """
+        SELECT dealloc, stats_reset FROM pg_stat_statements_info
+    """
+
+    # Fallback to basic query monitoring when pg_stat_statements is missing;
+    # one row per backend, collapsed per fingerprint by aggregate_activity()
+    ACTIVITY_QUERIES_SQL = """
+        SELECT 
+            query as query_preview,
+            pid as calls,
+            (EXTRACT(EPOCH FROM (now() - query_start)) * 1000)::float8 as total_exec_time,
+            (EXTRACT(EPOCH FROM (now() - query_start)) * 1000)::float8 as avg_exec_time,
+            0 as rows,
+            0 as total_blocks
+        FROM pg_stat_activity 
+        WHERE state = 'active'
+        AND query NOT LIKE '%pg_stat_activity%'
+        ORDER BY query_start DESC
+        LIMIT 1000
+    """
+
+    ACTIVITY_QUERIES_DTYPES = {
+        'query_preview': str, 'calls': 'int64', 'total_exec_time': 'float64', 'avg_exec_time': 'float64',
+        'rows': 'int64', 'total_blocks': 'int64'
+    }
+
+    # One row per table/index, keyed by oid; relation_page_sql() adds the
+    # filter, sort, keyset and LIMIT so large catalogs never leave the server.
+    # Size functions stat every file of a relation (and lock-free catalog
+    # lookups add up on big catalogs), so unless the page is sorted by size
+    # they are evaluated after the LIMIT, for the returned rows only
+    TABLE_COUNTERS_SQL = """
+        SELECT
+            relid as key,
+            schemaname || '.' || relname as table_name,
+            seq_tup_read::bigint as row_count,
+            n_dead_tup::bigint as dead_tuples
+        FROM pg_stat_user_tables
+    """
+    TABLE_SIZES = {
+        'total_size': "pg_total_relation_size({key})::bigint",
+        'table_size': "pg_relation_size({key})::bigint",
+        'index_size': "pg_indexes_size({key})::bigint",
+    }
+
+    INDEX_COUNTERS_SQL = """
+        SELECT
+            indexrelid as key,
+            schemaname || '.' || relname as table_name,
+            indexrelname as index_name,
+            idx_scan as number_of_scans,
+            idx_tup_read as tuples_read,
+            idx_tup_fetch as tuples_fetched
+        FROM pg_stat_user_indexes
+    """
+    INDEX_SIZES = {
+        'index_size': "pg_size_pretty(pg_relation_size({key}))",
+        'index_size_bytes': "pg_relation_size({key})",
+    }
+
+    # Counters plus the planner's page estimate (heap and TOAST) from
+    # pg_class, to find the largest tables without stat-ing every file
+    TABLE_PAGES_SQL = f"""
+        SELECT t.*, (c.relpages::bigint + COALESCE(tc.relpages, 0)::bigint) as pages
+        FROM ({TABLE_COUNTERS_SQL}) t
+        JOIN pg_class c ON c.oid = t.key
+        LEFT JOIN pg_class tc ON tc.oid = c.reltoastrelid
+    """
+
+    TABLE_STATS_SQL = with_sizes(TABLE_COUNTERS_SQL, TABLE_SIZES)
+    INDEX_USAGE_SQL = with_sizes(INDEX_COUNTERS_SQL, INDEX_SIZES)
+
+    # Top-level ancestor of every inheritance child or partition (at any
+    # depth), for tables and, through attached partition indexes, indexes
+    PARTITION_ROOTS_SQL = """
+        WITH RECURSIVE ancestry(relid, root) AS (
+            SELECT inhrelid, inhparent FROM pg_inherits
+            UNION
+            SELECT a.relid, i.inhparent
+            FROM ancestry a
+            JOIN pg_inherits i ON i.inhrelid = a.root
+        )
+        SELECT relid, min(root) as root
+        FROM ancestry
+        WHERE root NOT IN (SELECT inhrelid FROM pg_inherits)
+        GROUP BY relid
+    """
+
+    TABLE_ROLLUP_SQL = f"""
+        SELECT
+            g.key,
+            n.nspname || '.' || c.relname as table_name,
+            g.partitions,
+            g.row_count,
+            g.dead_tuples,
+            g.total_size,
+            g.table_size,
+            g.index_size
+        FROM (
+            SELECT
+                COALESCE(p.root, t.key) as key,
+                count(p.root) as partitions,
+                sum(t.row_count)::bigint as row_count,
+                sum(t.dead_tuples)::bigint as dead_tuples,
+                sum(t.total_size)::bigint as total_size,
+                sum(t.table_size)::bigint as table_size,
+                sum(t.index_size)::bigint as index_size
+            FROM ({TABLE_STATS_SQL}) t
+            LEFT JOIN ({PARTITION_ROOTS_SQL}) p ON p.relid = t.key
+            GROUP BY 1
+        ) g
+        JOIN pg_class c ON c.oid = g.key
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+    """
+
+    INDEX_ROLLUP_SQL = f"""
+        SELECT
+            g.key,
+            n.nspname || '.' || t.relname as table_name,
+            c.relname as index_name,
+            g.partitions,
+            g.number_of_scans,
+            g.tuples_read,
+            g.tuples_fetched,
+            pg_size_pretty(g.index_size_bytes) as index_size,
+            g.index_size_bytes
+        FROM (
+            SELECT
+                COALESCE(p.root, i.key) as key,
+                count(p.root) as partitions,
+                sum(i.number_of_scans)::bigint as number_of_scans,
+                sum(i.tuples_read)::bigint as tuples_read,
+                sum(i.tuples_fetched)::bigint as tuples_fetched,
+                sum(i.index_size_bytes)::bigint as index_size_bytes
+            FROM ({INDEX_USAGE_SQL}) i
+            LEFT JOIN ({PARTITION_ROOTS_SQL}) p ON p.relid = i.key
+            GROUP BY 1
+        ) g
+        JOIN pg_index x ON x.indexrelid = g.key
+        JOIN pg_class c ON c.oid = g.key
+        JOIN pg_class t ON t.oid = x.indrelid
+        JOIN pg_namespace n ON n.oid = t.relnamespace
+    """
+
+    # Sortable columns (always descending, ties broken by key) and the
+    # expression the search box matches
+    TABLE_SORT_COLUMNS = ['row_count', 'dead_tuples', 'total_size', 'table_size', 'index_size']
+    INDEX_SORT_COLUMNS = ['number_of_scans', 'tuples_read', 'tuples_fetched', 'index_size_bytes']
+    TABLE_STATS_DTYPES = {
+        'key': 'int64', 'table_name': str, 'partitions': 'int64', 'row_count': 'int64', 'dead_tuples': 'int64',
+        'total_size': 'int64', 'table_size': 'int64', 'index_size': 'int64',
+        'total_count': 'int64', 'total_value': 'float64'
+    }
+    INDEX_USAGE_DTYPES = {
+        'key': 'int64', 'table_name': str, 'index_name': str, 'partitions': 'int64', 'number_of_scans': 'int64',
+        'tuples_read': 'int64', 'tuples_fetched': 'int64', 'index_size': str, 'index_size_bytes': 'int64',
+        'total_count': 'int64', 'total_value': 'float64'
+    }
+    TABLE_SEARCH_SQL = "table_name"
+    INDEX_SEARCH_SQL = "table_name || '.' || index_name"
+
+    def __init__(self, dsn: Optional[str] = None):
+        self.dsn = dsn
+        self.db_connection = DatabaseConnection
+        # Shared with every other session on this DSN
+        self.cache = ResultCache.for_dsn(dsn)
+
+    @traced('db')
+    def has_pg_stat_statements(self) -> bool:
+        """Whether the pg_stat_statements extension is installed (cached)"""
+        return self.cache.get('capabilities', self._has_pg_stat_statements, 'pg_stat_statements')
+
+    def _has_pg_stat_statements(self) -> bool:
+        with self.db_connection.get_connection(self.dsn) as conn:
+            with conn.cursor() as cur:
+                cur.execute(self.HAS_PG_STAT_STATEMENTS_SQL + ";")
+                return cur.fetchone()[0]
+
+    @traced('db')
+    def get_heavy_queries(self) -> Optional[pd.DataFrame]:
+        """Fetch the most resource-intensive queries with graceful fallback"""
+        try:
+            return self.cache.get('heavy_queries', self._get_heavy_queries)
+        except Exception as e:
+            logging.error(f"Error fetching query data: {e}")
+            return None
+
+    def _get_heavy_queries(self) -> pd.DataFrame:
+        has_pg_stat = self.has_pg_stat_statements()
+        if not has_pg_stat:
+            # Fallback to basic query monitoring
+            query, dtypes = self.ACTIVITY_QUERIES_SQL, self.ACTIVITY_QUERIES_DTYPES
+        else:
+            # Use full pg_stat_statements query
+            query, dtypes = self.HEAVY_QUERIES_SQL, self.HEAVY_QUERIES_DTYPES
+
+        with self.db_connection.get_connection(self.dsn) as conn:
+            df = self.db_connection.read_frame(conn, query, dtypes)
+        return df if has_pg_stat else self.aggregate_activity(df)
+
+    @traced('db')
+    def get_monitoring_status(self) -> Dict:
+        """Get comprehensive monitoring status with basic stats"""
+        try:
+            return self.cache.get('monitoring_status', self._get_monitoring_status)
+        except Exception as e:
+            logging.error(f"Error checking monitoring status: {e}")
+            return {'error': str(e)}
+
+    def _get_monitoring_status(self) -> Dict:
+        # Get basic stats that don't require pg_stat_statements
+        basic_stats = self.db_connection.get_basic_stats(self.dsn)
+        has_extension = self.has_pg_stat_statements()
+
+        # Try to get pg_stat_statements status
+        with self.db_connection.get_connection(self.dsn) as conn:
+            with conn.cursor() as cur:
+                status = {
+                        **basic_stats,
+                    'pg_stat_statements_enabled': has_extension,
+                    'monitoring_level': 'Full' if has_extension else 'Basic'
+                }
+
+                if has_extension:
+                    # Report when counters were last reset (PG14+) instead of resetting
+                    # them: a reset wipes cumulative stats for every other tool
+                    cur.execute(self.HAS_STATEMENTS_INFO_SQL + ";")
+                    if cur.fetchone()[0]:
+                        cur.execute(self.STATEMENTS_INFO_SQL + ";")
+                        status['stats_dealloc'], status['stats_reset'] = cur.fetchone()
+
+                return status
+
+    @staticmethod
+    def aggregate_activity(df: pd.DataFrame, limit: Optional[int] = 10) -> pd.DataFrame:
+        """Collapse per-backend pg_stat_activity rows into one row per query fingerprint.
+
+        calls becomes the number of backends running the statement and the
+        times are summed/averaged over them.
+        """
+        df = df.assign(
+            queryid=fingerprint_many(df['query_preview']),
+            query_preview=normalize_many(df['query_preview'])
+        )
+        grouped = df.groupby('queryid', sort=False).agg(
+            query_preview=('query_preview', 'first'),
+            calls=('query_preview', 'size'),
+            total_exec_time=('total_exec_time', 'sum'),
+            avg_exec_time=('total_exec_time', 'mean'),
+            rows=('rows', 'sum'),
+            total_blocks=('total_blocks', 'sum')
+        )
+        grouped = grouped.sort_values('total_exec_time', ascending=False)
+        return (grouped.head(limit) if limit else grouped).reset_index()
+
+    @traced('db')
+    def get_workload_statements(self) -> pd.DataFrame:
+        """Fetch the full statement set (no top-N cut) for QueryAnalyzer.analyze_many"""
+        return self.cache.get('workload_statements', self._get_workload_statements)
+
+    def _get_workload_statements(self) -> pd.DataFrame:
+        has_pg_stat = self.has_pg_stat_statements()
+        with self.db_connection.get_connection(self.dsn) as conn:
+            if has_pg_stat:
+                return self.db_connection.read_frame(conn, self.WORKLOAD_STATEMENTS_SQL,
+                                                     self.WORKLOAD_STATEMENTS_DTYPES)
+            # Basic mode: whatever is running right now
+            df = self.aggregate_activity(
+                self.db_connection.read_frame(conn, self.ACTIVITY_QUERIES_SQL, self.ACTIVITY_QUERIES_DTYPES),
+                limit=None
+            )
+            return df.rename(columns={'query_preview': 'query'})[['queryid', 'query', 'calls', 'total_exec_time']]
+
+    @traced('db')
+    def get_statement_counters(self) -> pd.DataFrame:
+        """Fetch cumulative pg_stat_statements counters for delta computation"""
+        with self.db_connection.get_connection(self.dsn) as conn:
+            return self.db_connection.read_frame(conn, self.STATEMENT_COUNTERS_SQL, self.STATEMENT_COUNTERS_DTYPES)
+
+    @traced('db')
+    def reset_query_stats(self):
+        """Reset query statistics in pg_stat_statements"""
+        with self.db_connection.get_connection(self.dsn) as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT pg_stat_statements_reset();")
+                conn.commit()
+        # Every cached statistic for this database predates the reset
+        self.cache.invalidate()
+
+    @traced('db')
+    def check_monitoring_prerequisites(self) -> dict:
+        """Check if all prerequisites for query monitoring are met"""
+        return self.cache.get('prerequisites', self._check_monitoring_prerequisites)
+
+    def _check_monitoring_prerequisites(self) -> dict:
+        results = {}
+        try:
+            # Check if extension exists
+            results['extension_installed'] = self.has_pg_stat_statements()
+        except Exception as e:
+            results['error'] = str(e)
+            return results
+
+        with self.db_connection.get_connection(self.dsn) as conn:
+            with conn.cursor() as cur:
+                try:
+                    # Check tracking settings
+                    cur.execute("SHOW pg_stat_statements.track;")
+                    results['track_setting'] = cur.fetchone()[0]
+                    
+                    cur.execute("SHOW pg_stat_statements.track_utility;")
+                    results['track_utility'] = cur.fetchone()[0]
+                    
+                    # Check if statements are being tracked
+                    cur.execute("""
+                        SELECT COUNT(*) 
+                        FROM pg_stat_statements 
+                        WHERE query NOT ILIKE 'BEGIN%' 
+                        AND query NOT ILIKE 'COMMIT%'
+                    """)
+                    results['tracked_queries'] = cur.fetchone()[0]
+                    
+                    # Get current configuration
+                    cur.execute("SHOW shared_preload_libraries;")
+                    results['shared_preload'] = cur.fetchone()[0]
+                    
+                except Exception as e:
+                    results['error'] = str(e)
+                
+                return results
+
+    @staticmethod
+    def relation_page_sql(relations_sql: str, sort: str, limit: int, search_sql: str,
+                          search: Optional[str] = None,
+                          after: Optional[Tuple[float, int]] = None,
+                          sizes: Optional[Dict[str, str]] = None,
+                          subset: Optional[Tuple[int, int]] = None) -> Tuple[str, Dict]:
+        """Wrap a per-relation query with search, sort, keyset pagination and LIMIT.
+
+        Rows come back ordered by `sort` DESC, key DESC; pass the (sort value,
+        key) of the last row seen as `after` for the next page. total_count
+        and total_value (the sum of `sort`) cover every row matching the
+        search, so callers can say "N of M" and size an "other" bucket.
+        `sizes` columns are computed for the page rows only, and `subset`
+        (n, phase) keeps the relations whose oid % n == phase.
+        """
+        params: Dict = {}
+        conditions = []
+        if search:
+            conditions.append(f"{search_sql} ILIKE %(search)s")
+            escaped = search.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            params['search'] = f"%{escaped}%"
+        if subset is not None and subset[0] > 1:
+            # Inlined, so SnapshotCollector can embed the SQL without params
+            conditions.append(f"mod(r.key::bigint, {int(subset[0])}) = {int(subset[1])}")
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        keyset = ""
+        if after is not None:
+            keyset = f"WHERE ({sort}, key) < (%(after_value)s, %(after_key)s::oid)"
+            params['after_value'], params['after_key'] = after
+        sql = f"""
+            SELECT * FROM (
+                SELECT
+                    r.*,
+                    count(*) OVER () as total_count,
+                    (sum({sort}) OVER ())::float8 as total_value
+                FROM ({relations_sql}) r
+                {where}
+            ) f
+            {keyset}
+            ORDER BY {sort} DESC, key DESC
+            LIMIT {int(limit)}
+        """
+        if sizes:
+            sql = f"{with_sizes(sql, sizes)} ORDER BY {sort} DESC, key DESC"
+        return sql, params
+
+    @classmethod
+    def table_stats_sql(cls, sort: str = 'row_count', limit: int = 50, search: Optional[str] = None,
+                        after: Optional[Tuple[float, int]] = None,
+                        rollup_partitions: bool = False, sizes: bool = True,
+                        subset: Optional[Tuple[int, int]] = None) -> Tuple[str, Dict]:
+        """`sizes=False` leaves the size columns out (SnapshotCollector can read them from a standby)"""
+        if sort not in cls.TABLE_SORT_COLUMNS or (not sizes and sort in cls.TABLE_SIZES):
+            raise ValueError(f"Unknown sort column for tables: {sort}")
+        if rollup_partitions:
+            return cls.relation_page_sql(cls.TABLE_ROLLUP_SQL, sort, limit, cls.TABLE_SEARCH_SQL, search, after,
+                                         subset=subset)
+        if sort in cls.TABLE_SIZES:
+            return cls.relation_page_sql(cls.TABLE_STATS_SQL, sort, limit, cls.TABLE_SEARCH_SQL, search, after,
+                                         subset=subset)
+        return cls.relation_page_sql(cls.TABLE_COUNTERS_SQL, sort, limit, cls.TABLE_SEARCH_SQL, search, after,
+                                     cls.TABLE_SIZES if sizes else None, subset)
+
+    @classmethod
+    def index_usage_sql(cls, sort: str = 'number_of_scans', limit: int = 50, search: Optional[str] = None,
+                        after: Optional[Tuple[float, int]] = None,
+                        rollup_partitions: bool = False, sizes: bool = True,
+                        subset: Optional[Tuple[int, int]] = None) -> Tuple[str, Dict]:
+        if sort not in cls.INDEX_SORT_COLUMNS or (not sizes and sort in cls.INDEX_SIZES):
+            raise ValueError(f"Unknown sort column for indexes: {sort}")
+        if rollup_partitions:
+            return cls.relation_page_sql(cls.INDEX_ROLLUP_SQL, sort, limit, cls.INDEX_SEARCH_SQL, search, after,
+                                         subset=subset)
+        if sort in cls.INDEX_SIZES:
+            return cls.relation_page_sql(cls.INDEX_USAGE_SQL, sort, limit, cls.INDEX_SEARCH_SQL, search, after,
+                                         subset=subset)
+        return cls.relation_page_sql(cls.INDEX_COUNTERS_SQL, sort, limit, cls.INDEX_SEARCH_SQL, search, after,
+                                     cls.INDEX_SIZES if sizes else None, subset)
+
+    @staticmethod
+    def next_page_after(df: pd.DataFrame, sort: str) -> Optional[Tuple[float, int]]:
+        """Keyset cursor for the page after `df`"""
+        if df.empty:
+            return None
+        last = df.iloc[-1]
+        return float(last[sort]), int(last['key'])
+
+    @traced('db')
+    def get_table_stats(self, sort: str = 'row_count', limit: Optional[int] = None,
+                        search: Optional[str] = None, after: Optional[Tuple[float, int]] = None,
+                        rollup_partitions: bool = False) -> pd.DataFrame:
+        """Fetch one page of table statistics, filtered and sorted server-side"""
+        query, params = self.table_stats_sql(sort, limit or settings.STATS_PAGE_SIZE, search, after,
+                                             rollup_partitions)
+        return self.cache.get('table_stats', lambda: self._read_page(query, self.TABLE_STATS_DTYPES, params),
+                              query, tuple(sorted(params.items())))
+
+    @traced('db')
+    def get_index_usage(self, sort: str = 'number_of_scans', limit: Optional[int] = None,
+                        search: Optional[str] = None, after: Optional[Tuple[float, int]] = None,
+                        rollup_partitions: bool = False) -> pd.DataFrame:
+        """Fetch one page of index usage statistics, filtered and sorted server-side"""
+        query, params = self.index_usage_sql(sort, limit or settings.STATS_PAGE_SIZE, search, after,
+                                             rollup_partitions)
+        return self.cache.get('index_usage', lambda: self._read_page(query, self.INDEX_USAGE_DTYPES, params),
+                              query, tuple(sorted(params.items())))
+
+    def _read_page(self, query: str, dtypes: Dict, params: Dict) -> pd.DataFrame:
+        with self.db_connection.get_connection(self.dsn) as conn:
+            return self.db_connection.read_frame(conn, query, dtypes, params)
@@ -0,0 +1,132 @@
+# core/fingerprint.py
+import hashlib
+import re
+from functools import lru_cache
+import numpy as np
+from typing import Dict, Iterable, List
+
+# Full tokenizer for statements with comments, quoted identifiers or
+# dollar quoting, where literal boundaries need a real left-to-right scan
+_LITERAL_RE = re.compile(r"""
+    (?P<comment>--[^\n]*|/\*.*?\*/)
+  | (?P<quoted>"(?:[^"]|"")*")
+  | (?P<constant>
+        (?<![\w$])[Ee]'(?:[^'\\]|\\.|'')*'
+      | [EeBbXxNn]?'(?:[^']|'')*'
+      | \$(?P<tag>[A-Za-z_]*)\$.*?\$(?P=tag)\$
+      | \$\d+
+      | (?<![\w$])(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?
+    )
+""", re.VERBOSE | re.DOTALL)
+
+# Fast path for everything else: string literals are the only constants
+# that need their own pass, numbers are recognized while tokenizing.
+# E'...' strings also end only at a quote that isn't backslash-escaped
+_STRING_RE = re.compile(r"(?<![\w$])[Ee]'(?:[^'\\]|\\.|'')*'|[EeBbXxNn]?'(?:[^']|'')*'", re.DOTALL)
+_DOLLAR_QUOTE_RE = re.compile(r"\$[A-Za-z_]*\$")
+
+# Quoted identifiers are parked behind a private-use marker while the rest
+# of the text is tokenized and lower-cased
+_MARK = '\ue000'
+_QUOTED_RE = re.compile(_MARK + r'(\d+)' + _MARK)
+
+_TOKEN_RE = re.compile(
+    _MARK + r"\d+" + _MARK +
+    r"|[A-Za-z_\u0080-\uffff][\w$]*"
+    r"|\$\d+|(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?"
+    r"|::|<=|>=|<>|!=|\|\||\S"
+)
+_NUMERIC_START = frozenset('0123456789$.')
+
+_CONSTANT = '?'
+
+# A minus right after an operator or opening bracket belongs to the constant
+_UNARY_MINUS_RE = re.compile(r"(^|[=<>(,\[+*/%|] )- \?")
+
+# Runs of constants collapse to one, so IN (1, 2, 3) and IN (4, 5) match;
+# other parenthesized lists (function arguments, VALUES rows) keep their arity
+_IN_LIST_RE = re.compile(r"(?<![\w$])in \( \?(?: , \?)+ \)")
+_ARRAY_RE = re.compile(r"\[ \?(?: , \?)+ \]")
+_VALUES_RE = re.compile(r"(?<![\w$])(values \( \?(?: , \?)* \))(?: , \( \?(?: , \?)* \))+")
+
+
+def normalize_query(query: str) -> str:
+    """Literal-free, whitespace- and case-normalized form of a statement.
+
+    Constants and $n parameters become '?', comments are dropped, unquoted
+    identifiers and keywords are lower-cased, and IN-lists, ARRAY[...] and
+    multi-row VALUES collapse to a single element - similar in spirit to
+    what pg_stat_statements jumbling treats as "the same query".
+    """
+    quoted: List[str] = []
+
+    def replace(match) -> str:
+        # lastgroup is the outermost group, so dollar-quote tags report 'constant'
+        kind = match.lastgroup
+        if kind == 'comment':
+            return ' '
+        if kind == 'quoted':
+            quoted.append(match.group())
+            return f" {_MARK}{len(quoted) - 1}{_MARK} "
+        return ' ? '
+
+    if '--' in query or '/*' in query or '"' in query or ('$' in query and _DOLLAR_QUOTE_RE.search(query)):
+        text = _LITERAL_RE.sub(replace, query)
+    else:
+        text = _STRING_RE.sub(' ? ', query) if "'" in query else query
+
+    # Numbers and $n parameters are the tokens starting with a digit, '$' or '.'
+    normalized = ' '.join([
+        _CONSTANT if token[0] in _NUMERIC_START and (len(token) > 1 or token.isdigit()) else token
+        for token in _TOKEN_RE.findall(text.lower())
+    ])
+    if '- ?' in normalized:
+        normalized = _UNARY_MINUS_RE.sub(r'\1?', normalized)
+
+    # Trailing semicolons don't change the statement
+    while normalized.endswith(';'):
+        normalized = normalized[:-1].rstrip()
+
+    normalized = _IN_LIST_RE.sub('in ( ? )', normalized)
+    normalized = _ARRAY_RE.sub('[ ? ]', normalized)
+    normalized = _VALUES_RE.sub(r'\1', normalized)
+    if quoted:
+        normalized = _QUOTED_RE.sub(lambda m: quoted[int(m.group(1))], normalized)
+    return normalized
+
+
+def fingerprint_normalized(normalized: str) -> int:
+    """Signed 64-bit hash, the same range as pg_stat_statements.queryid"""
+    digest = hashlib.blake2b(normalized.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'little', signed=True)
+
+
+@lru_cache(maxsize=16384)
+def fingerprint(query: str) -> int:
+    # Monitoring samples repeat the same texts constantly, hence the cache
+    return fingerprint_normalized(normalize_query(query))
+
+
+def fingerprint_many(queries: Iterable[str]) -> np.ndarray:
+    """Fingerprint many statements at once (non-strings map to 0)"""
+    seen: Dict[str, int] = {}
+    out = []
+    for query in queries:
+        value = seen.get(query)
+        if value is None:
+            value = fingerprint(query) if isinstance(query, str) else 0
+            seen[query] = value
+        out.append(value)
+    return np.array(out, dtype=np.int64)
+
+
+def normalize_many(queries: Iterable[str]) -> List[str]:
+    seen: Dict[str, str] = {}
+    out = []
+    for query in queries:
+        value = seen.get(query)
+        if value is None:
+            value = normalize_query(query) if isinstance(query, str) else ''
+            seen[query] = value
+        out.append(value)
+    return out
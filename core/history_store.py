@@ -0,0 +1,470 @@
+# core/history_store.py
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import logging
+import pandas as pd
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence
+from config.settings import settings
+from core.snapshot import Snapshot
+
+RAW, MINUTE, HOUR = 0, 60, 3600
+
+# table -> (key columns, {value column: rollup aggregate})
+SERIES = {
+    'statement_history': (['queryid'], {
+        'calls': 'SUM', 'total_exec_time': 'SUM', 'rows': 'SUM',
+        'shared_blks_hit': 'SUM', 'shared_blks_read': 'SUM', 'temp_blks_written': 'SUM'
+    }),
+    # Sampling time covered by the statement deltas of each bucket, per DSN:
+    # statements only have rows for intervals they ran in, so their rates are
+    # divided by this rather than by their own summed intervals
+    'sample_history': ([], {'interval_seconds': 'SUM'}),
+    'basic_history': ([], {
+        'active_connections': 'AVG', 'database_size_bytes': 'MAX', 'table_count': 'MAX'
+    }),
+    # Cumulative counters: the latest value in a bucket (MAX) is the rollup
+    'table_history': (['table_name'], {
+        'row_count': 'MAX', 'dead_tuples': 'MAX', 'total_size': 'MAX'
+    }),
+    'index_history': (['table_name', 'index_name'], {
+        'number_of_scans': 'MAX', 'tuples_read': 'MAX', 'tuples_fetched': 'MAX'
+    }),
+    # Scan counter of every index, so a windowed "unused" check also works
+    # for indexes that never make the top-N of index_history. Written hourly
+    # by record_index_scans(), only for counters that changed (plus a daily
+    # heartbeat), and one index_scan_checks row per check marks how far the
+    # unchanged ones were observed
+    'index_scan_history': (['table_name', 'index_name'], {'number_of_scans': 'MAX'}),
+    'index_scan_checks': ([], {'indexes': 'MAX'}),
+}
+
+# An unchanged index counter is written again after this long, so retention
+# never leaves an index without a baseline
+INDEX_SCAN_HEARTBEAT = 86400
+
+KEY_TYPES = {'queryid': 'INTEGER', 'table_name': 'TEXT', 'index_name': 'TEXT'}
+
+
+class HistoryStore:
+    """Local SQLite time-series store for collected snapshots.
+
+    Samples are written at raw resolution and continuously rolled up into
+    1-minute and 1-hour buckets; each resolution has its own retention, so
+    the file stays bounded while keeping days to months of trends.
+    """
+
+    _instances: Dict[str, 'HistoryStore'] = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, path: str):
+        self.path = path
+        self.retention = {
+            RAW: timedelta(hours=settings.HISTORY_RAW_RETENTION_HOURS),
+            MINUTE: timedelta(days=settings.HISTORY_MINUTE_RETENTION_DAYS),
+            HOUR: timedelta(days=settings.HISTORY_HOUR_RETENTION_DAYS),
+        }
+        self._lock = threading.Lock()
+        self._last_compaction = 0.0
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._create_schema()
+
+    @classmethod
+    def shared(cls, path: Optional[str] = None) -> 'HistoryStore':
+        """Return the process-wide store for a file"""
+        path = path or settings.HISTORY_DB_PATH
+        with cls._instances_lock:
+            if path not in cls._instances:
+                cls._instances[path] = cls(path)
+            return cls._instances[path]
+
+    @staticmethod
+    def target_key(dsn: Optional[str]) -> str:
+        """Stable per-database key that does not store credentials on disk"""
+        return hashlib.sha256((dsn or '').encode()).hexdigest()[:16]
+
+    def _create_schema(self):
+        with self._lock, self._conn:
+            for table, (keys, values) in SERIES.items():
+                key_columns = ''.join(f"{k} {KEY_TYPES[k]} NOT NULL, " for k in keys)
+                value_columns = ', '.join(f"{v} REAL" for v in values)
+                primary_key = ', '.join(['target', 'resolution', 'bucket'] + keys)
+                self._conn.execute(f"""
+                    CREATE TABLE IF NOT EXISTS {table} (
+                        target TEXT NOT NULL,
+                        resolution INTEGER NOT NULL,
+                        bucket INTEGER NOT NULL,
+                        {key_columns}{value_columns},
+                        PRIMARY KEY ({primary_key})
+                    ) WITHOUT ROWID
+                """)
+                if keys:
+                    # Per-key lookups (e.g. one queryid over time)
+                    self._conn.execute(f"""
+                        CREATE INDEX IF NOT EXISTS {table}_by_key
+                        ON {table} (target, resolution, {', '.join(keys)}, bucket)
+                    """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS statement_text (
+                    target TEXT NOT NULL,
+                    queryid INTEGER NOT NULL,
+                    query TEXT,
+                    PRIMARY KEY (target, queryid)
+                ) WITHOUT ROWID
+            """)
+            # One row per distinct plan shape seen for a statement
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS plan_history (
+                    target TEXT NOT NULL,
+                    queryid INTEGER NOT NULL,
+                    plan_hash TEXT NOT NULL,
+                    first_seen INTEGER NOT NULL,
+                    last_seen INTEGER NOT NULL,
+                    captures INTEGER NOT NULL,
+                    mean_exec_time REAL,
+                    plan TEXT,
+                    PRIMARY KEY (target, queryid, plan_hash)
+                ) WITHOUT ROWID
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS plan_alerts (
+                    target TEXT NOT NULL,
+                    queryid INTEGER NOT NULL,
+                    plan_hash TEXT NOT NULL,
+                    detected_at INTEGER NOT NULL,
+                    previous_hash TEXT,
+                    previous_mean_exec_time REAL,
+                    mean_exec_time REAL,
+                    query TEXT,
+                    PRIMARY KEY (target, queryid, plan_hash)
+                ) WITHOUT ROWID
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS rollup_state (
+                    series TEXT NOT NULL,
+                    resolution INTEGER NOT NULL,
+                    watermark INTEGER NOT NULL,
+                    PRIMARY KEY (series, resolution)
+                )
+            """)
+
+    def record(self, dsn: Optional[str], snapshot: Snapshot,
+               statement_delta: Optional[pd.DataFrame] = None):
+        """Append one raw sample; rollups and retention run at most once a minute"""
+        target = self.target_key(dsn)
+        bucket = int(snapshot.collected_at.timestamp())
+        limit = settings.HISTORY_MAX_RELATIONS
+
+        rows = {
+            'basic_history': [{
+                'active_connections': snapshot.basic_stats.get('active_connections'),
+                'database_size_bytes': snapshot.basic_stats.get('database_size_bytes'),
+                'table_count': snapshot.basic_stats.get('table_count'),
+            }],
+            # Bounded to the most interesting relations so huge catalogs stay cheap
+            'table_history': snapshot.largest_tables.head(limit).to_dict('records'),
+            'index_history': snapshot.index_usage.head(limit).to_dict('records'),
+        }
+        if statement_delta is not None:
+            rows['sample_history'] = [{'interval_seconds': statement_delta.attrs.get('interval_seconds', 0.0)}]
+        if statement_delta is not None and not statement_delta.empty:
+            # The same queryid can appear once per (userid, dbid); history is per queryid
+            aggregations = {c: 'sum' for c in SERIES['statement_history'][1] if c in statement_delta}
+            if 'query' in statement_delta:
+                aggregations['query'] = 'first'
+            statement_delta = statement_delta.groupby('queryid', as_index=False).agg(aggregations)
+            rows['statement_history'] = statement_delta.to_dict('records')
+
+        with self._lock, self._conn:
+            for table, records in rows.items():
+                keys, values = SERIES[table]
+                columns = ['target', 'resolution', 'bucket'] + keys + list(values)
+                placeholders = ', '.join('?' * len(columns))
+                self._conn.executemany(
+                    f"INSERT OR REPLACE INTO {table} ({', '.join(columns)}) VALUES ({placeholders})",
+                    [[target, RAW, bucket] + [r.get(c) for c in keys + list(values)] for r in records]
+                )
+            if statement_delta is not None and not statement_delta.empty and 'query' in statement_delta:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO statement_text (target, queryid, query) VALUES (?, ?, ?)",
+                    [(target, int(q), text) for q, text in zip(statement_delta['queryid'], statement_delta['query'])]
+                )
+
+        if time.monotonic() - self._last_compaction > 60:
+            self.compact()
+
+    def compact(self, now: Optional[float] = None):
+        """Roll completed buckets up (raw -> 1 min -> 1 h) and apply retention"""
+        now = now if now is not None else time.time()
+        with self._lock, self._conn:
+            for table, (keys, values) in SERIES.items():
+                for source, destination in ((RAW, MINUTE), (MINUTE, HOUR)):
+                    self._rollup(table, keys, values, source, destination, now)
+            for table in SERIES:
+                for resolution, keep in self.retention.items():
+                    self._conn.execute(
+                        f"DELETE FROM {table} WHERE resolution = ? AND bucket < ?",
+                        (resolution, int(now - keep.total_seconds()))
+                    )
+            # Plans and alerts live as long as the coarsest statement history
+            oldest = int(now - self.retention[HOUR].total_seconds())
+            self._conn.execute("DELETE FROM plan_history WHERE last_seen < ?", (oldest,))
+            self._conn.execute("DELETE FROM plan_alerts WHERE detected_at < ?", (oldest,))
+            # Texts of statements with no history left at any resolution
+            self._conn.execute(f"""
+                DELETE FROM statement_text WHERE NOT EXISTS (
+                    SELECT 1 FROM statement_history h
+                    WHERE h.target = statement_text.target AND h.resolution IN ({RAW}, {MINUTE}, {HOUR})
+                    AND h.queryid = statement_text.queryid
+                )
+            """)
+        self._last_compaction = time.monotonic()
+
+    def _rollup(self, table: str, keys: List[str], values: Dict[str, str],
+                source: int, destination: int, now: float):
+        row = self._conn.execute(
+            "SELECT watermark FROM rollup_state WHERE series = ? AND resolution = ?",
+            (table, destination)
+        ).fetchone()
+        watermark = row[0] if row else 0
+        # Only buckets that can no longer receive samples
+        upper = int(now // destination) * destination
+        if upper <= watermark:
+            return
+
+        key_list = ''.join(f"{k}, " for k in keys)
+        aggregates = ', '.join(f"{agg}({col})" for col, agg in values.items())
+        self._conn.execute(f"""
+            INSERT OR REPLACE INTO {table}
+                (target, resolution, bucket, {key_list}{', '.join(values)})
+            SELECT target, ?, (bucket / ?) * ?, {key_list}{aggregates}
+            FROM {table}
+            WHERE resolution = ? AND bucket >= ? AND bucket < ?
+            GROUP BY target, (bucket / ?) * ?{''.join(f', {k}' for k in keys)}
+        """, (destination, destination, destination, source, watermark, upper, destination, destination))
+        self._conn.execute(
+            "INSERT OR REPLACE INTO rollup_state (series, resolution, watermark) VALUES (?, ?, ?)",
+            (table, destination, upper)
+        )
+
+    def resolution_for(self, start: datetime) -> int:
+        """Finest resolution whose retention still covers `start`"""
+        age = datetime.now() - start
+        for resolution in (RAW, MINUTE, HOUR):
+            if age <= self.retention[resolution]:
+                return resolution
+        return HOUR
+
+    def _read(self, table: str, dsn: Optional[str], start: datetime, end: datetime,
+              where: str = '', params: Sequence = ()) -> pd.DataFrame:
+        resolution = self.resolution_for(start)
+        query = f"""
+            SELECT * FROM {table}
+            WHERE target = ? AND resolution = ? AND bucket >= ? AND bucket < ? {where}
+            ORDER BY bucket
+        """
+        with self._lock:
+            df = pd.read_sql(query, self._conn, params=[
+                self.target_key(dsn), resolution, int(start.timestamp()), int(end.timestamp()), *params
+            ])
+        df['bucket'] = pd.to_datetime(df['bucket'], unit='s')
+        return df.drop(columns=['target'])
+
+    def basic_series(self, dsn: Optional[str], start: datetime,
+                     end: Optional[datetime] = None) -> pd.DataFrame:
+        return self._read('basic_history', dsn, start, end or datetime.now())
+
+    def table_series(self, dsn: Optional[str], start: datetime,
+                     end: Optional[datetime] = None) -> pd.DataFrame:
+        return self._read('table_history', dsn, start, end or datetime.now())
+
+    def index_series(self, dsn: Optional[str], start: datetime,
+                     end: Optional[datetime] = None) -> pd.DataFrame:
+        return self._read('index_history', dsn, start, end or datetime.now())
+
+    def record_index_scans(self, dsn: Optional[str], scans: pd.DataFrame, checked_at: datetime) -> int:
+        """Record one check of every index's scan counter at hourly resolution.
+
+        Only counters that changed since their last row (or whose last row is
+        INDEX_SCAN_HEARTBEAT old) are written; returns how many were.
+        """
+        target = self.target_key(dsn)
+        bucket = int(checked_at.timestamp()) // HOUR * HOUR
+        with self._lock, self._conn:
+            # SQLite returns the other columns of the row holding the MAX()
+            last = {
+                (table, index): (value, seen)
+                for table, index, value, seen in self._conn.execute("""
+                    SELECT table_name, index_name, number_of_scans, MAX(bucket)
+                    FROM index_scan_history WHERE target = ? AND resolution = ?
+                    GROUP BY table_name, index_name
+                """, (target, HOUR))
+            }
+            rows = []
+            for table, index, value in zip(scans['table_name'], scans['index_name'], scans['number_of_scans']):
+                previous = last.get((table, index))
+                if previous is None or previous[0] != value or previous[1] <= bucket - INDEX_SCAN_HEARTBEAT:
+                    rows.append((target, HOUR, bucket, table, index, float(value)))
+            self._conn.executemany(
+                """INSERT OR REPLACE INTO index_scan_history
+                   (target, resolution, bucket, table_name, index_name, number_of_scans) VALUES (?, ?, ?, ?, ?, ?)""",
+                rows
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO index_scan_checks (target, resolution, bucket, indexes) VALUES (?, ?, ?, ?)",
+                (target, HOUR, bucket, len(scans))
+            )
+        return len(rows)
+
+    def index_scan_series(self, dsn: Optional[str], start: datetime,
+                          end: Optional[datetime] = None) -> pd.DataFrame:
+        """Scan counter rows within [start, end), plus each index's last row before start"""
+        target = self.target_key(dsn)
+        start_bucket, end_bucket = int(start.timestamp()), int((end or datetime.now()).timestamp())
+        query = """
+            SELECT h.* FROM index_scan_history h
+            JOIN (
+                SELECT table_name, index_name, MAX(bucket) AS bucket FROM index_scan_history
+                WHERE target = ? AND resolution = ? AND bucket < ?
+                GROUP BY table_name, index_name
+            ) baseline USING (table_name, index_name, bucket)
+            WHERE h.target = ? AND h.resolution = ?
+            UNION ALL
+            SELECT * FROM index_scan_history
+            WHERE target = ? AND resolution = ? AND bucket >= ? AND bucket < ?
+            ORDER BY bucket
+        """
+        with self._lock:
+            df = pd.read_sql(query, self._conn, params=[
+                target, HOUR, start_bucket, target, HOUR, target, HOUR, start_bucket, end_bucket
+            ])
+        df['bucket'] = pd.to_datetime(df['bucket'], unit='s')
+        return df.drop(columns=['target'])
+
+    def index_scans_checked(self, dsn: Optional[str], start: datetime,
+                            end: Optional[datetime] = None) -> Optional[pd.Timestamp]:
+        """Bucket of the latest index scan check within [start, end), if any"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MAX(bucket) FROM index_scan_checks WHERE target = ? AND resolution = ? "
+                "AND bucket >= ? AND bucket < ?",
+                (self.target_key(dsn), HOUR, int(start.timestamp()), int((end or datetime.now()).timestamp()))
+            ).fetchone()
+        return pd.to_datetime(row[0], unit='s') if row[0] is not None else None
+
+    def statement_series(self, dsn: Optional[str], start: datetime, end: Optional[datetime] = None,
+                         queryids: Optional[Sequence[int]] = None) -> pd.DataFrame:
+        """Per-bucket statement deltas, optionally restricted to some queryids"""
+        where, params = '', []
+        if queryids:
+            where = f"AND queryid IN ({', '.join('?' * len(queryids))})"
+            params = [int(q) for q in queryids]
+        end = end or datetime.now()
+        df = self._read('statement_history', dsn, start, end, where, params)
+        # Files written before sample_history kept a per-statement interval
+        df = df.drop(columns=['interval_seconds'], errors='ignore')
+        coverage = self._read('sample_history', dsn, start, end)[['bucket', 'interval_seconds']]
+        df = df.merge(coverage, on='bucket', how='left')
+        seconds = df['interval_seconds'].where(df['interval_seconds'] > 0)
+        df['exec_ms_per_sec'] = df['total_exec_time'] / seconds
+        df['calls_per_sec'] = df['calls'] / seconds
+        return df
+
+    def top_statements(self, dsn: Optional[str], start: datetime, end: Optional[datetime] = None,
+                       limit: int = 10) -> pd.DataFrame:
+        """Statements with the most total execution time in a time range"""
+        end = end or datetime.now()
+        query = """
+            SELECT h.queryid, t.query, SUM(h.calls) AS calls,
+                   SUM(h.total_exec_time) AS total_exec_time,
+                   SUM(h.total_exec_time) / NULLIF(SUM(h.calls), 0) AS mean_exec_time
+            FROM statement_history h
+            LEFT JOIN statement_text t ON t.target = h.target AND t.queryid = h.queryid
+            WHERE h.target = ? AND h.resolution = ? AND h.bucket >= ? AND h.bucket < ?
+            GROUP BY h.queryid, t.query
+            ORDER BY total_exec_time DESC
+            LIMIT ?
+        """
+        with self._lock:
+            return pd.read_sql(query, self._conn, params=[
+                self.target_key(dsn), self.resolution_for(start),
+                int(start.timestamp()), int(end.timestamp()), limit
+            ])
+
+    def record_plan(self, dsn: Optional[str], queryid: int, plan_hash: str, plan: str,
+                    mean_exec_time: Optional[float], captured_at: datetime) -> Optional[Dict]:
+        """Record a captured plan for a statement.
+
+        Returns the previously captured plan when this one differs from it
+        (a plan flip, including back to an older shape), None when the plan
+        is unchanged or the first one seen.
+        """
+        target = self.target_key(dsn)
+        seen = int(captured_at.timestamp())
+        with self._lock, self._conn:
+            previous = self._conn.execute("""
+                SELECT plan_hash, mean_exec_time, last_seen FROM plan_history
+                WHERE target = ? AND queryid = ?
+                ORDER BY last_seen DESC LIMIT 1
+            """, (target, int(queryid))).fetchone()
+            updated = self._conn.execute("""
+                UPDATE plan_history
+                SET last_seen = ?, captures = captures + 1,
+                    mean_exec_time = COALESCE(?, mean_exec_time), plan = ?
+                WHERE target = ? AND queryid = ? AND plan_hash = ?
+            """, (seen, mean_exec_time, plan, target, int(queryid), plan_hash)).rowcount
+            if not updated:
+                self._conn.execute(
+                    "INSERT INTO plan_history (target, queryid, plan_hash, first_seen, last_seen, captures, "
+                    "mean_exec_time, plan) VALUES (?, ?, ?, ?, ?, 1, ?, ?)",
+                    (target, int(queryid), plan_hash, seen, seen, mean_exec_time, plan)
+                )
+        if previous is None or previous[0] == plan_hash:
+            return None
+        return {'plan_hash': previous[0], 'mean_exec_time': previous[1], 'last_seen': previous[2]}
+
+    def plan_history(self, dsn: Optional[str], queryid: int) -> pd.DataFrame:
+        """Distinct plans seen for a statement, newest first"""
+        with self._lock:
+            df = pd.read_sql("""
+                SELECT plan_hash, first_seen, last_seen, captures, mean_exec_time, plan
+                FROM plan_history WHERE target = ? AND queryid = ?
+                ORDER BY last_seen DESC
+            """, self._conn, params=[self.target_key(dsn), int(queryid)])
+        for column in ('first_seen', 'last_seen'):
+            df[column] = pd.to_datetime(df[column], unit='s')
+        return df
+
+    def record_plan_alert(self, dsn: Optional[str], alert: Dict):
+        with self._lock, self._conn:
+            self._conn.execute("""
+                INSERT OR REPLACE INTO plan_alerts
+                    (target, queryid, plan_hash, detected_at, previous_hash,
+                     previous_mean_exec_time, mean_exec_time, query)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, (self.target_key(dsn), int(alert['queryid']), alert['plan_hash'],
+                  int(alert['detected_at'].timestamp()), alert['previous_hash'],
+                  alert['previous_mean_exec_time'], alert['mean_exec_time'], alert['query']))
+
+    def plan_alerts(self, dsn: Optional[str], start: datetime) -> pd.DataFrame:
+        with self._lock:
+            df = pd.read_sql("""
+                SELECT queryid, plan_hash, detected_at, previous_hash,
+                       previous_mean_exec_time, mean_exec_time, query
+                FROM plan_alerts WHERE target = ? AND detected_at >= ?
+                ORDER BY detected_at DESC
+            """, self._conn, params=[self.target_key(dsn), int(start.timestamp())])
+        df['detected_at'] = pd.to_datetime(df['detected_at'], unit='s')
+        return df
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,393 @@
+# core/index_advisor.py
+import bisect
+import logging
+import pandas as pd
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+from config.settings import settings
+from models.database import DatabaseConnection
+from core.query_analyzer import QueryAnalyzer, quote_ident
+from core.plan_analyzer import PlanAnalyzer
+
+# Planner defaults (selfuncs.h) for columns without statistics
+DEFAULT_EQ_SELECTIVITY = 0.005
+DEFAULT_RANGE_SELECTIVITY = 1 / 3
+
+# Relations, existing indexes and column statistics for the tables of a
+# workload, in one round trip; table names are quoted identifiers (see
+# QueryAnalyzer.extract_columns) and resolve through the search_path
+CATALOG_SQL = """
+    WITH rels AS (
+        SELECT DISTINCT r.name, to_regclass(r.name) AS oid
+        FROM unnest(%(names)s::text[]) AS r(name)
+    )
+    SELECT json_build_object(
+        'relations', (
+            SELECT json_agg(json_build_object(
+                'name', r.name,
+                'oid', c.oid,
+                'relname', format('%%I.%%I', n.nspname, c.relname),
+                'reltuples', greatest(c.reltuples, 0),
+                'relpages', c.relpages
+            ))
+            FROM rels r
+            JOIN pg_class c ON c.oid = r.oid
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+        ),
+        'indexes', (
+            SELECT json_agg(json_build_object(
+                'table_oid', i.indrelid,
+                'name', ic.relname,
+                'columns', (
+                    SELECT array_agg(a.attname ORDER BY k.ord)
+                    FROM unnest(i.indkey) WITH ORDINALITY AS k(attnum, ord)
+                    LEFT JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = k.attnum
+                ),
+                'usable', i.indisvalid AND i.indpred IS NULL AND am.amname = 'btree'
+            ))
+            FROM pg_index i
+            JOIN pg_class ic ON ic.oid = i.indexrelid
+            JOIN pg_am am ON am.oid = ic.relam
+            WHERE i.indrelid IN (SELECT oid FROM rels)
+        ),
+        'columns', (
+            SELECT json_agg(json_build_object(
+                'table_oid', a.attrelid,
+                'column', a.attname,
+                'null_frac', s.null_frac,
+                'n_distinct', s.n_distinct,
+                'mcv_values', s.most_common_vals::text::text[],
+                'mcv_freqs', s.most_common_freqs,
+                'histogram', s.histogram_bounds::text::text[]
+            ))
+            FROM pg_attribute a
+            JOIN pg_class c ON c.oid = a.attrelid
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            LEFT JOIN LATERAL (
+                SELECT * FROM pg_stats s
+                WHERE s.schemaname = n.nspname AND s.tablename = c.relname AND s.attname = a.attname
+                ORDER BY s.inherited
+                LIMIT 1
+            ) s ON true
+            WHERE a.attrelid IN (SELECT oid FROM rels) AND a.attnum > 0 AND NOT a.attisdropped
+        ),
+        'hypopg', EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'hypopg')
+    )
+"""
+
+
+class IndexAdvisor:
+    """Workload-wide index recommendations.
+
+    Predicate, join, ORDER BY and GROUP BY columns of the heaviest
+    statements are matched against existing indexes and column statistics;
+    candidates are ranked by the execution time they could save and, when
+    hypopg is installed, re-checked with hypothetical indexes.
+    """
+
+    def __init__(self, dsn: Optional[str] = None):
+        self.dsn = dsn
+        self.db_connection = DatabaseConnection
+        self.query_analyzer = QueryAnalyzer()
+
+    def recommend(self, statements: pd.DataFrame) -> pd.DataFrame:
+        """Ranked index candidates for a workload (query, calls, total_exec_time)"""
+        columns = ['table', 'columns', 'definition', 'statements', 'calls', 'estimated_benefit_ms',
+                   'validated_benefit_ms', 'uses_index', 'selectivity', 'table_rows', 'example_query']
+        if statements is None or statements.empty:
+            return pd.DataFrame(columns=columns)
+        statements = statements.nlargest(settings.ADVISOR_MAX_STATEMENTS, 'total_exec_time')
+        usages = [(row, self.query_analyzer.extract_columns(row['query']))
+                  for row in statements.to_dict('records')]
+        names = sorted({table for _, usage in usages for table in usage['tables'].values()})
+        if not names:
+            return pd.DataFrame(columns=columns)
+
+        catalog = self._load_catalog(names)
+        candidates: Dict[Tuple[str, Tuple[str, ...]], Dict] = {}
+        for row, usage in usages:
+            for candidate in self._statement_candidates(row, usage, catalog):
+                key = (candidate['table'], candidate['columns'])
+                merged = candidates.setdefault(key, {
+                    **candidate, 'estimated_benefit_ms': 0.0, 'queries': []
+                })
+                merged['estimated_benefit_ms'] += candidate['benefit_ms']
+                merged['selectivity'] = min(merged['selectivity'], candidate['selectivity'])
+                merged['queries'].append((row['total_exec_time'], row['query'], row.get('calls', 0), candidate['benefit_ms']))
+
+        ranked = self._fold_prefixes(list(candidates.values()))
+        ranked.sort(key=lambda c: c['estimated_benefit_ms'], reverse=True)
+        if catalog['hypopg']:
+            self._validate_with_hypopg(ranked[:settings.ADVISOR_HYPOPG_CANDIDATES])
+
+        return pd.DataFrame([{
+            'table': c['table'],
+            'columns': ', '.join(c['columns']),
+            'definition': f"CREATE INDEX CONCURRENTLY ON {c['table']} ({self._column_list(c['columns'])})",
+            'statements': len(c['queries']),
+            'calls': sum(q[2] for q in c['queries']),
+            'estimated_benefit_ms': c['estimated_benefit_ms'],
+            'validated_benefit_ms': c.get('validated_benefit_ms'),
+            'uses_index': c.get('uses_index'),
+            'selectivity': c['selectivity'],
+            'table_rows': c['table_rows'],
+            'example_query': max(c['queries'])[1],
+        } for c in ranked], columns=columns)
+
+    def _load_catalog(self, names: List[str]) -> Dict:
+        with self.db_connection.get_connection(self.dsn) as conn:
+            with conn.cursor() as cur:
+                cur.execute(CATALOG_SQL, {'names': names})
+                document = cur.fetchone()[0]
+            conn.rollback()
+
+        relations = {r['oid']: r for r in document['relations'] or []}
+        # Different spellings of a table ('orders', 'public.orders') share one entry
+        by_name = {r['name']: relations[r['oid']] for r in document['relations'] or []}
+        for relation in relations.values():
+            relation['indexes'], relation['stats'] = [], {}
+        for index in document['indexes'] or []:
+            relations[index['table_oid']]['indexes'].append(index)
+        for column in document['columns'] or []:
+            relations[column['table_oid']]['stats'][column['column']] = column
+        return {'by_name': by_name, 'hypopg': document['hypopg']}
+
+    def _statement_candidates(self, row: Dict, usage: Dict, catalog: Dict) -> List[Dict]:
+        tables = {name: catalog['by_name'][name] for name in set(usage['tables'].values())
+                  if name in catalog['by_name']}
+        if not tables:
+            return []
+
+        def resolve(ref) -> Optional[str]:
+            qualifier, column = ref
+            if qualifier is not None:
+                table = usage['tables'].get(qualifier)
+                return table if table in tables else None
+            owners = [name for name, relation in tables.items() if column in relation['stats']]
+            return owners[0] if len(owners) == 1 else None
+
+        # Per table: equality / range / order columns, in query order
+        per_table = defaultdict(lambda: {'equality': [], 'range': [], 'order_by': [], 'group_by': []})
+        for kind in ('equality', 'range', 'order_by', 'group_by'):
+            for ref in usage[kind]:
+                table = resolve(ref)
+                if table and ref[1] not in per_table[table][kind]:
+                    per_table[table][kind].append(ref[1])
+        # Join columns are looked up by equality on the inner side of a nested loop
+        for pair in usage['join']:
+            for ref in pair:
+                table = resolve(ref)
+                if table and ref[1] not in per_table[table]['equality']:
+                    per_table[table]['equality'].append(ref[1])
+
+        total_pages = sum(max(relation['relpages'], 1) for relation in tables.values())
+        candidates = []
+        for table, used in per_table.items():
+            relation = tables[table]
+            if relation['reltuples'] < settings.ADVISOR_MIN_TABLE_ROWS:
+                continue
+
+            selectivity = {}
+            for column in used['equality']:
+                value = self._value_for(usage, table, column)
+                selectivity[column] = self.equality_selectivity(
+                    relation, column, value if value and value[0] == '=' else None
+                )
+            for column in used['range']:
+                if column not in selectivity:
+                    selectivity[column] = self.range_selectivity(relation, column, self._value_for(usage, table, column))
+
+            # Most selective equality columns first, then one range column;
+            # with no range predicate, ORDER BY (or else GROUP BY) columns
+            # that all belong to this table let the index return the matching
+            # rows already sorted
+            index_columns = sorted(used['equality'], key=selectivity.get)[:settings.ADVISOR_MAX_COLUMNS]
+            ranges = sorted((c for c in used['range'] if c not in index_columns), key=selectivity.get)
+            ordering = next((used[kind] for kind in ('order_by', 'group_by')
+                             if used[kind] and len(usage[kind]) == len(used[kind])), [])
+            if ranges and len(index_columns) < settings.ADVISOR_MAX_COLUMNS:
+                index_columns.append(ranges[0])
+            elif not ranges and ordering and index_columns:
+                index_columns += [c for c in ordering if c not in index_columns]
+                index_columns = index_columns[:settings.ADVISOR_MAX_COLUMNS]
+            if not index_columns:
+                continue
+
+            combined = self._combined_selectivity(index_columns, selectivity, relation)
+            sorts_avoided = not ranges and bool(ordering) and len(index_columns) > len(used['equality'])
+            if combined > settings.ADVISOR_MAX_SELECTIVITY and not sorts_avoided:
+                continue  # a sequential scan is as good
+
+            # What the best existing index already achieves for this statement
+            existing = min((self._combined_selectivity(self._usable_prefix(index, used), selectivity, relation)
+                            for index in relation['indexes'] if index['usable']), default=1.0)
+            if existing <= combined * 2:
+                continue
+
+            share = max(relation['relpages'], 1) / total_pages
+            candidates.append({
+                'table': relation['relname'],
+                'columns': tuple(index_columns),
+                'selectivity': combined,
+                'table_rows': relation['reltuples'],
+                'benefit_ms': row['total_exec_time'] * share * (1 - combined / existing),
+            })
+        return candidates
+
+    @staticmethod
+    def _column_list(columns) -> str:
+        return ', '.join(quote_ident(column) for column in columns)
+
+    @staticmethod
+    def _value_for(usage: Dict, table: str, column: str) -> Optional[Tuple[str, str]]:
+        for (qualifier, name), value in usage['values'].items():
+            if name == column and (qualifier is None or usage['tables'].get(qualifier) == table):
+                return value
+        return None
+
+    @staticmethod
+    def _usable_prefix(index: Dict, used: Dict) -> List[str]:
+        """Leading index columns a statement can use: equalities, then one range"""
+        prefix = []
+        for column in index['columns']:
+            if column in used['equality']:
+                prefix.append(column)
+                continue
+            if column in used['range']:
+                prefix.append(column)
+            break
+        return prefix
+
+    @staticmethod
+    def _combined_selectivity(columns: List[str], selectivity: Dict[str, float], relation: Dict) -> float:
+        if not columns:
+            return 1.0
+        combined = 1.0
+        for column in columns:
+            combined *= selectivity.get(column, 1.0)
+        return max(combined, 1.0 / max(relation['reltuples'], 1.0))
+
+    @staticmethod
+    def equality_selectivity(relation: Dict, column: str, value: Optional[Tuple[str, str]] = None) -> float:
+        """Fraction of rows matching `column = value` (expected value when unknown)"""
+        stats = relation['stats'].get(column) or {}
+        if stats.get('n_distinct') is None:
+            return DEFAULT_EQ_SELECTIVITY
+        null_frac = stats.get('null_frac') or 0.0
+        distinct = stats['n_distinct'] if stats['n_distinct'] > 0 else -stats['n_distinct'] * relation['reltuples']
+        distinct = max(distinct, 1.0)
+        mcv_values, mcv_freqs = stats.get('mcv_values') or [], stats.get('mcv_freqs') or []
+
+        if value is not None and value[1] in mcv_values:
+            return mcv_freqs[mcv_values.index(value[1])]
+        others = max(distinct - len(mcv_freqs), 1.0)
+        rest = max(1.0 - null_frac - sum(mcv_freqs), 0.0)
+        if value is not None:
+            return rest / others
+        # A parameter drawn from the data itself: common values are queried more often
+        return sum(f * f for f in mcv_freqs) + rest * rest / others
+
+    @staticmethod
+    def range_selectivity(relation: Dict, column: str, value: Optional[Tuple[str, str]] = None) -> float:
+        """Fraction of rows in a range, from the histogram when the bound is a literal"""
+        stats = relation['stats'].get(column) or {}
+        histogram = stats.get('histogram') or []
+        if value is None or len(histogram) < 2 or value[0] not in ('<', '<=', '>', '>='):
+            return DEFAULT_RANGE_SELECTIVITY
+        try:
+            bounds = [float(b) for b in histogram]
+            below = bisect.bisect_left(bounds, float(value[1])) / (len(bounds) - 1)
+        except ValueError:
+            return DEFAULT_RANGE_SELECTIVITY
+        fraction = min(below, 1.0) if value[0] in ('<', '<=') else 1.0 - min(below, 1.0)
+        return max(fraction * (1.0 - (stats.get('null_frac') or 0.0)), 1.0 / max(relation['reltuples'], 1.0))
+
+    @staticmethod
+    def _fold_prefixes(candidates: List[Dict]) -> List[Dict]:
+        """An index on (a, b) also serves lookups on (a); merge such candidates"""
+        candidates.sort(key=lambda c: len(c['columns']), reverse=True)
+        kept = []
+        for candidate in candidates:
+            wider = next((k for k in kept if k['table'] == candidate['table']
+                          and k['columns'][:len(candidate['columns'])] == candidate['columns']), None)
+            if wider is None:
+                kept.append(candidate)
+            else:
+                wider['estimated_benefit_ms'] += candidate['estimated_benefit_ms']
+                wider['queries'] += candidate['queries']
+        return kept
+
+    def _validate_with_hypopg(self, candidates: List[Dict]):
+        """Compare plan costs with and without each candidate as a hypothetical index"""
+        with self.db_connection.get_connection(self.dsn) as conn:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(f"SET LOCAL statement_timeout = {int(settings.PLAN_STATEMENT_TIMEOUT * 1000)};")
+                    # The heaviest statements behind a candidate are enough to check it
+                    checks = {id(c): sorted(c['queries'], reverse=True)[:3] for c in candidates}
+                    baseline = {}
+                    for queries in checks.values():
+                        for _, query, _, _ in queries:
+                            if query not in baseline:
+                                baseline[query] = self._isolated(cur, lambda: self._plan_cost(cur, query),
+                                                                 "Error planning statement for index validation")
+
+                    # Each candidate in its own savepoint: a failing EXPLAIN
+                    # (timeout, permissions) leaves only that one unvalidated
+                    for candidate in candidates:
+                        outcome = self._isolated(
+                            cur, lambda: self._check_candidate(cur, candidate, checks[id(candidate)], baseline),
+                            f"Error validating index candidate on {candidate['table']}"
+                        )
+                        candidate['validated_benefit_ms'], candidate['uses_index'] = outcome or (None, None)
+                        cur.execute("SELECT hypopg_reset();")
+            except Exception as e:
+                logging.error(f"Error validating index candidates with hypopg: {e}")
+            finally:
+                # Hypothetical indexes live in the backend, not the transaction:
+                # a pooled connection must not keep them past this call
+                try:
+                    conn.rollback()
+                    with conn.cursor() as cur:
+                        cur.execute("SELECT hypopg_reset();")
+                    conn.rollback()
+                except Exception as e:
+                    logging.error(f"Error resetting hypothetical indexes, discarding the connection: {e}")
+                    conn.close()  # released connections that are closed are dropped from the pool
+
+    def _check_candidate(self, cur, candidate: Dict, queries: List, baseline: Dict) -> Optional[Tuple[float, bool]]:
+        cur.execute("SELECT indexname FROM hypopg_create_index(%s);", (
+            f"CREATE INDEX ON {candidate['table']} ({self._column_list(candidate['columns'])})",
+        ))
+        index_name = cur.fetchone()[0]
+        validated, uses_index, checked = 0.0, False, False
+        for total_exec_time, query, _, _ in queries:
+            if not baseline[query]:
+                continue
+            plan = PlanAnalyzer.explain_with(cur, query)
+            checked = True
+            if any(node.index_name == index_name for node in plan.nodes()):
+                uses_index = True
+                validated += total_exec_time * max(0.0, 1 - plan.root.total_cost / baseline[query])
+        return (validated, uses_index) if checked else None
+
+    @staticmethod
+    def _isolated(cur, check, error: str):
+        """Run a check in a savepoint; on failure log it, roll back to it and return None"""
+        cur.execute("SAVEPOINT index_check;")
+        try:
+            result = check()
+        except Exception as e:
+            logging.error(f"{error}: {e}")
+            cur.execute("ROLLBACK TO SAVEPOINT index_check;")
+            return None
+        cur.execute("RELEASE SAVEPOINT index_check;")
+        return result
+
+    @staticmethod
+    def _plan_cost(cur, query: str) -> Optional[float]:
+        try:
+            return PlanAnalyzer.explain_with(cur, query).root.total_cost
+        except ValueError:
+            # Not explainable here (utility statement, $n params before PG16)
+            return None
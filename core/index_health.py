@@ -0,0 +1,256 @@
+# core/index_health.py
+import logging
+import pandas as pd
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from config.settings import settings
+from models.database import DatabaseConnection
+from core.history_store import HistoryStore
+
+# Every user index with what is needed to compare definitions, plus its
+# usage and the write traffic of the table it has to be maintained for
+INDEX_DEFINITIONS_SQL = """
+    SELECT
+        s.schemaname || '.' || s.relname as table_name,
+        s.indexrelname as index_name,
+        format('%I.%I', s.schemaname, s.indexrelname) as qualified_name,
+        i.indrelid as table_oid,
+        array_to_string(ARRAY(
+            SELECT pg_get_indexdef(i.indexrelid, k, true)
+            FROM generate_series(1, i.indnkeyatts) AS k
+        ), ', ') as columns,
+        s.idx_scan as number_of_scans,
+        pg_relation_size(i.indexrelid) as index_bytes,
+        pg_size_pretty(pg_relation_size(i.indexrelid)) as index_size,
+        i.indisunique as is_unique,
+        i.indisprimary as is_primary,
+        i.indisvalid as is_valid,
+        EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = i.indexrelid) as backs_constraint,
+        am.amname as access_method,
+        i.indnkeyatts as key_count,
+        i.indkey::text as indkey,
+        i.indclass::text as indclass,
+        i.indcollation::text as indcollation,
+        COALESCE(pg_get_expr(i.indexprs, i.indrelid), '') as expressions,
+        COALESCE(pg_get_expr(i.indpred, i.indrelid), '') as predicate,
+        pg_get_indexdef(i.indexrelid) as definition,
+        t.n_tup_ins + t.n_tup_upd - t.n_tup_hot_upd as index_writes,
+        EXTRACT(EPOCH FROM now() - COALESCE(
+            (SELECT stats_reset FROM pg_stat_database WHERE datname = current_database()),
+            pg_postmaster_start_time()
+        ))::float8 as stats_age_seconds
+    FROM pg_stat_user_indexes s
+    JOIN pg_index i ON i.indexrelid = s.indexrelid
+    JOIN pg_class ic ON ic.oid = i.indexrelid
+    JOIN pg_am am ON am.oid = ic.relam
+    JOIN pg_stat_user_tables t ON t.relid = i.indrelid
+"""
+
+# Scan counter of every user index, checked hourly into index_scan_history
+INDEX_SCANS_SQL = """
+    SELECT
+        schemaname || '.' || relname as table_name,
+        indexrelname as index_name,
+        idx_scan as number_of_scans
+    FROM pg_stat_user_indexes
+"""
+
+INDEX_SCANS_DTYPES = {'table_name': str, 'index_name': str, 'number_of_scans': 'int64'}
+
+INDEX_DEFINITIONS_DTYPES = {
+    'table_name': str, 'index_name': str, 'qualified_name': str, 'table_oid': 'int64', 'columns': str,
+    'number_of_scans': 'int64', 'index_bytes': 'int64', 'index_size': str, 'is_unique': bool,
+    'is_primary': bool, 'is_valid': bool, 'backs_constraint': bool, 'access_method': str,
+    'key_count': 'int64', 'indkey': str, 'indclass': str, 'indcollation': str, 'expressions': str,
+    'predicate': str, 'definition': str, 'index_writes': 'int64', 'stats_age_seconds': 'float64'
+}
+
+FINDING_COLUMNS = [
+    'kind', 'table_name', 'index_name', 'columns', 'covered_by', 'scans', 'observed_days',
+    'index_bytes', 'index_size', 'writes_per_day', 'reason', 'action'
+]
+FINDING_ORDER = {'invalid': 0, 'duplicate': 1, 'redundant': 2, 'unused': 3}
+
+
+class IndexHealth:
+    """Finds indexes that cost more than they give: invalid, duplicate,
+    left-prefix redundant and unused ones.
+
+    Each finding carries the space a DROP would reclaim and the index
+    entries written per day to keep it up to date (inserts plus non-HOT
+    updates on its table).
+    """
+
+    def __init__(self, dsn: Optional[str] = None, history: Optional[HistoryStore] = None):
+        self.dsn = dsn
+        self.history = history
+        self.db_connection = DatabaseConnection
+
+    def get_index_definitions(self) -> pd.DataFrame:
+        with self.db_connection.get_connection(self.dsn) as conn:
+            return self.db_connection.read_frame(conn, INDEX_DEFINITIONS_SQL, INDEX_DEFINITIONS_DTYPES)
+
+    def record_scans(self, checked_at: Optional[datetime] = None) -> int:
+        """Check every index's scan counter into the history; returns the rows written"""
+        with self.db_connection.get_connection(self.dsn) as conn:
+            scans = self.db_connection.read_frame(conn, INDEX_SCANS_SQL, INDEX_SCANS_DTYPES)
+        return self.history.record_index_scans(self.dsn, scans, checked_at or datetime.now())
+
+    def find_issues(self, indexes: Optional[pd.DataFrame] = None,
+                    now: Optional[datetime] = None) -> pd.DataFrame:
+        """One row per index worth dropping, worst kind first, then by size"""
+        indexes = indexes if indexes is not None else self.get_index_definitions()
+        if indexes.empty:
+            return pd.DataFrame(columns=FINDING_COLUMNS)
+
+        indexes = indexes.copy()
+        stats_days = indexes['stats_age_seconds'] / 86400
+        indexes['writes_per_day'] = indexes['index_writes'] / stats_days.where(stats_days > 0)
+        indexes['scans'], indexes['observed_days'] = self._window_scans(indexes, now or datetime.now())
+        rows = indexes.to_dict('records')
+
+        findings: Dict[tuple, Dict] = {}
+
+        def add(row: Dict, kind: str, reason: str, covered_by: Optional[str] = None):
+            findings.setdefault((row['table_name'], row['index_name']), {
+                'kind': kind,
+                'table_name': row['table_name'],
+                'index_name': row['index_name'],
+                'columns': row['columns'],
+                'covered_by': covered_by,
+                'scans': row['scans'],
+                'observed_days': row['observed_days'],
+                'index_bytes': row['index_bytes'],
+                'index_size': row['index_size'],
+                'writes_per_day': row['writes_per_day'],
+                'reason': reason,
+                'action': f"DROP INDEX CONCURRENTLY {row['qualified_name']};"
+            })
+
+        for row in rows:
+            if not row['is_valid']:
+                add(row, 'invalid', "Left behind by a failed CREATE INDEX CONCURRENTLY: never used for reads "
+                                    "but still maintained on writes. Drop it, then recreate it if needed: "
+                                    f"{row['definition']}")
+
+        valid = [row for row in rows if row['is_valid']]
+        for group in self._duplicate_groups(valid):
+            keeper = min(group, key=self._keep_rank)
+            for row in group:
+                # A unique duplicate is safe to drop: the keeper enforces the same uniqueness
+                if row is not keeper and not row['is_primary'] and not row['backs_constraint']:
+                    add(row, 'duplicate', "Same columns, operator classes, predicate and access method "
+                                          f"as {keeper['index_name']}", keeper['index_name'])
+
+        for row in valid:
+            if self._is_required(row):
+                continue
+            covering = [other for other in valid if other is not row and self._covers(other, row)]
+            if covering:
+                other = max(covering, key=lambda o: o['scans'] or 0)
+                add(row, 'redundant', f"Its key columns are a leading prefix of {other['index_name']} "
+                                      f"({other['columns']}), which can serve the same lookups", other['index_name'])
+
+        for row in valid:
+            if self._is_required(row) or pd.isna(row['observed_days']):
+                continue
+            if row['scans'] <= settings.INDEX_UNUSED_MAX_SCANS \
+                    and row['observed_days'] >= settings.INDEX_UNUSED_MIN_DAYS:
+                add(row, 'unused', f"{int(row['scans'])} scans in {row['observed_days']:.1f} days")
+
+        result = pd.DataFrame(list(findings.values()), columns=FINDING_COLUMNS)
+        return result.assign(order=result['kind'].map(FINDING_ORDER)) \
+            .sort_values(['order', 'index_bytes'], ascending=[True, False]) \
+            .drop(columns='order').reset_index(drop=True)
+
+    @staticmethod
+    def summarize(findings: pd.DataFrame) -> Dict:
+        return {
+            'indexes': len(findings),
+            'bytes_reclaimable': int(findings['index_bytes'].sum()) if not findings.empty else 0,
+            'writes_per_day_saved': float(findings['writes_per_day'].fillna(0).sum()) if not findings.empty else 0.0
+        }
+
+    def _window_scans(self, indexes: pd.DataFrame, now: datetime):
+        """Scans and the days they were counted over, per index.
+
+        Cumulative idx_scan covers everything since the last stats reset,
+        which is the longest evidence when it is already low; otherwise the
+        hourly scan history of every index gives the scans within
+        INDEX_HEALTH_WINDOW_DAYS, counted up to the latest check.
+        """
+        scans = indexes['number_of_scans'].astype(float)
+        observed = indexes['stats_age_seconds'] / 86400
+        if self.history is None or not settings.HISTORY_ENABLED:
+            return scans, observed
+
+        start = now - timedelta(days=settings.INDEX_HEALTH_WINDOW_DAYS)
+        try:
+            series = self.history.index_scan_series(self.dsn, start, now)
+            checked = self.history.index_scans_checked(self.dsn, start, now)
+        except Exception as e:
+            logging.error(f"Error reading index history: {e}")
+            return scans, observed
+        if series.empty or checked is None:
+            return scans, observed
+
+        series = series.sort_values('bucket')
+        grouped = series.groupby(['table_name', 'index_name'])
+        # A counter that went down was reset: the new value is the increment
+        step = grouped['number_of_scans'].diff()
+        series['increment'] = step.where(step.isna() | (step >= 0), series['number_of_scans']).fillna(0)
+        windowed = series.groupby(['table_name', 'index_name']).agg(
+            window_scans=('increment', 'sum'),
+            first=('bucket', 'min')
+        )
+        # From the window start when a row before it is the baseline, else
+        # from the first check that saw the index; unchanged counters have no
+        # rows, so the latest check is the end of what was observed
+        first = windowed['first'].clip(lower=pd.to_datetime(int(start.timestamp()), unit='s'))
+        windowed['window_days'] = (checked - first).dt.total_seconds() / 86400
+
+        keys = list(zip(indexes['table_name'], indexes['index_name']))
+        window_scans = windowed['window_scans'].reindex(keys).to_numpy()
+        window_days = windowed['window_days'].reindex(keys).to_numpy()
+        use_window = (scans.to_numpy() > settings.INDEX_UNUSED_MAX_SCANS) & ~pd.isna(window_scans)
+        return (scans.where(~use_window, window_scans),
+                observed.where(~use_window, window_days))
+
+    @staticmethod
+    def _is_required(row: Dict) -> bool:
+        """Enforces a constraint or uniqueness; not droppable on usage grounds"""
+        return bool(row['is_unique'] or row['is_primary'] or row['backs_constraint'])
+
+    @staticmethod
+    def _keep_rank(row: Dict) -> tuple:
+        return (not row['is_primary'], not row['backs_constraint'], not row['is_unique'],
+                -(row['scans'] or 0), row['index_name'])
+
+    @staticmethod
+    def _duplicate_groups(rows: List[Dict]) -> List[List[Dict]]:
+        groups: Dict[tuple, List[Dict]] = {}
+        for row in rows:
+            key = (row['table_oid'], row['access_method'], row['key_count'], row['indkey'], row['indclass'],
+                   row['indcollation'], row['expressions'], row['predicate'])
+            groups.setdefault(key, []).append(row)
+        return [group for group in groups.values() if len(group) > 1]
+
+    @staticmethod
+    def _covers(longer: Dict, shorter: Dict) -> bool:
+        """True when `longer` is a btree whose leading keys are all of `shorter`'s keys"""
+        if longer['table_oid'] != shorter['table_oid'] \
+                or longer['access_method'] != 'btree' or shorter['access_method'] != 'btree' \
+                or longer['predicate'] or shorter['predicate'] \
+                or longer['expressions'] or shorter['expressions']:
+            return False
+        n = shorter['key_count']
+        long_keys, short_keys = longer['indkey'].split(), shorter['indkey'].split()
+        if longer['key_count'] < n or long_keys[:n] != short_keys[:n] \
+                or longer['indclass'].split()[:n] != shorter['indclass'].split() \
+                or longer['indcollation'].split()[:n] != shorter['indcollation'].split():
+            return False
+        # INCLUDE columns of the shorter one must still be available, and an
+        # identical definition is a duplicate rather than a prefix
+        if not set(short_keys[n:]) <= set(long_keys):
+            return False
+        return long_keys != short_keys or longer['key_count'] != n
@@ -0,0 +1,202 @@
+# core/metrics_exporter.py
+import gzip
+import threading
+import time
+import logging
+import pandas as pd
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from config.settings import settings
+from core.sampler import SampleStore
+from utils.helpers import fold_tail
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+# Label value of the series a long tail is folded into; reserved so it
+# can't collide with a real table, index or queryid
+OTHER_LABEL = '__other__'
+
+# name -> (type, help); every sample of a family must be contiguous in the
+# exposition, so families are rendered in this order across all targets
+FAMILIES: Dict[str, Tuple[str, str]] = {
+    'dbmindful_up': ('gauge', "1 if the last collection succeeded"),
+    'dbmindful_collect_errors': ('counter', "Failed collections"),
+    'dbmindful_collect_duration_seconds': ('gauge', "Duration of the last collection"),
+    'dbmindful_collect_round_trips': ('gauge', "Database round trips of the last collection"),
+    'dbmindful_collect_query_seconds': ('gauge', "Client-side time of each statement of the last collection"),
+    'dbmindful_collect_server_seconds': ('gauge', "Server time of the snapshot statement of the last collection"),
+    'dbmindful_collect_relation_subsets': ('gauge', "Relation subsets rotated through by the guarded collector"),
+    'dbmindful_last_collect_timestamp_seconds': ('gauge', "Unix time of the last successful collection"),
+    'dbmindful_database_size_bytes': ('gauge', "Database size"),
+    'dbmindful_active_connections': ('gauge', "Backends connected to the database"),
+    'dbmindful_statement_calls_per_second': ('gauge', "Calls per second over the last interval"),
+    'dbmindful_statement_exec_seconds_per_second': ('gauge', "Execution seconds per second over the last interval"),
+    'dbmindful_statement_mean_exec_seconds': ('gauge', "Mean execution time over the last interval"),
+    'dbmindful_statement_rows_per_second': ('gauge', "Rows per second over the last interval"),
+    'dbmindful_statement_blocks_read_per_second': ('gauge', "Shared blocks read per second over the last interval"),
+    'dbmindful_table_seq_tuples_read': ('counter', "Tuples read by sequential scans"),
+    'dbmindful_table_dead_tuples': ('gauge', "Estimated dead tuples"),
+    'dbmindful_table_size_bytes': ('gauge', "Heap size"),
+    'dbmindful_table_total_size_bytes': ('gauge', "Size including indexes and TOAST"),
+    'dbmindful_index_scans': ('counter', "Index scans"),
+    'dbmindful_index_tuples_read': ('counter', "Index entries returned by scans"),
+}
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _sample(name: str, labels: Dict[str, object], value: float, counter: bool = False) -> str:
+    label_text = ','.join(f'{key}="{_escape(val)}"' for key, val in labels.items())
+    return f"{name}{'_total' if counter else ''}{{{label_text}}} {float(value):.17g}"
+
+
+class OpenMetricsExporter:
+    """Keeps a precomputed OpenMetrics exposition for a set of sample stores.
+
+    The text (and its gzip form) is rebuilt when a store publishes, never on
+    scrape, so scrapes cost a dictionary lookup regardless of their rate.
+    Label cardinality is capped per target (EXPORTER_MAX_*): the rest of the
+    statements and tables are summed into a "__other__" series for gauges.
+    Counters get no such series: its sum drops whenever a relation moves
+    from the tail into the head, which Prometheus would read as a reset.
+    """
+
+    def __init__(self):
+        self._families: Dict[str, Dict[str, List[str]]] = {}  # target -> family -> lines
+        self._exposition = b"# EOF\n"
+        self._exposition_gzip = gzip.compress(self._exposition)
+        self._lock = threading.Lock()
+
+    def watch(self, target: str, store: SampleStore):
+        store.add_listener(lambda s, delta: self.update(target, s, delta))
+        if store.latest() is not None or store.last_error:
+            self.update(target, store, store.delta_engine.window_delta())
+
+    def exposition(self, compressed: bool = False) -> bytes:
+        with self._lock:
+            return self._exposition_gzip if compressed else self._exposition
+
+    def update(self, target: str, store: SampleStore, statement_delta: Optional[pd.DataFrame] = None):
+        started = time.perf_counter()
+        families = self._target_families(target, store, statement_delta)
+        with self._lock:
+            self._families[target] = families
+            text = self._render_locked()
+            self._exposition = text.encode()
+            self._exposition_gzip = gzip.compress(self._exposition, compresslevel=5)
+        logging.debug(f"Rebuilt metrics for {target} in {(time.perf_counter() - started) * 1000:.1f}ms")
+
+    def _render_locked(self) -> str:
+        lines = []
+        for name, (kind, help_text) in FAMILIES.items():
+            samples = [line for target in sorted(self._families)
+                       for line in self._families[target].get(name, [])]
+            if not samples:
+                continue
+            lines.append(f"# TYPE {name} {kind}")
+            lines.append(f"# HELP {name} {help_text}")
+            lines.extend(samples)
+        lines.append("# EOF")
+        return '\n'.join(lines) + '\n'
+
+    def _target_families(self, target: str, store: SampleStore,
+                         statement_delta: Optional[pd.DataFrame]) -> Dict[str, List[str]]:
+        snapshot = store.latest()
+        labels = {'target': target}
+        out: Dict[str, List[str]] = {name: [] for name in FAMILIES}
+
+        def add(name: str, extra: Dict[str, object], value):
+            if value is not None and not pd.isna(value):
+                out[name].append(_sample(name, {**labels, **extra}, value, FAMILIES[name][0] == 'counter'))
+
+        add('dbmindful_up', {}, 0 if store.last_error or snapshot is None else 1)
+        add('dbmindful_collect_errors', {}, store.error_count)
+        if snapshot is None:
+            return out
+
+        add('dbmindful_collect_duration_seconds', {}, snapshot.duration_ms / 1000)
+        add('dbmindful_collect_round_trips', {}, snapshot.round_trips)
+        for query, ms in snapshot.query_ms.items():
+            add('dbmindful_collect_query_seconds', {'query': query}, ms / 1000)
+        if snapshot.server_ms is not None:
+            add('dbmindful_collect_server_seconds', {}, snapshot.server_ms / 1000)
+        add('dbmindful_collect_relation_subsets', {}, snapshot.relation_subsets)
+        add('dbmindful_last_collect_timestamp_seconds', {}, snapshot.collected_at.timestamp())
+        add('dbmindful_database_size_bytes', {}, snapshot.basic_stats.get('database_size_bytes'))
+        add('dbmindful_active_connections', {}, snapshot.basic_stats.get('active_connections'))
+
+        if statement_delta is not None and not statement_delta.empty:
+            per_query = statement_delta.groupby('queryid', as_index=False).agg(
+                calls_per_sec=('calls_per_sec', 'sum'),
+                exec_ms_per_sec=('exec_ms_per_sec', 'sum'),
+                rows_per_sec=('rows_per_sec', 'sum'),
+                blks_read_per_sec=('blks_read_per_sec', 'sum')
+            )
+            per_query['queryid'] = per_query['queryid'].astype('int64').astype(str)
+            per_query = fold_tail(per_query, 'queryid', 'exec_ms_per_sec', settings.EXPORTER_MAX_STATEMENTS,
+                                  ['calls_per_sec', 'exec_ms_per_sec', 'rows_per_sec', 'blks_read_per_sec'],
+                                  label=OTHER_LABEL)
+            for row in per_query.itertuples():
+                query = {'queryid': row.queryid}
+                add('dbmindful_statement_calls_per_second', query, row.calls_per_sec)
+                add('dbmindful_statement_exec_seconds_per_second', query, row.exec_ms_per_sec / 1000)
+                if row.calls_per_sec:
+                    add('dbmindful_statement_mean_exec_seconds', query, row.exec_ms_per_sec / row.calls_per_sec / 1000)
+                add('dbmindful_statement_rows_per_second', query, row.rows_per_sec)
+                add('dbmindful_statement_blocks_read_per_second', query, row.blks_read_per_sec)
+
+        tables = fold_tail(snapshot.table_stats, 'table_name', 'total_size', settings.EXPORTER_MAX_TABLES,
+                           ['dead_tuples', 'total_size', 'table_size'], label=OTHER_LABEL)
+        for row in tables.itertuples():
+            table = {'table': row.table_name}
+            if row.table_name != OTHER_LABEL:
+                add('dbmindful_table_seq_tuples_read', table, row.row_count)
+            add('dbmindful_table_dead_tuples', table, row.dead_tuples)
+            add('dbmindful_table_size_bytes', table, row.table_size)
+            add('dbmindful_table_total_size_bytes', table, row.total_size)
+
+        # Index families are all counters, so the tail is left out rather than folded
+        indexes = snapshot.index_usage.sort_values('number_of_scans', ascending=False).head(settings.EXPORTER_MAX_INDEXES)
+        for row in indexes.itertuples():
+            index = {'table': row.table_name, 'index': row.index_name}
+            add('dbmindful_index_scans', index, row.number_of_scans)
+            add('dbmindful_index_tuples_read', index, row.tuples_read)
+        return out
+
+
+class MetricsHTTPServer(ThreadingHTTPServer):
+    """Serves /metrics (OpenMetrics, gzip when accepted) and /healthz"""
+
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], exporter: OpenMetricsExporter):
+        self.exporter = exporter
+        super().__init__(address, _MetricsHandler)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        path = self.path.split('?', 1)[0]
+        if path == '/healthz':
+            self._send(200, b"ok\n", "text/plain; charset=utf-8")
+        elif path == '/metrics':
+            compressed = 'gzip' in self.headers.get('Accept-Encoding', '')
+            self._send(200, self.server.exporter.exposition(compressed), CONTENT_TYPE,
+                       {'Content-Encoding': 'gzip'} if compressed else {})
+        else:
+            self._send(404, b"not found\n", "text/plain; charset=utf-8")
+
+    def _send(self, status: int, body: bytes, content_type: str, headers: Optional[Dict[str, str]] = None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes every few seconds would flood stderr
+        pass
@@ -0,0 +1,291 @@
+# core/plan_analyzer.py
+import hashlib
+import re
+import pandas as pd
+import sqlparse
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional
+from config.settings import settings
+from models.database import DatabaseConnection
+
+# Hotspot thresholds
+SEQ_SCAN_ROWS = 100_000  # rows read by one sequential scan
+MISESTIMATE_RATIO = 10  # actual vs estimated rows, either direction
+MISESTIMATE_MIN_ROWS = 1_000  # ignore misfires on tiny row counts
+NESTED_LOOP_OUTER_ROWS = 10_000  # outer rows driving a nested loop
+
+_PARAM_RE = re.compile(r"\$\d+")
+_EXPLAINABLE_RE = re.compile(r"^\s*(SELECT|INSERT|UPDATE|DELETE|MERGE|VALUES|WITH|TABLE)\b", re.IGNORECASE)
+
+
+@dataclass
+class PlanNode:
+    """One node of an EXPLAIN (FORMAT JSON) plan tree.
+
+    Times, rows and buffers as reported by PostgreSQL: actual times and rows
+    are per loop, buffers are cumulative and include the children.
+    """
+    node_type: str
+    relation: Optional[str] = None
+    index_name: Optional[str] = None
+    join_type: Optional[str] = None
+    total_cost: float = 0.0
+    plan_rows: float = 0.0
+    actual_rows: Optional[float] = None
+    actual_loops: float = 1.0
+    actual_total_time: Optional[float] = None
+    rows_removed_by_filter: float = 0.0
+    shared_hit: int = 0
+    shared_read: int = 0
+    temp_read: int = 0
+    temp_written: int = 0
+    details: Dict = field(default_factory=dict)
+    children: List['PlanNode'] = field(default_factory=list)
+
+    @classmethod
+    def from_json(cls, node: Dict) -> 'PlanNode':
+        relation = node.get('Relation Name')
+        if relation and node.get('Schema'):
+            relation = f"{node['Schema']}.{relation}"
+        return cls(
+            node_type=node.get('Node Type', 'Unknown'),
+            relation=relation,
+            index_name=node.get('Index Name'),
+            join_type=node.get('Join Type'),
+            total_cost=node.get('Total Cost', 0.0),
+            plan_rows=node.get('Plan Rows', 0.0),
+            actual_rows=node.get('Actual Rows'),
+            actual_loops=node.get('Actual Loops', 1) or 1,
+            actual_total_time=node.get('Actual Total Time'),
+            rows_removed_by_filter=node.get('Rows Removed by Filter', 0),
+            shared_hit=node.get('Shared Hit Blocks', 0),
+            shared_read=node.get('Shared Read Blocks', 0),
+            temp_read=node.get('Temp Read Blocks', 0),
+            temp_written=node.get('Temp Written Blocks', 0),
+            details={k: v for k, v in node.items() if k in (
+                'Filter', 'Index Cond', 'Hash Cond', 'Join Filter', 'Sort Key',
+                'Sort Method', 'Sort Space Type', 'Sort Space Used', 'Hash Batches'
+            )},
+            children=[cls.from_json(child) for child in node.get('Plans', [])]
+        )
+
+    @property
+    def analyzed(self) -> bool:
+        return self.actual_total_time is not None
+
+    @property
+    def label(self) -> str:
+        target = self.index_name or self.relation
+        return f"{self.node_type} on {target}" if target else self.node_type
+
+    @property
+    def rows(self) -> float:
+        """Rows produced over all loops (estimated when not analyzed)"""
+        if self.analyzed:
+            return self.actual_rows * self.actual_loops
+        return self.plan_rows
+
+    @property
+    def total_time(self) -> float:
+        """Inclusive time over all loops, in ms"""
+        return (self.actual_total_time or 0.0) * self.actual_loops
+
+    @property
+    def self_time(self) -> float:
+        """Time spent in this node alone, excluding its children"""
+        return max(0.0, self.total_time - sum(child.total_time for child in self.children))
+
+    @property
+    def self_shared_read(self) -> int:
+        return max(0, self.shared_read - sum(child.shared_read for child in self.children))
+
+    @property
+    def self_shared_hit(self) -> int:
+        return max(0, self.shared_hit - sum(child.shared_hit for child in self.children))
+
+    @property
+    def estimate_ratio(self) -> Optional[float]:
+        """How far off the planner's row estimate was (>= 1, either direction)"""
+        if not self.analyzed:
+            return None
+        estimated, actual = max(self.plan_rows, 1.0), max(self.actual_rows, 1.0)
+        return max(estimated / actual, actual / estimated)
+
+    def structure(self) -> str:
+        """Plan shape without costs or row counts: node types, join order, relations, indexes"""
+        parts = '|'.join([self.node_type, self.join_type or '', self.relation or '', self.index_name or ''])
+        return f"{parts}({','.join(child.structure() for child in self.children)})"
+
+    def walk(self, depth: int = 0) -> Iterator[tuple]:
+        yield depth, self
+        for child in self.children:
+            yield from child.walk(depth + 1)
+
+
+@dataclass
+class Hotspot:
+    kind: str  # seq_scan, misestimate, sort_spill, hash_spill, nested_loop
+    severity: str  # high / medium
+    node: str
+    message: str
+
+
+@dataclass
+class Plan:
+    root: PlanNode
+    analyzed: bool
+    planning_time: Optional[float] = None
+    execution_time: Optional[float] = None
+    generic: bool = False
+    raw: List = field(default_factory=list)
+
+    @property
+    def structural_hash(self) -> str:
+        """Identifies the plan shape; unchanged when only estimates or timings differ"""
+        return hashlib.blake2b(self.root.structure().encode(), digest_size=8).hexdigest()
+
+    def nodes(self) -> List[PlanNode]:
+        return [node for _, node in self.root.walk()]
+
+    def to_frame(self) -> pd.DataFrame:
+        """Flat, indented view of the tree for display"""
+        return pd.DataFrame([{
+            'node': '  ' * depth + node.label,
+            'estimated_rows': node.plan_rows,
+            'actual_rows': node.rows if node.analyzed else None,
+            'loops': node.actual_loops if node.analyzed else None,
+            'self_time': node.self_time if node.analyzed else None,
+            'total_cost': node.total_cost,
+            'shared_hit': node.self_shared_hit,
+            'shared_read': node.self_shared_read,
+        } for depth, node in self.root.walk()])
+
+
+class PlanAnalyzer:
+    """Captures execution plans and flags the nodes worth looking at"""
+
+    def __init__(self, dsn: Optional[str] = None):
+        self.dsn = dsn
+        self.db_connection = DatabaseConnection
+
+    def explain(self, query: str, analyze: bool = False, timeout: Optional[float] = None) -> Plan:
+        """EXPLAIN a statement; with analyze=True it is executed and rolled back.
+
+        Normalized pg_stat_statements texts ($1, $2...) are planned with
+        GENERIC_PLAN on PostgreSQL 16+; they can't be executed, so ANALYZE
+        needs a query with literal values.
+        """
+        timeout = timeout if timeout is not None else settings.PLAN_STATEMENT_TIMEOUT
+        with self.db_connection.get_connection(self.dsn) as conn:
+            try:
+                with conn.cursor() as cur:
+                    # Bounded and never committed, even if the statement writes
+                    cur.execute(f"SET LOCAL statement_timeout = {int(timeout * 1000)};")
+                    return self.explain_with(cur, query, analyze)
+            finally:
+                conn.rollback()
+
+    @staticmethod
+    def explain_with(cur, query: str, analyze: bool = False) -> Plan:
+        """EXPLAIN on an open cursor, e.g. one with hypothetical indexes in place.
+
+        The caller owns the transaction and must roll it back.
+        """
+        query = query.strip().rstrip(';')
+        # psycopg2 runs every statement of a multi-statement string, so a
+        # trailing COMMIT or write would escape the rollback
+        if len([s for s in sqlparse.split(query) if s.strip().rstrip(';').strip()]) > 1:
+            raise ValueError("Only a single statement can be explained")
+        if not _EXPLAINABLE_RE.match(query):
+            raise ValueError("Only SELECT/INSERT/UPDATE/DELETE/MERGE statements can be explained")
+
+        options = ['FORMAT JSON', 'VERBOSE']
+        generic = bool(_PARAM_RE.search(query))
+        if generic:
+            if analyze:
+                raise ValueError("ANALYZE needs literal values instead of $n parameters")
+            if cur.connection.server_version < 160000:
+                raise ValueError("Parameterized statements can only be explained on PostgreSQL 16+")
+            options.append('GENERIC_PLAN')
+        if analyze:
+            options += ['ANALYZE', 'BUFFERS']
+
+        cur.execute(f"EXPLAIN ({', '.join(options)}) {query}")
+        document = cur.fetchone()[0][0]
+        return Plan(
+            root=PlanNode.from_json(document['Plan']),
+            analyzed=analyze,
+            planning_time=document.get('Planning Time'),
+            execution_time=document.get('Execution Time'),
+            generic=generic,
+            raw=[document]
+        )
+
+    @staticmethod
+    def find_hotspots(plan: Plan) -> List[Hotspot]:
+        hotspots = []
+        for node in plan.nodes():
+            if node.node_type == 'Seq Scan':
+                scanned = node.rows + node.rows_removed_by_filter * node.actual_loops
+                if scanned >= SEQ_SCAN_ROWS:
+                    filtered = node.rows_removed_by_filter * node.actual_loops
+                    selective = filtered / scanned > 0.9
+                    hotspots.append(Hotspot(
+                        'seq_scan', 'high' if selective else 'medium', node.label,
+                        f"Sequential scan reads {scanned:,.0f} rows"
+                        + (f", the filter discards {filtered / scanned:.0%} of them" if selective else "")
+                    ))
+
+            # Only where a misfire originates, not every node it propagates to
+            ratio = node.estimate_ratio
+            if ratio and ratio >= MISESTIMATE_RATIO \
+                    and max(node.plan_rows, node.actual_rows) >= MISESTIMATE_MIN_ROWS \
+                    and not any((child.estimate_ratio or 0) >= MISESTIMATE_RATIO for child in node.children):
+                hotspots.append(Hotspot(
+                    'misestimate', 'high' if ratio >= 100 else 'medium', node.label,
+                    f"Estimated {node.plan_rows:,.0f} rows per loop, got {node.actual_rows:,.0f} "
+                    f"({ratio:,.0f}x off) - statistics may be stale"
+                ))
+
+            if node.details.get('Sort Space Type') == 'Disk' or 'external' in node.details.get('Sort Method', ''):
+                hotspots.append(Hotspot(
+                    'sort_spill', 'high', node.label,
+                    f"Sort spilled to disk ({node.details.get('Sort Space Used', '?')} kB), "
+                    "consider more work_mem or an index matching the sort key"
+                ))
+
+            if node.details.get('Hash Batches', 1) > 1:
+                hotspots.append(Hotspot(
+                    'hash_spill', 'medium', node.label,
+                    f"Hash split into {node.details['Hash Batches']} batches, it did not fit in work_mem"
+                ))
+
+            if node.node_type == 'Nested Loop' and node.children:
+                outer = node.children[0].rows
+                if outer >= NESTED_LOOP_OUTER_ROWS:
+                    hotspots.append(Hotspot(
+                        'nested_loop', 'high', node.label,
+                        f"Nested loop driven by {outer:,.0f} outer rows; a hash or merge join may be cheaper"
+                    ))
+
+        order = {'high': 0, 'medium': 1}
+        return sorted(hotspots, key=lambda h: order[h.severity])
+
+    @staticmethod
+    def summarize(plan: Plan, hotspots: List[Hotspot], max_nodes: int = 15) -> str:
+        """Compact text form of the plan and its findings, for the AI prompt"""
+        lines = []
+        for depth, node in plan.root.walk():
+            if len(lines) >= max_nodes:
+                lines.append('  ...')
+                break
+            stats = f"rows est={node.plan_rows:,.0f}"
+            if node.analyzed:
+                stats += (f" actual={node.rows:,.0f} self={node.self_time:.1f}ms "
+                          f"read={node.self_shared_read} hit={node.self_shared_hit}")
+            lines.append(f"{'  ' * depth}-> {node.label} ({stats})")
+        if plan.execution_time is not None:
+            lines.append(f"Execution Time: {plan.execution_time:.1f}ms")
+        for hotspot in hotspots:
+            lines.append(f"[{hotspot.severity}] {hotspot.node}: {hotspot.message}")
+        return '\n'.join(lines)
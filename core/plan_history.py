@@ -0,0 +1,153 @@
+# core/plan_history.py
+import threading
+import time
+import logging
+import pandas as pd
+from datetime import datetime
+from typing import Dict, List, Optional
+from config.settings import settings
+from core.collector_guard import CollectorGuard
+from core.db_monitor import DBMonitor
+from core.history_store import HistoryStore
+from core.plan_analyzer import Plan, PlanAnalyzer
+from core.snapshot import Snapshot
+from core.statement_deltas import StatementDeltaEngine
+from models.database import DatabaseConnection
+
+
+class PlanTracker:
+    """Tracks plan shapes per queryid and flags plan regressions.
+
+    A regression is a plan hash different from the previously captured one
+    (a new shape or a flip back to an old one), captured while the mean
+    execution time is well above what it was under the previous plan.
+    Means are always over the latest delta window, never all-time averages,
+    so plans captured by the sampler and by hand compare like for like.
+    """
+
+    _registry: Dict[str, 'PlanTracker'] = {}
+    _registry_lock = threading.Lock()
+
+    def __init__(self, dsn: Optional[str], history: Optional[HistoryStore] = None,
+                 plan_analyzer: Optional[PlanAnalyzer] = None):
+        self.dsn = dsn
+        self.history = history or HistoryStore.shared()
+        self.plan_analyzer = plan_analyzer or PlanAnalyzer(dsn)
+        self.db_connection = DatabaseConnection
+        self._last_capture = 0.0
+
+    @classmethod
+    def for_dsn(cls, dsn: Optional[str]) -> 'PlanTracker':
+        with cls._registry_lock:
+            if (dsn or '') not in cls._registry:
+                cls._registry[dsn or ''] = cls(dsn)
+            return cls._registry[dsn or '']
+
+    def record(self, queryid: int, query: str, plan: Plan, mean_exec_time: Optional[float],
+               captured_at: Optional[datetime] = None) -> Optional[Dict]:
+        """Store a captured plan; returns the alert when it is a regression"""
+        captured_at = captured_at or datetime.now()
+        previous = self.history.record_plan(
+            self.dsn, queryid, plan.structural_hash,
+            PlanAnalyzer.summarize(plan, []), mean_exec_time, captured_at
+        )
+        if previous is None or mean_exec_time is None or previous['mean_exec_time'] is None:
+            return None
+
+        before = previous['mean_exec_time']
+        if mean_exec_time < before * settings.PLAN_REGRESSION_FACTOR \
+                or mean_exec_time - before < settings.PLAN_REGRESSION_MIN_MS:
+            return None
+
+        alert = {
+            'queryid': queryid,
+            'plan_hash': plan.structural_hash,
+            'detected_at': captured_at,
+            'previous_hash': previous['plan_hash'],
+            'previous_mean_exec_time': before,
+            'mean_exec_time': mean_exec_time,
+            'query': query
+        }
+        self.history.record_plan_alert(self.dsn, alert)
+        logging.error(
+            f"Plan regression for queryid {queryid}: plan {previous['plan_hash']} -> {plan.structural_hash}, "
+            f"mean {before:.2f}ms -> {mean_exec_time:.2f}ms"
+        )
+        return alert
+
+    def recent_mean(self, queryid: int) -> Optional[float]:
+        """Mean execution time (ms) of a statement over the latest delta window"""
+        delta = StatementDeltaEngine.for_dsn(self.dsn).window_delta()
+        if delta is None:
+            return None
+        rows = delta[delta['queryid'] == queryid]
+        if rows.empty:
+            return None
+        return float(rows['total_exec_time'].sum() / rows['calls'].sum())
+
+    def capture_top(self, snapshot: Snapshot, statement_delta: Optional[pd.DataFrame] = None) -> List[Dict]:
+        """EXPLAIN the heaviest statements, at most once per PLAN_CAPTURE_INTERVAL.
+
+        Ranked by the latest interval's execution time when deltas exist;
+        before that, plans are recorded without a mean, since the snapshot
+        only has all-time averages. Texts cut off at QUERY_TEXT_LIMIT are
+        re-read in full. Only pg_stat_statements texts are
+        captured: basic mode's pg_stat_activity texts are other sessions'
+        normalized statements, keyed by fingerprint and not explainable.
+        Nothing is captured while the DSN's CollectorGuard is backing off.
+        """
+        if not snapshot.capabilities.get('pg_stat_statements_enabled'):
+            return []
+        guard = CollectorGuard.get(self.dsn)
+        if guard is not None and guard.level > 0:
+            # The primary is under pressure; EXPLAINs can wait
+            return []
+        if time.monotonic() - self._last_capture < settings.PLAN_CAPTURE_INTERVAL:
+            return []
+        self._last_capture = time.monotonic()
+
+        if statement_delta is not None and not statement_delta.empty:
+            candidates = statement_delta.drop_duplicates('queryid')[['queryid', 'query', 'mean_exec_time']]
+        else:
+            candidates = snapshot.statements.rename(columns={'query_preview': 'query'})[['queryid', 'query']]
+            candidates['mean_exec_time'] = None
+        candidates = candidates.dropna(subset=['queryid']).head(settings.PLAN_CAPTURE_TOP_N)
+        full_texts = self._full_texts([
+            int(row.queryid) for row in candidates.itertuples()
+            if isinstance(row.query, str) and len(row.query) >= DBMonitor.QUERY_TEXT_LIMIT
+        ])
+
+        alerts = []
+        for row in candidates.itertuples():
+            query = full_texts.get(int(row.queryid), row.query)
+            if not isinstance(query, str) or (int(row.queryid) not in full_texts
+                                              and len(query) >= DBMonitor.QUERY_TEXT_LIMIT):
+                # Still cut off (the full text couldn't be read); it wouldn't parse
+                continue
+            try:
+                # explain() goes through explain_with(), which refuses anything
+                # but one SELECT/INSERT/UPDATE/DELETE/MERGE
+                plan = self.plan_analyzer.explain(query)
+            except ValueError:
+                # Not explainable here (utility or multi-statement text, $n params before PG16)
+                continue
+            except Exception as e:
+                logging.error(f"Error capturing plan for queryid {row.queryid}: {e}")
+                continue
+            mean = float(row.mean_exec_time) if pd.notna(row.mean_exec_time) else None
+            alert = self.record(int(row.queryid), query, plan, mean, snapshot.collected_at)
+            if alert is not None:
+                alerts.append(alert)
+        return alerts
+
+    def _full_texts(self, queryids: List[int]) -> Dict[int, str]:
+        if not queryids:
+            return {}
+        try:
+            with self.db_connection.get_connection(self.dsn) as conn:
+                with conn.cursor() as cur:
+                    cur.execute(DBMonitor.STATEMENT_TEXTS_SQL, {'queryids': queryids})
+                    return {int(queryid): query for queryid, query in cur.fetchall()}
+        except Exception as e:
+            logging.error(f"Error reading statement texts: {e}")
+            return {}
@@ -1,167 +1,435 @@
-# core/query_analyzer.py
-import sqlparse
-from typing import Dict, List
-
-class QueryAnalyzer:
-    def __init__(self):
-        pass
-
-    def analyze_query(self, query: str) -> Dict:
-        """Analyze a single query for potential issues"""
-        try:
-            # Parse the query
-            parsed = sqlparse.parse(query)[0]
-            
-            # Extract basic information
-            tables = self._extract_tables(parsed)
-            joins = self._analyze_joins(parsed)
-            where_clause = self._has_where_clause(parsed)
-            indexes = self._suggest_indexes(parsed)
-            
-            # Assess complexity
-            complexity = self._assess_complexity(parsed, joins)
-            
-            # Generate improvements
-            improvements = self._generate_improvements(
-                parsed, tables, joins, where_clause, indexes
-            )
-            
-            return {
-                'complexity': complexity,
-                'tables_involved': tables,
-                'suggested_improvements': improvements,
-                'type': parsed.get_type()
-            }
-        except Exception as e:
-            return {
-                'complexity': 'Unknown',
-                'tables_involved': [],
-                'suggested_improvements': [f'Error analyzing query: {str(e)}'],
-                'type': 'Unknown'
-            }
-
-    def _extract_tables(self, parsed_query) -> List[str]:
-        """Extract table names from query"""
-        tables = []
-        for token in parsed_query.tokens:
-            if token.ttype is None:
-                if hasattr(token, 'get_real_name'):
-                    name = token.get_real_name()
-                    if name:
-                        tables.append(name)
-        return list(set(tables))
-
-    def _analyze_joins(self, parsed_query) -> List[str]:
-        """Analyze JOIN clauses"""
-        joins = []
-        for token in parsed_query.tokens:
-            if token.is_group:
-                for subtoken in token.tokens:
-                    if str(subtoken).upper().strip().startswith('JOIN'):
-                        joins.append(str(subtoken))
-        return joins
-
-    def _has_where_clause(self, parsed_query) -> bool:
-        """Check if query has WHERE clause"""
-        for token in parsed_query.tokens:
-            if token.is_group:
-                for subtoken in token.tokens:
-                    if str(subtoken).upper().strip().startswith('WHERE'):
-                        return True
-        return False
-
-    def _suggest_indexes(self, parsed_query) -> List[str]:
-        """Suggest potential indexes"""
-        suggestions = []
-        where_columns = self._extract_where_columns(parsed_query)
-        join_columns = self._extract_join_columns(parsed_query)
-        
-        for col in where_columns:
-            suggestions.append(f"Consider index on {col}")
-        for cols in join_columns:
-            suggestions.append(f"Consider composite index on {', '.join(cols)}")
-            
-        return suggestions
-
-    def _extract_where_columns(self, parsed_query) -> List[str]:
-        """Extract columns used in WHERE clause"""
-        columns = []
-        for token in parsed_query.tokens:
-            if token.is_group:
-                for subtoken in token.tokens:
-                    if str(subtoken).upper().strip().startswith('WHERE'):
-                        # Extract column names from WHERE clause
-                        where_tokens = str(subtoken).split()
-                        for i, token in enumerate(where_tokens):
-                            if '.' in token and '(' not in token:
-                                columns.append(token.split('.')[-1])
-        return list(set(columns))
-
-    def _extract_join_columns(self, parsed_query) -> List[List[str]]:
-        """Extract columns used in JOIN conditions"""
-        join_conditions = []
-        for token in parsed_query.tokens:
-            if token.is_group:
-                for subtoken in token.tokens:
-                    if 'JOIN' in str(subtoken).upper():
-                        on_clause = str(subtoken).upper().split('ON')
-                        if len(on_clause) > 1:
-                            columns = []
-                            for col in on_clause[1].split('='):
-                                if '.' in col:
-                                    columns.append(col.split('.')[-1].strip())
-                            if columns:
-                                join_conditions.append(columns)
-        return join_conditions
-
-    def _assess_complexity(self, parsed_query, joins) -> str:
-        """Assess query complexity"""
-        score = 0
-        
-        # Base on number of tables/joins
-        score += len(joins)
-        
-        # Check for subqueries
-        if 'SELECT' in str(parsed_query).upper().split('FROM')[0]:
-            score += 2
-            
-        # Check for aggregations
-        if any(agg in str(parsed_query).upper() for agg in ['GROUP BY', 'HAVING']):
-            score += 1
-            
-        # Check for window functions
-        if 'OVER' in str(parsed_query).upper():
-            score += 2
-            
-        if score <= 1:
-            return 'Simple'
-        elif score <= 3:
-            return 'Moderate'
-        return 'Complex'
-
-    def _generate_improvements(self, parsed_query, tables, joins, has_where, indexes) -> List[str]:
-        """Generate improvement suggestions"""
-        improvements = []
-        
-        # Analyze joins
-        if len(joins) > 2:
-            improvements.append("Consider breaking down complex joins into smaller queries or views")
-            
-        # Check indexes
-        if indexes:
-            improvements.extend(indexes)
-            
-        # Analyze WHERE clause
-        if not has_where and len(tables) > 0:
-            # Check if it's really a full table scan query
-            query_str = str(parsed_query).upper()
-            if 'COUNT(*)' in query_str or 'SELECT *' in query_str:
-                improvements.append("Full table scan detected - this might be intentional")
-            else:
-                improvements.append("Consider adding appropriate filters to limit result set")
-                
-        # Check for SELECT *
-        if 'SELECT *' in str(parsed_query).upper():
-            improvements.append("Specify needed columns instead of SELECT *")
-            
-        return improvements
\ No newline at end of file
+# core/query_analyzer.py
+import re
+import sqlparse
+import pandas as pd
+from functools import lru_cache
+from core.tracing import annotate, traced
+from sqlparse import sql, tokens as T
+from typing import Dict, List, Optional
+
+# Workload findings: code -> description shown in the audit report
+FINDINGS = {
+    'missing_where': 'No WHERE clause (full table scan or unbounded write)',
+    'select_star': 'SELECT * fetches every column',
+    'join_heavy': 'Joins many tables',
+    'window_function': 'Uses window functions',
+}
+
+JOIN_HEAVY_THRESHOLD = 3
+
+# Comparison operators usable by a btree index
+_EQUALITY_OPERATORS = {'='}
+_RANGE_OPERATORS = {'<', '>', '<=', '>=', 'LIKE', 'ILIKE'}
+
+_SELECT_STAR_RE = re.compile(r"\bSELECT\s+(?:DISTINCT\s+|ALL\s+)?(?:\w+\.)?\*", re.IGNORECASE)
+_PLAIN_IDENTIFIER_RE = re.compile(r"[a-z_][a-z0-9_$]*")
+
+
+def quote_ident(name: str) -> str:
+    """Quote an identifier for SQL text when PostgreSQL would need it (like quote_ident())"""
+    if _PLAIN_IDENTIFIER_RE.fullmatch(name) and name.upper() not in sqlparse.keywords.KEYWORDS \
+            and name.upper() not in sqlparse.keywords.KEYWORDS_COMMON:
+        return name
+    return '"' + name.replace('"', '""') + '"'
+
+
+@lru_cache(maxsize=1024)
+def _analyze_cached(query: str) -> Dict:
+    # Every dashboard rerun re-renders the same heavy queries; parse each once
+    return QueryAnalyzer()._analyze_query(query)
+
+
+class QueryAnalyzer:
+    def __init__(self):
+        pass
+
+    @traced('analysis')
+    def analyze_query(self, query: str) -> Dict:
+        """Analyze a single query for potential issues (cached per query text)"""
+        hits = _analyze_cached.cache_info().hits
+        result = _analyze_cached(query)
+        annotate(cache='hit' if _analyze_cached.cache_info().hits > hits else 'miss')
+        return result
+
+    def _analyze_query(self, query: str) -> Dict:
+        try:
+            # Parse the query
+            parsed = sqlparse.parse(query)[0]
+            
+            # Extract basic information
+            tables = self._extract_tables(parsed)
+            joins = self._analyze_joins(parsed)
+            where_clause = self._has_where_clause(parsed)
+            indexes = self._suggest_indexes(parsed)
+            
+            # Assess complexity
+            complexity = self._assess_complexity(parsed, joins)
+            
+            # Generate improvements
+            improvements = self._generate_improvements(
+                parsed, tables, joins, where_clause, indexes
+            )
+            
+            return {
+                'complexity': complexity,
+                'tables_involved': tables,
+                'suggested_improvements': improvements,
+                'type': parsed.get_type()
+            }
+        except Exception as e:
+            return {
+                'complexity': 'Unknown',
+                'tables_involved': [],
+                'suggested_improvements': [f'Error analyzing query: {str(e)}'],
+                'type': 'Unknown'
+            }
+
+    def _extract_tables(self, parsed_query) -> List[str]:
+        """Extract table names from query"""
+        tables = []
+        for token in parsed_query.tokens:
+            if token.ttype is None:
+                if hasattr(token, 'get_real_name'):
+                    name = token.get_real_name()
+                    if name:
+                        tables.append(name)
+        return list(set(tables))
+
+    def _analyze_joins(self, parsed_query) -> List[str]:
+        """Analyze JOIN clauses"""
+        joins = []
+        for token in parsed_query.tokens:
+            if token.is_group:
+                for subtoken in token.tokens:
+                    if str(subtoken).upper().strip().startswith('JOIN'):
+                        joins.append(str(subtoken))
+        return joins
+
+    def _has_where_clause(self, parsed_query) -> bool:
+        """Check if query has WHERE clause"""
+        for token in parsed_query.tokens:
+            if token.is_group:
+                for subtoken in token.tokens:
+                    if str(subtoken).upper().strip().startswith('WHERE'):
+                        return True
+        return False
+
+    def _suggest_indexes(self, parsed_query) -> List[str]:
+        """Suggest potential indexes"""
+        suggestions = []
+        where_columns = self._extract_where_columns(parsed_query)
+        join_columns = self._extract_join_columns(parsed_query)
+        
+        for col in where_columns:
+            suggestions.append(f"Consider index on {col}")
+        for cols in join_columns:
+            suggestions.append(f"Consider composite index on {', '.join(cols)}")
+            
+        return suggestions
+
+    def _extract_where_columns(self, parsed_query) -> List[str]:
+        """Extract columns used in WHERE clause"""
+        columns = []
+        for token in parsed_query.tokens:
+            if token.is_group:
+                for subtoken in token.tokens:
+                    if str(subtoken).upper().strip().startswith('WHERE'):
+                        # Extract column names from WHERE clause
+                        where_tokens = str(subtoken).split()
+                        for i, token in enumerate(where_tokens):
+                            if '.' in token and '(' not in token:
+                                columns.append(token.split('.')[-1])
+        return list(set(columns))
+
+    def _extract_join_columns(self, parsed_query) -> List[List[str]]:
+        """Extract columns used in JOIN conditions"""
+        join_conditions = []
+        for token in parsed_query.tokens:
+            if token.is_group:
+                for subtoken in token.tokens:
+                    if 'JOIN' in str(subtoken).upper():
+                        on_clause = str(subtoken).upper().split('ON')
+                        if len(on_clause) > 1:
+                            columns = []
+                            for col in on_clause[1].split('='):
+                                if '.' in col:
+                                    columns.append(col.split('.')[-1].strip())
+                            if columns:
+                                join_conditions.append(columns)
+        return join_conditions
+
+    def _assess_complexity(self, parsed_query, joins) -> str:
+        """Assess query complexity"""
+        score = 0
+        
+        # Base on number of tables/joins
+        score += len(joins)
+        
+        # Check for subqueries
+        if 'SELECT' in str(parsed_query).upper().split('FROM')[0]:
+            score += 2
+            
+        # Check for aggregations
+        if any(agg in str(parsed_query).upper() for agg in ['GROUP BY', 'HAVING']):
+            score += 1
+            
+        # Check for window functions
+        if 'OVER' in str(parsed_query).upper():
+            score += 2
+            
+        if score <= 1:
+            return 'Simple'
+        elif score <= 3:
+            return 'Moderate'
+        return 'Complex'
+
+    def _generate_improvements(self, parsed_query, tables, joins, has_where, indexes) -> List[str]:
+        """Generate improvement suggestions"""
+        improvements = []
+        
+        # Analyze joins
+        if len(joins) > 2:
+            improvements.append("Consider breaking down complex joins into smaller queries or views")
+            
+        # Check indexes
+        if indexes:
+            improvements.extend(indexes)
+            
+        # Analyze WHERE clause
+        if not has_where and len(tables) > 0:
+            # Check if it's really a full table scan query
+            query_str = str(parsed_query).upper()
+            if 'COUNT(*)' in query_str or 'SELECT *' in query_str:
+                improvements.append("Full table scan detected - this might be intentional")
+            else:
+                improvements.append("Consider adding appropriate filters to limit result set")
+                
+        # Check for SELECT *
+        if 'SELECT *' in str(parsed_query).upper():
+            improvements.append("Specify needed columns instead of SELECT *")
+            
+        return improvements
+
+    def extract_columns(self, query: str) -> Dict:
+        """Tables and column usage from the parse tree, for index advice.
+
+        Columns are (qualifier, name) pairs, where the qualifier is the alias
+        or table name written in the query (None when unqualified); `tables`
+        maps every alias and table name in the statement to the table, and
+        `values` holds the operator and constant of literal comparisons.
+        Names are case-folded the way PostgreSQL does (unquoted names to
+        lower case); tables are quoted, qualified as written in the query.
+        """
+        usage = {'tables': {}, 'equality': [], 'range': [], 'join': [], 'order_by': [], 'group_by': [],
+                 'values': {}}
+        try:
+            self._collect_columns(sqlparse.parse(query)[0], usage)
+        except Exception:
+            pass
+        return usage
+
+    def _collect_columns(self, group, usage: Dict):
+        clause = None
+        for token in group.tokens:
+            if token.is_whitespace or token.ttype in T.Comment or token.ttype in T.Punctuation:
+                continue
+            if token.ttype in T.Keyword or token.ttype in T.DML:
+                keyword = token.normalized
+                if keyword in ('FROM', 'UPDATE', 'INTO') or keyword.endswith('JOIN'):
+                    clause = 'from'
+                elif keyword == 'ON':
+                    clause = 'on'
+                elif keyword == 'GROUP BY':
+                    clause = 'group_by'
+                elif keyword == 'ORDER BY':
+                    clause = 'order_by'
+                elif keyword not in ('AND', 'OR', 'NOT', 'ASC', 'DESC', 'LATERAL', 'ONLY'):
+                    clause = None
+                continue
+
+            if isinstance(token, sql.Where):
+                self._collect_predicates(token, usage)
+            elif isinstance(token, sql.Parenthesis):
+                # Sub-select (derived table, IN (...), scalar subquery) or grouped ON conditions
+                if self._is_subquery(token):
+                    self._collect_columns(token, usage)
+                elif clause == 'on':
+                    self._collect_predicates(token, usage)
+            elif clause == 'from':
+                for item in (token.get_identifiers() if isinstance(token, sql.IdentifierList) else [token]):
+                    self._register_table(item, usage)
+            elif clause == 'on' and isinstance(token, sql.Comparison):
+                self._collect_comparison(token, usage)
+            elif clause in ('order_by', 'group_by'):
+                for item in (token.get_identifiers() if isinstance(token, sql.IdentifierList) else [token]):
+                    column = self._column_ref(item)
+                    if column:
+                        usage[clause].append(column)
+            elif isinstance(token, sql.TokenList):
+                # Sub-selects nested in the select list or elsewhere
+                for sub in token.get_sublists():
+                    if isinstance(sub, sql.Parenthesis) and self._is_subquery(sub):
+                        self._collect_columns(sub, usage)
+
+    def _collect_predicates(self, group, usage: Dict):
+        tokens = [t for t in group.tokens if not t.is_whitespace and t.ttype not in T.Comment]
+        for i, token in enumerate(tokens):
+            following = tokens[i + 1].normalized if i + 1 < len(tokens) else None
+            if isinstance(token, sql.Comparison):
+                self._collect_comparison(token, usage)
+            elif isinstance(token, sql.Parenthesis):
+                if self._is_subquery(token):
+                    self._collect_columns(token, usage)
+                elif not any(t.normalized == 'OR' for t in token.tokens):
+                    # OR branches can't each be served by the same index
+                    self._collect_predicates(token, usage)
+            elif following in ('IN', 'BETWEEN'):
+                column = self._column_ref(token)
+                if column:
+                    usage['equality' if following == 'IN' else 'range'].append(column)
+
+    def _collect_comparison(self, comparison, usage: Dict):
+        operator = next((t.normalized.upper() for t in comparison.tokens if t.ttype in T.Operator.Comparison), None)
+        left, right = self._column_ref(comparison.left), self._column_ref(comparison.right)
+        if left and right:
+            if operator == '=':
+                usage['join'].append((left, right))
+            return
+        column = left or right
+        if column is None:
+            return
+        other = comparison.right if left else comparison.left
+        if other.ttype in T.Literal:
+            usage['values'][column] = (operator, other.value.strip("'"))
+        if operator in _EQUALITY_OPERATORS:
+            usage['equality'].append(column)
+        elif operator in _RANGE_OPERATORS:
+            # A leading wildcard can't use a btree
+            if operator in ('LIKE', 'ILIKE') and str(comparison.right).strip().startswith("'%"):
+                return
+            usage['range'].append(column)
+
+    def _register_table(self, token, usage: Dict):
+        if not isinstance(token, sql.Identifier):
+            return
+        if any(isinstance(t, sql.Parenthesis) for t in token.tokens):
+            for sub in token.get_sublists():
+                if isinstance(sub, sql.Parenthesis) and self._is_subquery(sub):
+                    self._collect_columns(sub, usage)
+            return
+        parts = self._name_parts(token)
+        if not parts:
+            return
+        table = '.'.join(quote_ident(part) for part in parts)
+        alias = token.get_alias()
+        if alias and f'"{alias}"' not in str(token):
+            alias = alias.lower()
+        usage['tables'][parts[-1]] = table
+        usage['tables'][alias or parts[-1]] = table
+
+    def _column_ref(self, token) -> Optional[tuple]:
+        if not isinstance(token, sql.Identifier):
+            return None
+        first = token.token_first(skip_cm=True)
+        if isinstance(first, sql.Identifier):
+            # "col DESC", "col AS alias"
+            return self._column_ref(first)
+        if first is None or (first.ttype not in T.Name and first.ttype not in T.String.Symbol) \
+                or any(isinstance(t, (sql.Parenthesis, sql.Function)) for t in token.tokens):
+            return None
+        parts = self._name_parts(token)
+        return (parts[-2] if len(parts) > 1 else None, parts[-1]) if parts else None
+
+    @staticmethod
+    def _name_parts(identifier) -> List[str]:
+        """Dotted name of an identifier: quoted parts as written, the rest in lower case"""
+        parts = []
+        for token in identifier.tokens:
+            if token.ttype in T.Name:
+                parts.append(token.value.lower())
+            elif token.ttype in T.String.Symbol:
+                parts.append(token.value[1:-1].replace('""', '"'))
+            elif not (token.ttype in T.Punctuation and token.value == '.'):
+                break
+        return parts
+
+    @staticmethod
+    def _is_subquery(parenthesis) -> bool:
+        return any(t.ttype in T.DML for t in parenthesis.tokens)
+
+    def detect_findings(self, query: str) -> Dict:
+        """Flag workload findings (see FINDINGS) for a single statement"""
+        try:
+            # The flat token stream is enough here and skips sqlparse's costly grouping
+            tokens = [(ttype, value) for ttype, value in sqlparse.lexer.tokenize(query)
+                      if ttype not in T.Whitespace and ttype not in T.Comment]
+        except Exception:
+            return {'complexity': 'Unknown', 'findings': [], 'joins': 0}
+
+        keywords = [value.upper() for ttype, value in tokens if ttype in T.Keyword]
+        joins = sum(1 for k in keywords if k.endswith('JOIN'))
+        query_type = next((value.upper() for ttype, value in tokens if ttype in T.DML), None)
+
+        findings = []
+        if query_type in ('SELECT', 'UPDATE', 'DELETE') and 'WHERE' not in keywords \
+                and (query_type != 'SELECT' or 'FROM' in keywords):
+            findings.append('missing_where')
+        if _SELECT_STAR_RE.search(query):
+            findings.append('select_star')
+        if joins >= JOIN_HEAVY_THRESHOLD:
+            findings.append('join_heavy')
+        if 'OVER' in keywords:
+            findings.append('window_function')
+
+        return {
+            'complexity': self._assess_complexity(query, [None] * joins),
+            'findings': findings,
+            'joins': joins
+        }
+
+    def analyze_many(self, statements: pd.DataFrame) -> pd.DataFrame:
+        """Audit a whole workload and rank the findings by execution time.
+
+        `statements` needs query, calls and total_exec_time columns (queryid is
+        kept when present). Each distinct text is tokenized once, in-process:
+        a few thousand statements take well under a second, less than
+        starting worker processes would.
+        """
+        columns = ['finding', 'description', 'queryid', 'query', 'calls', 'total_exec_time',
+                   'workload_share', 'complexity', 'joins']
+        if statements is None or statements.empty:
+            return pd.DataFrame(columns=columns)
+
+        analyzed = {query: self.detect_findings(query)
+                    for query in dict.fromkeys(statements['query'].fillna(''))}
+
+        total_time = statements['total_exec_time'].sum()
+        rows = []
+        for record in statements.to_dict('records'):
+            result = analyzed[record['query'] if isinstance(record['query'], str) else '']
+            for finding in result['findings']:
+                rows.append({
+                    'finding': finding,
+                    'description': FINDINGS[finding],
+                    'queryid': record.get('queryid'),
+                    'query': record['query'],
+                    'calls': record['calls'],
+                    'total_exec_time': record['total_exec_time'],
+                    'workload_share': record['total_exec_time'] / total_time if total_time else 0.0,
+                    'complexity': result['complexity'],
+                    'joins': result['joins']
+                })
+
+        findings = pd.DataFrame(rows, columns=columns)
+        return findings.sort_values('total_exec_time', ascending=False, kind='stable').reset_index(drop=True)
+
+    @staticmethod
+    def summarize_findings(findings: pd.DataFrame) -> pd.DataFrame:
+        """One row per finding type with the execution time it accounts for"""
+        summary = findings.groupby(['finding', 'description'], as_index=False).agg(
+            statements=('query', 'size'),
+            calls=('calls', 'sum'),
+            total_exec_time=('total_exec_time', 'sum'),
+            workload_share=('workload_share', 'sum')
+        )
+        return summary.sort_values('total_exec_time', ascending=False).reset_index(drop=True)
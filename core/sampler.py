@@ -0,0 +1,285 @@
+# core/sampler.py
+import random
+import threading
+import time
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+from typing import Callable, Deque, Dict, List, Optional
+from config.settings import settings
+from core.snapshot import Snapshot, SnapshotCollector
+from core.collector_guard import CollectorGuard
+from core.statement_deltas import StatementDeltaEngine
+from core.history_store import HistoryStore
+from core.index_health import IndexHealth
+from core.plan_history import PlanTracker
+
+
+class SampleStore:
+    """Shared in-process store of the samples collected for one DSN"""
+
+    def __init__(self, dsn: Optional[str], max_history: int = 120):
+        self.dsn = dsn
+        self.delta_engine = StatementDeltaEngine.for_dsn(dsn)
+        self.last_error: Optional[str] = None
+        self.error_count = 0
+        self._history: Deque[Snapshot] = deque(maxlen=max_history)
+        self._updated = threading.Condition()
+        self._listeners: List[Callable[['SampleStore', Optional[pd.DataFrame]], None]] = []
+        self._index_scans_checked: Optional[float] = None  # monotonic
+
+    def add_listener(self, callback: Callable[['SampleStore', Optional[pd.DataFrame]], None]):
+        """Call callback(store, statement_delta) after every sample or failed collection"""
+        self._listeners.append(callback)
+
+    def _notify_listeners(self, statement_delta: Optional[pd.DataFrame] = None):
+        for callback in list(self._listeners):
+            try:
+                callback(self, statement_delta)
+            except Exception as e:
+                logging.error(f"Error in sample listener: {e}")
+
+    def publish(self, snapshot: Snapshot):
+        statement_delta = None
+        if not snapshot.statement_counters.empty:
+            self.delta_engine.add_sample(
+                snapshot.statement_counters,
+                snapshot.collected_at,
+                snapshot.statements_info.get('stats_reset')
+            )
+            statement_delta = self.delta_engine.window_delta()
+
+        if settings.HISTORY_ENABLED:
+            try:
+                HistoryStore.shared().record(self.dsn, snapshot, statement_delta)
+            except Exception as e:
+                logging.error(f"Error recording history: {e}")
+
+        with self._updated:
+            self._history.append(snapshot)
+            self.last_error = None
+            self._updated.notify_all()
+        self._notify_listeners(statement_delta)
+
+        # After publishing, so readers don't wait on the EXPLAIN round trips
+        if settings.HISTORY_ENABLED and settings.PLAN_TRACKING_ENABLED:
+            try:
+                PlanTracker.for_dsn(self.dsn).capture_top(snapshot, statement_delta)
+            except Exception as e:
+                logging.error(f"Error tracking plans: {e}")
+        if settings.HISTORY_ENABLED:
+            self._check_index_scans(snapshot)
+
+    def _check_index_scans(self, snapshot: Snapshot):
+        """Every INDEX_SCAN_CHECK_INTERVAL, record the scan counter of every index"""
+        if self._index_scans_checked is not None \
+                and time.monotonic() - self._index_scans_checked < settings.INDEX_SCAN_CHECK_INTERVAL:
+            return
+        guard = CollectorGuard.get(self.dsn)
+        if guard is not None and guard.level > 0:
+            return
+        self._index_scans_checked = time.monotonic()
+        try:
+            IndexHealth(self.dsn, HistoryStore.shared()).record_scans(snapshot.collected_at)
+        except Exception as e:
+            logging.error(f"Error recording index scans: {e}")
+
+    def publish_error(self, error: Exception):
+        with self._updated:
+            self.last_error = str(error)
+            self.error_count += 1
+            self._updated.notify_all()
+        self._notify_listeners()
+
+    def latest(self) -> Optional[Snapshot]:
+        with self._updated:
+            return self._history[-1] if self._history else None
+
+    def history(self) -> list:
+        with self._updated:
+            return list(self._history)
+
+    def wait_for_sample(self, newer_than: Optional[Snapshot] = None,
+                        timeout: float = 30.0) -> Optional[Snapshot]:
+        """Block until a sample newer than `newer_than` (or any sample) arrives.
+
+        Returns early with the current latest sample if collection fails.
+        """
+        deadline = time.monotonic() + timeout
+        with self._updated:
+            while True:
+                latest = self._history[-1] if self._history else None
+                if latest is not None and latest is not newer_than:
+                    return latest
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return latest
+                errors_before = self.error_count
+                self._updated.wait(remaining)
+                if self.error_count != errors_before:
+                    return self._history[-1] if self._history else None
+
+
+class MetricsSampler:
+    """Collects snapshots for one DSN on a jittered interval.
+
+    One sampler runs per DSN no matter how many sessions are viewing it, so
+    rendering reads the latest sample instead of querying the database.
+    Samplers don't own threads: the shared SamplerScheduler runs due
+    collections on a bounded worker pool, at most one in flight per DSN.
+    """
+
+    _registry: Dict[str, 'MetricsSampler'] = {}
+    _registry_lock = threading.Lock()
+
+    def __init__(self, dsn: Optional[str], interval: float = 30.0, jitter: float = 0.1):
+        self.dsn = dsn
+        self.interval = interval
+        self.jitter = jitter
+        self.store = SampleStore(dsn, max_history=settings.SAMPLER_HISTORY_SIZE)
+        self.collector = SnapshotCollector(dsn)
+        # Guarded mode: adaptive backoff driven by the collector's own cost
+        self.guard = CollectorGuard.for_dsn(dsn) if settings.COLLECTOR_GUARDED else None
+        self.failures = 0
+        self.next_run = 0.0  # monotonic; 0 = due now
+        self.running = False
+        self.stopped = False
+
+    @classmethod
+    def for_dsn(cls, dsn: Optional[str]) -> 'MetricsSampler':
+        """Return the sampler for a DSN, scheduling it on first use"""
+        with cls._registry_lock:
+            sampler = cls._registry.get(dsn or '')
+            if sampler is None or sampler.stopped:
+                sampler = cls(dsn, interval=settings.SAMPLER_INTERVAL, jitter=settings.SAMPLER_JITTER)
+                cls._registry[dsn or ''] = sampler
+                SamplerScheduler.shared().add(sampler)
+            return sampler
+
+    @classmethod
+    def stop_dsn(cls, dsn: Optional[str]):
+        with cls._registry_lock:
+            sampler = cls._registry.pop(dsn or '', None)
+        if sampler is not None:
+            sampler.stop()
+
+    @classmethod
+    def all(cls) -> List['MetricsSampler']:
+        with cls._registry_lock:
+            return list(cls._registry.values())
+
+    def trigger(self):
+        """Collect a new sample now instead of waiting for the next interval"""
+        self.next_run = 0.0
+        SamplerScheduler.shared().wake()
+
+    def stop(self):
+        self.stopped = True
+        SamplerScheduler.shared().remove(self)
+
+    def is_alive(self) -> bool:
+        return not self.stopped
+
+    def run_once(self):
+        """Collect and publish one sample; runs on a scheduler worker"""
+        started = time.perf_counter()
+        try:
+            snapshot = self._collect()
+        except Exception as e:
+            self.failures += 1
+            logging.error(f"Error collecting sample: {e}")
+            if self.guard is not None:
+                self.guard.observe((time.perf_counter() - started) * 1000, self._interval(), e)
+            self.store.publish_error(e)
+        else:
+            self.failures = 0
+            if self.guard is not None:
+                # Server time, so a slow network link doesn't read as database load
+                self.guard.observe(snapshot.server_ms, self._interval())
+            self.store.publish(snapshot)
+        self.next_run = time.monotonic() + self._next_delay()
+
+    def _collect(self) -> Snapshot:
+        if self.guard is None:
+            return self.collector.collect(timeout=settings.FLEET_COLLECT_TIMEOUT)
+        return self.collector.collect(
+            timeout=min(settings.FLEET_COLLECT_TIMEOUT, settings.GUARDED_STATEMENT_TIMEOUT),
+            lock_timeout=settings.GUARDED_LOCK_TIMEOUT,
+            subset=self.guard.next_subset(),
+            standby=settings.standby_for(self.dsn)
+        )
+
+    def _interval(self) -> float:
+        """Seconds between samples before jitter and failure backoff"""
+        return self.interval * (self.guard.interval_factor if self.guard is not None else 1)
+
+    def _next_delay(self) -> float:
+        # Jitter keeps samplers for many DSNs (and processes) from polling in
+        # lockstep; a failing target backs off so it doesn't hog a worker
+        backoff = min(2 ** self.failures, 8)
+        return max(1.0, self._interval() * backoff * (1 + random.uniform(-self.jitter, self.jitter)))
+
+
+class SamplerScheduler(threading.Thread):
+    """Runs every MetricsSampler on one bounded pool of worker threads.
+
+    A sampler is only resubmitted once its previous collection finished, so
+    a slow or unreachable host occupies at most one worker (and each
+    collection is cut off by FLEET_COLLECT_TIMEOUT) while the others keep
+    their schedule.
+    """
+
+    _shared: Optional['SamplerScheduler'] = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, max_workers: int = 8):
+        super().__init__(name="dbmindful-scheduler", daemon=True)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="dbmindful-sampler")
+        self._samplers: List[MetricsSampler] = []
+        self._cond = threading.Condition()
+
+    @classmethod
+    def shared(cls) -> 'SamplerScheduler':
+        with cls._shared_lock:
+            if cls._shared is None or not cls._shared.is_alive():
+                cls._shared = cls(max_workers=settings.FLEET_MAX_WORKERS)
+                cls._shared.start()
+            return cls._shared
+
+    def add(self, sampler: MetricsSampler):
+        with self._cond:
+            self._samplers.append(sampler)
+            self._cond.notify()
+
+    def remove(self, sampler: MetricsSampler):
+        with self._cond:
+            if sampler in self._samplers:
+                self._samplers.remove(sampler)
+
+    def wake(self):
+        with self._cond:
+            self._cond.notify()
+
+    def run(self):
+        while True:
+            with self._cond:
+                now = time.monotonic()
+                due = [s for s in self._samplers if not s.running and s.next_run <= now]
+                for sampler in due:
+                    sampler.running = True
+                waiting = [s.next_run for s in self._samplers if not s.running]
+                timeout = max(0.0, min(waiting) - now) if waiting else None
+
+            for sampler in due:
+                future = self.executor.submit(sampler.run_once)
+                future.add_done_callback(lambda _, sampler=sampler: self._finished(sampler))
+
+            with self._cond:
+                if not due:
+                    self._cond.wait(timeout)
+
+    def _finished(self, sampler: MetricsSampler):
+        with self._cond:
+            sampler.running = False
+            self._cond.notify()
@@ -0,0 +1,291 @@
+# core/snapshot.py
+import logging
+import pandas as pd
+from psycopg2 import errors
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from core.db_monitor import DBMonitor, with_sizes
+from core.statement_deltas import KEY_COLUMNS, COUNTER_COLUMNS
+from models.database import DatabaseConnection
+from config.settings import settings
+
+
+@dataclass
+class Snapshot:
+    """One consistent, point-in-time view of everything the dashboard renders"""
+    collected_at: datetime
+    capabilities: Dict
+    basic_stats: Dict
+    statements: pd.DataFrame
+    table_stats: pd.DataFrame
+    index_usage: pd.DataFrame
+    statement_counters: pd.DataFrame = field(default_factory=pd.DataFrame)
+    statements_info: Dict = field(default_factory=dict)
+    round_trips: int = 0
+    duration_ms: float = 0.0
+    # Client-side time of each collector statement (ms), network round trips included
+    query_ms: Dict[str, float] = field(default_factory=dict)
+    # Server time of the snapshot statement (ms): the collector's cost to the database
+    server_ms: Optional[float] = None
+    # >1 when table/index stats were read for a rotating 1/n of relations
+    relation_subsets: int = 1
+    # Largest tables by page estimate; table_stats is the top-N by seq_tup_read
+    largest_tables: pd.DataFrame = field(default_factory=pd.DataFrame)
+
+    @property
+    def monitoring_status(self) -> Dict:
+        """Same shape as DBMonitor.get_monitoring_status()"""
+        has_extension = self.capabilities.get('pg_stat_statements_enabled', False)
+        return {
+            **self.basic_stats,
+            'pg_stat_statements_enabled': has_extension,
+            'monitoring_level': 'Full' if has_extension else 'Basic'
+        }
+
+
+class SnapshotCollector:
+    """Collects a full dashboard snapshot over one connection and one
+    read-only REPEATABLE READ transaction.
+
+    All sections are folded into a single SELECT that returns one JSON
+    document, so a refresh costs BEGIN+SELECT and COMMIT instead of one
+    connection and several queries per DBMonitor method.
+    """
+
+    STATEMENT_COLUMNS = ['queryid', 'query_preview', 'calls', 'total_exec_time', 'avg_exec_time', 'rows', 'total_blocks']
+    # key/total_* let the dashboard page and chart beyond the sampled top-N
+    TABLE_COLUMNS = ['table_name', 'row_count', 'dead_tuples', 'total_size', 'table_size', 'index_size',
+                     'key', 'total_count', 'total_value']
+    INDEX_COLUMNS = ['table_name', 'index_name', 'number_of_scans', 'tuples_read', 'tuples_fetched', 'index_size',
+                     'index_size_bytes', 'key', 'total_count', 'total_value']
+    LARGEST_TABLE_COLUMNS = TABLE_COLUMNS + ['pages']
+    STATEMENT_COUNTER_COLUMNS = KEY_COLUMNS + ['query'] + COUNTER_COLUMNS
+
+    BEGIN_SQL = "BEGIN ISOLATION LEVEL REPEATABLE READ READ ONLY"
+
+    # Sizes for the sampled relations, read from a standby: a physical
+    # standby has the same oids and files, and stat-ing them there costs the
+    # primary nothing
+    STANDBY_SIZES_SQL = f"""
+        SELECT json_build_object(
+            'table_stats', (SELECT COALESCE(json_agg(t), '[]'::json) FROM ({with_sizes(
+                "SELECT unnest(%(tables)s::oid[]) as key", DBMonitor.TABLE_SIZES)}) t),
+            'index_usage', (SELECT COALESCE(json_agg(t), '[]'::json) FROM ({with_sizes(
+                "SELECT unnest(%(indexes)s::oid[]) as key", DBMonitor.INDEX_SIZES)}) t)
+        )
+    """
+
+    CAPABILITIES_SQL = f"""
+        SELECT json_build_object(
+            'pg_stat_statements_enabled', ({DBMonitor.HAS_PG_STAT_STATEMENTS_SQL}),
+            'statements_info', ({DBMonitor.HAS_STATEMENTS_INFO_SQL}),
+            'server_version_num', current_setting('server_version_num')::int
+        )
+    """
+
+    # Last known capabilities per DSN; lets steady-state refreshes skip the
+    # separate probe round trip
+    _capabilities: Dict[str, Dict] = {}
+    _capabilities_lock = threading.Lock()
+
+    def __init__(self, dsn: Optional[str] = None):
+        self.dsn = dsn
+        self.db_connection = DatabaseConnection
+        # Relation stats of the latest sample per subset phase, see _merge_subset()
+        self._subset_parts: Dict[str, Dict[int, pd.DataFrame]] = {}
+        self._subset_n = 1
+
+    def collect(self, timeout: Optional[float] = None, lock_timeout: Optional[float] = None,
+                subset: Optional[Tuple[int, int]] = None, standby: Optional[str] = None) -> Snapshot:
+        """Collect a snapshot, probing capabilities only when they are unknown.
+
+        `timeout`/`lock_timeout` (seconds) are local to the transaction.
+        `subset` (n, phase) reads table/index stats for 1/n of the relations
+        and merges them with the latest stats of the other phases; `standby`
+        is a DSN to read relation sizes from instead of the primary.
+        """
+        started = time.perf_counter()
+        begin = f"{self.BEGIN_SQL}; SET LOCAL application_name = '{settings.APPLICATION_NAME}-collector'"
+        if timeout:
+            begin += f"; SET LOCAL statement_timeout = {int(timeout * 1000)}"
+        if lock_timeout:
+            begin += f"; SET LOCAL lock_timeout = {int(lock_timeout * 1000)}"
+        query_ms: Dict[str, float] = {}
+        key = self.dsn or ''
+        with self._capabilities_lock:
+            capabilities = self._capabilities.get(key)
+
+        with self.db_connection.get_connection(self.dsn) as conn:
+            conn.autocommit = True  # transaction boundaries are issued explicitly below
+            round_trips = 0
+            try:
+                with conn.cursor() as cur:
+                    if capabilities is None:
+                        statement = time.perf_counter()
+                        cur.execute(f"{begin}; {self.CAPABILITIES_SQL};")
+                        capabilities = cur.fetchone()[0]
+                        query_ms['capabilities'] = (time.perf_counter() - statement) * 1000
+                        round_trips += 1
+                        begin = None
+                    query = self._build_query(capabilities, subset, sizes=standby is None)
+                    statement = time.perf_counter()
+                    cur.execute(f"{begin}; {query};" if begin else f"{query};")
+                    document = cur.fetchone()[0]
+                    query_ms['snapshot'] = (time.perf_counter() - statement) * 1000
+                    round_trips += 1
+                    cur.execute("COMMIT;")
+                    round_trips += 1
+            except errors.UndefinedTable:
+                # pg_stat_statements was dropped since the last probe; re-probe next time
+                with self._capabilities_lock:
+                    self._capabilities.pop(key, None)
+                raise
+
+        with self._capabilities_lock:
+            self._capabilities[key] = document['capabilities']
+
+        table_stats = self._to_frame(document['table_stats'], self.TABLE_COLUMNS)
+        index_usage = self._to_frame(document['index_usage'], self.INDEX_COLUMNS)
+        largest_tables = self._to_frame(document['largest_tables'], self.LARGEST_TABLE_COLUMNS)
+        if standby:
+            statement = time.perf_counter()
+            table_stats, index_usage, largest_tables = self._standby_sizes(
+                standby, table_stats, index_usage, largest_tables, timeout, lock_timeout)
+            query_ms['standby_sizes'] = (time.perf_counter() - statement) * 1000
+        subsets = subset[0] if subset else 1
+        table_stats = self._merge_subset('table_stats', table_stats, subset, DBMonitor.TABLE_SORT_COLUMNS[0])
+        index_usage = self._merge_subset('index_usage', index_usage, subset, DBMonitor.INDEX_SORT_COLUMNS[0])
+        largest_tables = self._merge_subset('largest_tables', largest_tables, subset, 'pages')
+
+        return Snapshot(
+            collected_at=datetime.now(),
+            capabilities=document['capabilities'],
+            basic_stats=document['basic_stats'],
+            statements=self._statements_frame(document['statements'], capabilities),
+            table_stats=table_stats,
+            index_usage=index_usage,
+            statement_counters=self._to_frame(document.get('statement_counters', []), self.STATEMENT_COUNTER_COLUMNS),
+            statements_info=self._parse_statements_info(document.get('statements_info')),
+            round_trips=round_trips,
+            duration_ms=(time.perf_counter() - started) * 1000,
+            query_ms=query_ms,
+            server_ms=document.get('server_ms'),
+            relation_subsets=subsets,
+            largest_tables=largest_tables
+        )
+
+    def _build_query(self, capabilities: Dict, subset: Optional[Tuple[int, int]] = None,
+                     sizes: bool = True) -> str:
+        """Fold every dashboard section into one JSON-producing SELECT"""
+        limit = settings.SNAPSHOT_MAX_RELATIONS
+        sections = {
+            'capabilities': self.CAPABILITIES_SQL,
+            'basic_stats': self._json_row(DatabaseConnection.BASIC_STATS_SQL),
+            # Bounded top-N in the default sort; the dashboard pages beyond it
+            'table_stats': self._json_rows(DBMonitor.table_stats_sql(limit=limit, sizes=sizes, subset=subset)[0]),
+            'index_usage': self._json_rows(DBMonitor.index_usage_sql(limit=limit, sizes=sizes, subset=subset)[0]),
+            # For table_history, which follows the largest tables rather than the busiest
+            'largest_tables': self._json_rows(DBMonitor.relation_page_sql(
+                DBMonitor.TABLE_PAGES_SQL, 'pages', settings.HISTORY_MAX_RELATIONS, DBMonitor.TABLE_SEARCH_SQL,
+                sizes=DBMonitor.TABLE_SIZES if sizes else None, subset=subset)[0]),
+        }
+        if capabilities.get('pg_stat_statements_enabled'):
+            sections['statements'] = self._json_rows(DBMonitor.HEAVY_QUERIES_SQL)
+            sections['statement_counters'] = self._json_rows(DBMonitor.STATEMENT_COUNTERS_SQL)
+            if capabilities.get('statements_info'):
+                sections['statements_info'] = self._json_row(DBMonitor.STATEMENTS_INFO_SQL)
+        else:
+            sections['statements'] = self._json_rows(DBMonitor.ACTIVITY_QUERIES_SQL)
+
+        fields = ",\n".join(f"'{name}', ({sql})" for name, sql in sections.items())
+        # Arguments are evaluated in order, so this last one spans every section
+        # (statement_timestamp() is when the server received the query string)
+        return (f"SELECT json_build_object({fields},\n"
+                f"'server_ms', extract(epoch FROM clock_timestamp() - statement_timestamp()) * 1000)")
+
+    def _standby_sizes(self, standby: str, table_stats: pd.DataFrame, index_usage: pd.DataFrame,
+                       largest_tables: pd.DataFrame, timeout: Optional[float],
+                       lock_timeout: Optional[float]) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+        """Fill the size columns from the standby; they stay empty if it can't answer"""
+        try:
+            with self.db_connection.get_connection(standby) as conn:
+                with conn.cursor() as cur:
+                    if timeout:
+                        cur.execute(f"SET LOCAL statement_timeout = {int(timeout * 1000)}")
+                    if lock_timeout:
+                        cur.execute(f"SET LOCAL lock_timeout = {int(lock_timeout * 1000)}")
+                    cur.execute(self.STANDBY_SIZES_SQL, {
+                        'tables': sorted({int(k) for k in pd.concat([table_stats['key'], largest_tables['key']])}),
+                        'indexes': [int(k) for k in index_usage['key']],
+                    })
+                    sizes = cur.fetchone()[0]
+        except Exception as e:
+            logging.error(f"Error reading relation sizes from standby: {e}")
+            return table_stats, index_usage, largest_tables
+        return (self._with_standby_sizes(table_stats, sizes['table_stats'], DBMonitor.TABLE_SIZES),
+                self._with_standby_sizes(index_usage, sizes['index_usage'], DBMonitor.INDEX_SIZES),
+                self._with_standby_sizes(largest_tables, sizes['table_stats'], DBMonitor.TABLE_SIZES))
+
+    @staticmethod
+    def _with_standby_sizes(df: pd.DataFrame, rows: List[Dict], sizes: Dict[str, str]) -> pd.DataFrame:
+        found = pd.DataFrame(rows, columns=['key', *sizes]).drop_duplicates('key').set_index('key')
+        df = df.copy()
+        for column in sizes:
+            df[column] = df['key'].map(found[column])
+        return df
+
+    def _merge_subset(self, section: str, df: pd.DataFrame, subset: Optional[Tuple[int, int]],
+                      sort: str) -> pd.DataFrame:
+        """Top-N over the latest stats of every subset phase.
+
+        Each phase's rows are at most n samples old; total_count/total_value
+        are summed over the phases so the dashboard's "N of M" still holds.
+        """
+        n = subset[0] if subset else 1
+        if n != self._subset_n:
+            self._subset_parts.clear()
+            self._subset_n = n
+        if n <= 1:
+            return df
+        parts = self._subset_parts.setdefault(section, {})
+        parts[subset[1]] = df
+        frames = [part for part in parts.values() if not part.empty]
+        if not frames:
+            return df
+        merged = pd.concat(frames, ignore_index=True)
+        merged = merged.sort_values([sort, 'key'], ascending=False).head(settings.SNAPSHOT_MAX_RELATIONS)
+        merged['total_count'] = sum(int(part['total_count'].iloc[0]) for part in frames)
+        merged['total_value'] = sum(float(part['total_value'].iloc[0]) for part in frames)
+        return merged.reset_index(drop=True)
+
+    @staticmethod
+    def _json_rows(sql: str) -> str:
+        # json_agg keeps the ORDER BY of the inner query
+        return f"SELECT COALESCE(json_agg(t), '[]'::json) FROM ({sql}) t"
+
+    @staticmethod
+    def _json_row(sql: str) -> str:
+        return f"SELECT row_to_json(t) FROM ({sql}) t"
+
+    def _statements_frame(self, rows: List[Dict], capabilities: Dict) -> pd.DataFrame:
+        df = self._to_frame(rows, self.STATEMENT_COLUMNS)
+        if capabilities.get('pg_stat_statements_enabled'):
+            return df
+        # Basic mode: pg_stat_activity rows, one per backend
+        return DBMonitor.aggregate_activity(df)
+
+    @staticmethod
+    def _parse_statements_info(info: Optional[Dict]) -> Dict:
+        if not info:
+            return {}
+        return {
+            'dealloc': info.get('dealloc'),
+            'stats_reset': pd.to_datetime(info.get('stats_reset'))
+        }
+
+    @staticmethod
+    def _to_frame(rows: List[Dict], columns: List[str]) -> pd.DataFrame:
+        return pd.DataFrame(rows, columns=columns)
@@ -0,0 +1,123 @@
+# core/statement_deltas.py
+import numpy as np
+import pandas as pd
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Deque, Dict, Optional, Tuple
+
+KEY_COLUMNS = ['userid', 'dbid', 'queryid']
+COUNTER_COLUMNS = [
+    'calls', 'total_exec_time', 'rows',
+    'shared_blks_hit', 'shared_blks_read', 'shared_blks_dirtied', 'shared_blks_written',
+    'temp_blks_read', 'temp_blks_written'
+]
+
+
+class StatementDeltaEngine:
+    """Turns cumulative pg_stat_statements samples into per-interval deltas.
+
+    Keeps a bounded history of counter samples so rates can be computed over
+    any window covered by it, without ever calling pg_stat_statements_reset().
+    """
+
+    _registry: Dict[str, 'StatementDeltaEngine'] = {}
+    _registry_lock = threading.Lock()
+
+    def __init__(self, max_samples: int = 720):
+        self._samples: Deque[Tuple[datetime, pd.DataFrame]] = deque(maxlen=max_samples)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_dsn(cls, dsn: Optional[str]) -> 'StatementDeltaEngine':
+        """Return the shared engine for a DSN so every session sees the same history"""
+        with cls._registry_lock:
+            engine = cls._registry.get(dsn or '')
+            if engine is None:
+                engine = cls()
+                cls._registry[dsn or ''] = engine
+            return engine
+
+    def add_sample(self, counters: pd.DataFrame, collected_at: datetime,
+                   stats_reset: Optional[datetime] = None):
+        """Record a cumulative counter sample.
+
+        If pg_stat_statements_info reports a newer stats_reset than the
+        previous sample, older samples are dropped: they cannot be diffed
+        against counters that restarted from zero.
+        """
+        # (userid, dbid, queryid) can repeat across toplevel/nested rows on PG14+
+        aggregations = {column: 'sum' for column in COUNTER_COLUMNS}
+        if 'query' in counters.columns:
+            aggregations['query'] = 'first'
+        sample = counters.groupby(KEY_COLUMNS, sort=False).agg(aggregations)
+        sample.attrs['stats_reset'] = stats_reset
+        with self._lock:
+            if self._samples and stats_reset is not None:
+                previous_reset = self._samples[-1][1].attrs.get('stats_reset')
+                if previous_reset is not None and stats_reset != previous_reset:
+                    self._samples.clear()
+            self._samples.append((collected_at, sample))
+
+    def sample_count(self) -> int:
+        with self._lock:
+            return len(self._samples)
+
+    def window_delta(self, window: Optional[timedelta] = None) -> Optional[pd.DataFrame]:
+        """Deltas between the latest sample and the one closest to `window` ago.
+
+        With no window, diffs the two most recent samples. Returns None until
+        at least two samples exist.
+        """
+        with self._lock:
+            if len(self._samples) < 2:
+                return None
+            latest_at, latest = self._samples[-1]
+            baseline_at, baseline = self._samples[-2]
+            if window is not None:
+                target = latest_at - window
+                # Newest sample at or before the target; oldest one if history is shorter
+                baseline_at, baseline = self._samples[0]
+                for sampled_at, sample in self._samples:
+                    if sampled_at > target or sampled_at == latest_at:
+                        break
+                    baseline_at, baseline = sampled_at, sample
+
+        return self.diff(baseline, latest, (latest_at - baseline_at).total_seconds())
+
+    @staticmethod
+    def diff(previous: pd.DataFrame, current: pd.DataFrame, interval_seconds: float) -> pd.DataFrame:
+        """Vectorized per-interval deltas between two KEY_COLUMNS-indexed samples.
+
+        - entries new since `previous` contribute their full counters
+        - entries whose counters went backwards were reset or evicted and
+          re-added, so their current counters are the delta
+        - entries present only in `previous` were evicted and are dropped
+        """
+        current_values = current[COUNTER_COLUMNS].to_numpy(dtype=np.float64)
+        previous_values = previous[COUNTER_COLUMNS].reindex(current.index).to_numpy(dtype=np.float64)
+
+        is_new = np.isnan(previous_values).any(axis=1)
+        went_backwards = ~is_new & (current_values < previous_values).any(axis=1)
+        restart = is_new | went_backwards
+
+        delta_values = np.where(restart[:, None], current_values, current_values - previous_values)
+        delta = pd.DataFrame(delta_values, index=current.index, columns=COUNTER_COLUMNS)
+
+        if 'query' in current.columns:
+            delta.insert(0, 'query', current['query'])
+        delta['restarted'] = restart
+        delta = delta[delta['calls'] > 0].copy()
+
+        interval = max(interval_seconds, 1e-9)
+        calls = delta['calls'].to_numpy()
+        exec_time = delta['total_exec_time'].to_numpy()
+        delta['mean_exec_time'] = exec_time / calls
+        delta['calls_per_sec'] = calls / interval
+        delta['exec_ms_per_sec'] = exec_time / interval
+        delta['rows_per_sec'] = delta['rows'].to_numpy() / interval
+        delta['blks_read_per_sec'] = delta['shared_blks_read'].to_numpy() / interval
+        delta.attrs['interval_seconds'] = interval_seconds
+        delta.attrs['evicted'] = int((~previous.index.isin(current.index)).sum())
+
+        return delta.sort_values('exec_ms_per_sec', ascending=False).reset_index()
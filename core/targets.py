@@ -0,0 +1,110 @@
+# core/targets.py
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Mapping, Optional
+from config.settings import settings
+
+
+@dataclass(frozen=True)
+class Target:
+    name: str
+    dsn: str
+
+
+class TargetRegistry:
+    """Named databases monitored by this instance (fleet mode).
+
+    Loaded from the [targets] section of the secrets the caller passes in
+    (st.secrets in the UI), name = "postgresql://...", and shared by every
+    session; targets added at runtime live until restart. A [standbys]
+    section, with the same names, points guarded collectors at each
+    target's physical standby.
+    """
+
+    _shared: Optional['TargetRegistry'] = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, targets: Optional[Dict[str, str]] = None):
+        self._targets: Dict[str, Target] = {
+            name: Target(name, dsn) for name, dsn in (targets or {}).items()
+        }
+        self._lock = threading.Lock()
+
+    @classmethod
+    def shared(cls, secrets: Optional[Mapping] = None) -> 'TargetRegistry':
+        """The registry every session uses, loaded from `secrets` on first use"""
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls.from_secrets(secrets if secrets is not None else {})
+            return cls._shared
+
+    @classmethod
+    def from_secrets(cls, secrets: Mapping) -> 'TargetRegistry':
+        registry = cls(cls._load_secrets(secrets))
+        for name, standby in cls._load_secrets(secrets, 'standbys').items():
+            registry.set_standby(name, standby)
+        return registry
+
+    @staticmethod
+    def _load_secrets(secrets: Mapping, section: str = 'targets') -> Dict[str, str]:
+        try:
+            return {str(name): str(dsn) for name, dsn in secrets.get(section, {}).items()}
+        except Exception as e:
+            logging.error(f"Error loading fleet {section}: {e}")
+            return {}
+
+    def all(self) -> List[Target]:
+        with self._lock:
+            return sorted(self._targets.values(), key=lambda t: t.name)
+
+    def names(self) -> List[str]:
+        return [target.name for target in self.all()]
+
+    def get(self, name: str) -> Optional[Target]:
+        with self._lock:
+            return self._targets.get(name)
+
+    def add(self, name: str, dsn: str) -> Target:
+        target = Target(name, dsn)
+        with self._lock:
+            self._targets[name] = target
+        return target
+
+    def set_standby(self, name: str, standby_dsn: str):
+        """Read relation sizes for target `name` from this standby (guarded mode)"""
+        target = self.get(name)
+        if target is None:
+            logging.error(f"Standby given for unknown target {name}")
+            return
+        settings.STANDBY_URLS[target.dsn] = standby_dsn
+
+    def remove(self, name: str) -> Optional[Target]:
+        with self._lock:
+            return self._targets.pop(name, None)
+
+
+def run_on_targets(targets: List[Target], fn: Callable[[Target], object],
+                   timeout: Optional[float] = None) -> Dict[str, object]:
+    """Run fn(target) for every target on a bounded pool; {name: result or exception}.
+
+    Targets still running after `timeout` get a TimeoutError instead of
+    holding up the rest; fn should bound its own work too (statement_timeout),
+    since a running thread can't be cancelled.
+    """
+    executor = ThreadPoolExecutor(max_workers=max(1, min(settings.FLEET_MAX_WORKERS, len(targets) or 1)))
+    futures = {executor.submit(fn, target): target for target in targets}
+    done, _ = wait(futures, timeout=timeout)
+    executor.shutdown(wait=False, cancel_futures=True)
+
+    results: Dict[str, object] = {}
+    for future, target in futures.items():
+        if future not in done:
+            results[target.name] = TimeoutError(f"No result within {timeout:.0f}s")
+        elif future.exception() is not None:
+            logging.error(f"Error on target {target.name}: {future.exception()}")
+            results[target.name] = future.exception()
+        else:
+            results[target.name] = future.result()
+    return results
@@ -0,0 +1,215 @@
+# core/tracing.py
+import functools
+import os
+import threading
+import time
+import pandas as pd
+from collections import deque
+from contextlib import contextmanager
+from psycopg2 import extensions
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Type
+from config.settings import settings
+
+
+class Span(NamedTuple):
+    name: str
+    category: str  # ui, db, sql, analysis, ai
+    start_ns: int  # time.perf_counter_ns()
+    duration_ns: int
+    thread_id: int
+    attrs: Dict
+
+
+class Tracer:
+    """Process-wide ring buffer of timing spans.
+
+    Recording is one deque append, so spans stay on in production; the
+    oldest are dropped once TRACE_BUFFER_SPANS is reached.
+    """
+
+    _shared: Optional['Tracer'] = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, capacity: int = 20000):
+        self._spans: deque = deque(maxlen=capacity)
+        self._thread_names: Dict[int, str] = {}
+        # Converts perf_counter timestamps to wall-clock time
+        self._epoch_offset_ns = time.time_ns() - time.perf_counter_ns()
+
+    @classmethod
+    def shared(cls) -> 'Tracer':
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls(settings.TRACE_BUFFER_SPANS)
+            return cls._shared
+
+    def record(self, name: str, category: str, start_ns: int, attrs: Optional[Dict] = None):
+        """Store a span that started at `start_ns` and ends now"""
+        thread = threading.current_thread()
+        self._thread_names[thread.ident] = thread.name
+        self._spans.append(Span(name, category, start_ns, time.perf_counter_ns() - start_ns,
+                                thread.ident, attrs or {}))
+
+    def spans(self) -> List[Span]:
+        return list(self._spans)
+
+    def clear(self):
+        self._spans.clear()
+
+    def frame(self) -> pd.DataFrame:
+        """One row per span, newest last; attrs become rows/bytes/cache columns"""
+        spans = self.spans()
+        return pd.DataFrame({
+            'started_at': pd.to_datetime([s.start_ns + self._epoch_offset_ns for s in spans], utc=True),
+            'name': [s.name for s in spans],
+            'category': [s.category for s in spans],
+            'duration_ms': [s.duration_ns / 1e6 for s in spans],
+            'rows': [s.attrs.get('rows') for s in spans],
+            'bytes': [s.attrs.get('bytes') for s in spans],
+            'cache': [s.attrs.get('cache') for s in spans],
+            'thread': [self._thread_names.get(s.thread_id, str(s.thread_id)) for s in spans],
+        })
+
+    def summary(self) -> pd.DataFrame:
+        """Per span name: calls, total/mean/p95/max time, rows, bytes and cache hits, slowest first"""
+        df = self.frame()
+        if df.empty:
+            return df
+        df = df.assign(hit=df['cache'].eq('hit'), miss=df['cache'].isin(['miss', 'wait']))
+        summary = df.groupby(['category', 'name'], sort=False).agg(
+            calls=('duration_ms', 'size'),
+            total_ms=('duration_ms', 'sum'),
+            mean_ms=('duration_ms', 'mean'),
+            p95_ms=('duration_ms', lambda durations: durations.quantile(0.95)),
+            max_ms=('duration_ms', 'max'),
+            rows=('rows', 'sum'),
+            bytes=('bytes', 'sum'),
+            cache_hits=('hit', 'sum'),
+            cache_misses=('miss', 'sum'),
+        )
+        return summary.sort_values('total_ms', ascending=False).reset_index()
+
+    def chrome_trace(self) -> Dict:
+        """The buffer as Chrome trace-event JSON (chrome://tracing, Perfetto)"""
+        pid = os.getpid()
+        events = [
+            {'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': name}}
+            for tid, name in list(self._thread_names.items())
+        ]
+        events += [
+            {
+                'name': s.name, 'cat': s.category, 'ph': 'X', 'pid': pid, 'tid': s.thread_id,
+                'ts': (s.start_ns + self._epoch_offset_ns) / 1000, 'dur': s.duration_ns / 1000,
+                'args': {key: value if isinstance(value, (int, float, bool)) else str(value)
+                         for key, value in s.attrs.items()},
+            }
+            for s in self.spans()
+        ]
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+
+_local = threading.local()
+
+
+@contextmanager
+def span(name: str, category: str = 'app', **attrs) -> Iterator[Dict]:
+    """Time the block as one span; the yielded dict becomes its attrs"""
+    if not settings.TRACING_ENABLED:
+        yield attrs
+        return
+    stack = _local.__dict__.setdefault('stack', [])
+    stack.append(attrs)
+    start = time.perf_counter_ns()
+    try:
+        yield attrs
+    finally:
+        stack.pop()
+        Tracer.shared().record(name, category, start, attrs)
+
+
+def record(name: str, category: str, start_ns: int, **attrs):
+    """Record a span timed by hand, for work that can't sit in one with-block (e.g. generators)"""
+    if settings.TRACING_ENABLED:
+        Tracer.shared().record(name, category, start_ns, attrs)
+
+
+def annotate(**attrs):
+    """Add attrs (rows, bytes, cache=hit/miss...) to the innermost open span on this thread"""
+    stack = _local.__dict__.get('stack')
+    if stack:
+        stack[-1].update(attrs)
+
+
+def traced(category: str = 'app', name: Optional[str] = None) -> Callable:
+    """Decorator: every call of the function is a span named after it"""
+    def decorate(func: Callable) -> Callable:
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(span_name, category):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def statement_preview(query) -> str:
+    if isinstance(query, bytes):
+        query = query.decode('utf-8', 'replace')
+    return ' '.join(str(query)[:200].split())[:80]
+
+
+class _CountingWriter:
+    def __init__(self, file):
+        self.file = file
+        self.bytes = 0
+
+    def write(self, data):
+        self.bytes += len(data)
+        return self.file.write(data)
+
+
+class TracingCursorMixin:
+    """Reports every statement, with its row count, to the connection's _observe()"""
+
+    def execute(self, query, vars=None):
+        start = time.perf_counter_ns()
+        try:
+            return super().execute(query, vars)
+        finally:
+            self.connection._observe(query, start, self.rowcount)
+
+    def executemany(self, query, vars_list):
+        start = time.perf_counter_ns()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            self.connection._observe(query, start, self.rowcount)
+
+    def copy_expert(self, sql, file, size=8192):
+        start = time.perf_counter_ns()
+        writer = _CountingWriter(file)
+        try:
+            return super().copy_expert(sql, writer, size)
+        finally:
+            self.connection._observe(sql, start, self.rowcount, writer.bytes)
+
+
+class TracingConnection(extensions.connection):
+    """psycopg2 connection recording an 'sql' span per statement, whatever the cursor_factory"""
+
+    _cursor_classes: Dict[type, type] = {}
+
+    def cursor(self, *args, cursor_factory: Type = None, **kwargs):
+        base = cursor_factory or self.cursor_factory or extensions.cursor
+        tracing = self._cursor_classes.get(base)
+        if tracing is None:
+            tracing = type(f"Tracing{base.__name__}", (TracingCursorMixin, base), {})
+            self._cursor_classes[base] = tracing
+        return super().cursor(*args, cursor_factory=tracing, **kwargs)
+
+    def _observe(self, query, start_ns: int, rows: int, nbytes: Optional[int] = None):
+        if nbytes is None:
+            record(statement_preview(query), 'sql', start_ns, rows=max(rows, 0))
+        else:
+            record(statement_preview(query), 'sql', start_ns, rows=max(rows, 0), bytes=nbytes)
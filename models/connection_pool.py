@@ -0,0 +1,177 @@
+# models/connection_pool.py
+import psycopg2
+from psycopg2 import extensions
+import threading
+import time
+import logging
+from typing import Dict, List, Optional, Tuple
+
+
+class PoolExhaustedError(psycopg2.OperationalError):
+    """Raised when no connection becomes available within the acquire timeout"""
+
+
+class ConnectionPool:
+    """Thread-safe pool of psycopg2 connections for a single DSN.
+
+    Pools live in a module-level registry, so they survive Streamlit reruns
+    and are shared by every session connected to the same database.
+    """
+
+    _registry: Dict[str, 'ConnectionPool'] = {}
+    _registry_lock = threading.Lock()
+
+    def __init__(self, connect_params: Dict, max_size: int = 8,
+                 acquire_timeout: float = 10.0, idle_timeout: float = 300.0,
+                 healthcheck_after: float = 30.0, **connect_kwargs):
+        self.connect_params = connect_params
+        self.connect_kwargs = connect_kwargs
+        self.max_size = max_size
+        self.acquire_timeout = acquire_timeout
+        self.idle_timeout = idle_timeout
+        self.healthcheck_after = healthcheck_after
+
+        self._idle: List[Tuple[extensions.connection, float]] = []  # (conn, released_at)
+        self._in_use = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    @classmethod
+    def for_dsn(cls, dsn: str, connect_params: Dict, **options) -> 'ConnectionPool':
+        """Return the shared pool for a DSN, creating it on first use"""
+        with cls._registry_lock:
+            pool = cls._registry.get(dsn)
+            if pool is None or pool._closed:
+                pool = cls(connect_params, **options)
+                cls._registry[dsn] = pool
+            return pool
+
+    @classmethod
+    def close_dsn(cls, dsn: str):
+        """Close and forget the pool for a DSN, if any"""
+        with cls._registry_lock:
+            pool = cls._registry.pop(dsn, None)
+        if pool is not None:
+            pool.close()
+
+    @classmethod
+    def close_all(cls):
+        with cls._registry_lock:
+            pools = list(cls._registry.values())
+            cls._registry.clear()
+        for pool in pools:
+            pool.close()
+
+    def acquire(self) -> extensions.connection:
+        """Check out a healthy connection, opening a new one if below max_size"""
+        deadline = time.monotonic() + self.acquire_timeout
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise psycopg2.InterfaceError("Connection pool is closed")
+                self._reap_idle_locked()
+                if self._idle:
+                    conn, released_at = self._idle.pop()
+                    self._in_use += 1
+                    break
+                if self._in_use < self.max_size:
+                    conn, released_at = None, None
+                    self._in_use += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolExhaustedError(
+                        f"No database connection available after {self.acquire_timeout:.0f}s "
+                        f"(pool size {self.max_size})"
+                    )
+                self._cond.wait(remaining)
+
+        # Connect / health check outside the lock so other sessions are not blocked
+        try:
+            if conn is not None and not self._is_healthy(conn, released_at):
+                self._discard(conn)
+                conn = None
+            if conn is None:
+                conn = psycopg2.connect(**self.connect_params, **self.connect_kwargs)
+            return conn
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, conn: extensions.connection):
+        """Return a connection to the pool, resetting any open transaction"""
+        reusable = not conn.closed
+        if reusable:
+            try:
+                if conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+                    if conn.autocommit:
+                        # Explicit BEGIN issued by the caller; psycopg2 won't roll it back
+                        with conn.cursor() as cur:
+                            cur.execute("ROLLBACK;")
+                    else:
+                        conn.rollback()
+                if conn.autocommit:
+                    conn.autocommit = False
+            except psycopg2.Error:
+                reusable = False
+
+        with self._cond:
+            self._in_use -= 1
+            if reusable and not self._closed:
+                self._idle.append((conn, time.monotonic()))
+                conn = None
+            self._cond.notify()
+
+        if conn is not None:
+            self._discard(conn)
+
+    def close(self):
+        """Close all idle connections; in-use ones are closed when released"""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._cond.notify_all()
+        for conn, _ in idle:
+            self._discard(conn)
+
+    def stats(self) -> Dict:
+        with self._cond:
+            return {
+                'idle': len(self._idle),
+                'in_use': self._in_use,
+                'max_size': self.max_size,
+            }
+
+    def _reap_idle_locked(self):
+        """Close connections idle longer than idle_timeout (caller holds the lock)"""
+        if not self._idle:
+            return
+        cutoff = time.monotonic() - self.idle_timeout
+        expired = [conn for conn, released_at in self._idle if released_at < cutoff]
+        if expired:
+            self._idle = [(c, t) for c, t in self._idle if t >= cutoff]
+            for conn in expired:
+                self._discard(conn)
+
+    def _is_healthy(self, conn: extensions.connection, released_at: Optional[float]) -> bool:
+        if conn.closed:
+            return False
+        if released_at is not None and time.monotonic() - released_at < self.healthcheck_after:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1;")
+            conn.rollback()
+            return True
+        except psycopg2.Error as e:
+            logging.warning(f"Discarding broken pooled connection: {e}")
+            return False
+
+    @staticmethod
+    def _discard(conn: extensions.connection):
+        try:
+            conn.close()
+        except Exception:
+            pass
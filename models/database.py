@@ -1,115 +1,250 @@
-# models/database.py
-import psycopg2
-from psycopg2.extras import DictCursor
-from config.settings import settings
-import contextlib
-from typing import Optional, Tuple, Dict
-import logging
-
-class DatabaseConnection:
-    @staticmethod
-    @contextlib.contextmanager
-    def get_connection():
-        conn = None
-        try:
-            conn = psycopg2.connect(**settings.db_params)
-            yield conn
-        finally:
-            if conn is not None:
-                conn.close()
-
-    @staticmethod
-    def test_connection() -> str:
-        try:
-            with DatabaseConnection.get_connection() as conn:
-                with conn.cursor() as cur:
-                    cur.execute('SELECT version();')
-                    version = cur.fetchone()
-                    
-                    # Check and setup monitoring capabilities
-                    monitoring_status = DatabaseConnection.setup_monitoring()
-                    return f"Successfully connected to PostgreSQL. Version: {version[0]}\n{monitoring_status}"
-        except Exception as e:
-            return f"Connection failed: {str(e)}"
-
-    @staticmethod
-    def setup_monitoring() -> str:
-        """Attempt to set up monitoring capabilities and return status message"""
-        try:
-            with DatabaseConnection.get_connection() as conn:
-                with conn.cursor() as cur:
-                    # Check if we have necessary permissions
-                    cur.execute("SELECT usesuper, usecreatedb FROM pg_user WHERE usename = current_user;")
-                    permissions = cur.fetchone()
-                    
-                    if not permissions:
-                        return "Warning: Could not determine user permissions"
-                    
-                    is_superuser, can_create_db = permissions
-                    
-                    # Check if extension exists
-                    cur.execute("""
-                        SELECT EXISTS (
-                            SELECT 1 FROM pg_available_extensions 
-                            WHERE name = 'pg_stat_statements'
-                        );
-                    """)
-                    extension_available = cur.fetchone()[0]
-                    
-                    if not extension_available:
-                        return """
-                            Note: pg_stat_statements extension is not available. 
-                            Some monitoring features will be limited.
-                            """
-                    
-                    # Try to create extension if not exists
-                    try:
-                        cur.execute("""
-                            CREATE EXTENSION IF NOT EXISTS pg_stat_statements;
-                        """)
-                        conn.commit()
-                        return "Successfully configured monitoring capabilities"
-                    except psycopg2.Error as e:
-                        if "permission denied" in str(e).lower():
-                            return """
-                                Note: Limited permissions detected. 
-                                Please contact your database administrator to enable pg_stat_statements.
-                                Basic monitoring features will still be available.
-                                """
-                        return f"Warning: Could not enable full monitoring: {str(e)}"
-                        
-        except Exception as e:
-            return f"Warning: Error during monitoring setup: {str(e)}"
-
-    @staticmethod
-    def get_basic_stats() -> Dict:
-        """Get basic database statistics that don't require pg_stat_statements"""
-        try:
-            with DatabaseConnection.get_connection() as conn:
-                with conn.cursor(cursor_factory=DictCursor) as cur:
-                    # Get database size
-                    cur.execute("SELECT pg_size_pretty(pg_database_size(current_database()));")
-                    db_size = cur.fetchone()[0]
-                    
-                    # Get table counts
-                    cur.execute("""
-                        SELECT COUNT(*) FROM information_schema.tables 
-                        WHERE table_schema NOT IN ('pg_catalog', 'information_schema');
-                    """)
-                    table_count = cur.fetchone()[0]
-                    
-                    # Get active connections
-                    cur.execute("""
-                        SELECT count(*) FROM pg_stat_activity 
-                        WHERE datname = current_database();
-                    """)
-                    connection_count = cur.fetchone()[0]
-                    
-                    return {
-                        'database_size': db_size,
-                        'table_count': table_count,
-                        'active_connections': connection_count
-                    }
-        except Exception as e:
-            logging.error(f"Error getting basic stats: {e}")
-            return {}
\ No newline at end of file
+# models/database.py
+import psycopg2
+from psycopg2 import extensions
+from psycopg2.extras import DictCursor
+from config.settings import settings
+from models.connection_pool import ConnectionPool
+from models.result_cache import ResultCache
+from core.tracing import TracingConnection, annotate, traced
+import contextlib
+import importlib.util
+import tempfile
+import pandas as pd
+from typing import Optional, Tuple, Dict, Iterator
+import logging
+
+# pandas' pyarrow CSV engine parses COPY output several times faster than
+# the C engine; it's optional (and has no chunked mode)
+PYARROW_AVAILABLE = importlib.util.find_spec('pyarrow') is not None
+
+class DatabaseConnection:
+    # Database size, table count, active connections and dead tuples in a single round trip
+    BASIC_STATS_SQL = """
+        SELECT
+            pg_size_pretty(db.size_bytes) AS database_size,
+            db.size_bytes AS database_size_bytes,
+            (SELECT COUNT(*) FROM information_schema.tables
+             WHERE table_schema NOT IN ('pg_catalog', 'information_schema')) AS table_count,
+            (SELECT count(*) FROM pg_stat_activity
+             WHERE datname = current_database()) AS active_connections,
+            (SELECT COALESCE(sum(n_dead_tup), 0)::bigint FROM pg_stat_user_tables) AS dead_tuples
+        FROM (SELECT pg_database_size(current_database()) AS size_bytes) db
+    """
+
+    # COPY writes NULL as \N so it stays distinct from an empty string
+    COPY_NULL = '\\N'
+    COPY_SQL = "COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER true, NULL '\\N')"
+
+    @staticmethod
+    def get_pool(dsn: Optional[str] = None, **connect_kwargs) -> ConnectionPool:
+        """Return the shared connection pool for a DSN (defaults to settings.DATABASE_URL).
+
+        `connect_kwargs` (e.g. connection_factory) only apply if this call creates the pool.
+        """
+        dsn = dsn or settings.DATABASE_URL
+        # Every statement on pooled connections becomes a tracing span
+        connect_kwargs.setdefault('connection_factory', TracingConnection)
+        return ConnectionPool.for_dsn(
+            dsn,
+            settings.db_params_for(dsn),
+            max_size=settings.DB_POOL_MAX_SIZE,
+            acquire_timeout=settings.DB_POOL_ACQUIRE_TIMEOUT,
+            idle_timeout=settings.DB_POOL_IDLE_TIMEOUT,
+            healthcheck_after=settings.DB_POOL_HEALTHCHECK_AFTER,
+            **connect_kwargs
+        )
+
+    @staticmethod
+    @contextlib.contextmanager
+    def get_connection(dsn: Optional[str] = None):
+        pool = DatabaseConnection.get_pool(dsn)
+        conn = pool.acquire()
+        try:
+            yield conn
+        finally:
+            pool.release(conn)
+
+    @staticmethod
+    def close_pool(dsn: Optional[str] = None):
+        """Close all pooled connections for a DSN (e.g. when switching databases)"""
+        dsn = dsn or settings.DATABASE_URL
+        if dsn:
+            ConnectionPool.close_dsn(dsn)
+            ResultCache.drop_dsn(dsn)
+
+    @staticmethod
+    @traced('db')
+    def test_connection(dsn: Optional[str] = None) -> str:
+        try:
+            with DatabaseConnection.get_connection(dsn) as conn:
+                with conn.cursor() as cur:
+                    cur.execute('SELECT version();')
+                    version = cur.fetchone()
+                    
+                    # Check and setup monitoring capabilities
+                    monitoring_status = DatabaseConnection.setup_monitoring(dsn)
+                    return f"Successfully connected to PostgreSQL. Version: {version[0]}\n{monitoring_status}"
+        except Exception as e:
+            return f"Connection failed: {str(e)}"
+
+    @staticmethod
+    @traced('db')
+    def setup_monitoring(dsn: Optional[str] = None) -> str:
+        """Attempt to set up monitoring capabilities and return status message"""
+        try:
+            # Every session connecting to the same database gets the same answer
+            return ResultCache.for_dsn(dsn).get(
+                'capabilities', lambda: DatabaseConnection._setup_monitoring(dsn), 'setup_monitoring'
+            )
+        except Exception as e:
+            return f"Warning: Error during monitoring setup: {str(e)}"
+
+    @staticmethod
+    def _setup_monitoring(dsn: Optional[str] = None) -> str:
+        with DatabaseConnection.get_connection(dsn) as conn:
+            with conn.cursor() as cur:
+                # Check if we have necessary permissions
+                cur.execute("SELECT usesuper, usecreatedb FROM pg_user WHERE usename = current_user;")
+                permissions = cur.fetchone()
+                
+                if not permissions:
+                    return "Warning: Could not determine user permissions"
+                
+                is_superuser, can_create_db = permissions
+                
+                # Check if extension exists
+                cur.execute("""
+                    SELECT EXISTS (
+                        SELECT 1 FROM pg_available_extensions 
+                        WHERE name = 'pg_stat_statements'
+                    );
+                """)
+                extension_available = cur.fetchone()[0]
+                
+                if not extension_available:
+                    return """
+                        Note: pg_stat_statements extension is not available. 
+                        Some monitoring features will be limited.
+                        """
+                
+                # Try to create extension if not exists
+                try:
+                    cur.execute("""
+                        CREATE EXTENSION IF NOT EXISTS pg_stat_statements;
+                    """)
+                    conn.commit()
+                    return "Successfully configured monitoring capabilities"
+                except psycopg2.Error as e:
+                    if "permission denied" in str(e).lower():
+                        return """
+                            Note: Limited permissions detected. 
+                            Please contact your database administrator to enable pg_stat_statements.
+                            Basic monitoring features will still be available.
+                            """
+                    return f"Warning: Could not enable full monitoring: {str(e)}"
+
+    @staticmethod
+    @traced('db')
+    def get_basic_stats(dsn: Optional[str] = None) -> Dict:
+        """Get basic database statistics that don't require pg_stat_statements"""
+        try:
+            return ResultCache.for_dsn(dsn).get('basic_stats', lambda: DatabaseConnection._get_basic_stats(dsn))
+        except Exception as e:
+            logging.error(f"Error getting basic stats: {e}")
+            return {}
+
+    @staticmethod
+    def _get_basic_stats(dsn: Optional[str] = None) -> Dict:
+        with DatabaseConnection.get_connection(dsn) as conn:
+            with conn.cursor(cursor_factory=DictCursor) as cur:
+                cur.execute(DatabaseConnection.BASIC_STATS_SQL + ";")
+                return dict(cur.fetchone())
+
+    @staticmethod
+    @traced('db')
+    def read_frame(conn, query: str, dtypes: Optional[Dict[str, object]] = None,
+                   params=None) -> pd.DataFrame:
+        """Run a query through COPY ... TO STDOUT (CSV) into a DataFrame.
+
+        Much faster and lighter than pd.read_sql on large results: rows are
+        parsed by pandas' C reader instead of being built as Python tuples.
+        Columns listed in `dtypes` get that dtype (bool columns are read from
+        t/f, datetime64 columns parsed as timestamps); the rest are inferred.
+        """
+        spool = DatabaseConnection._copy_to_spool(conn, query, params)
+        with spool:
+            df = DatabaseConnection._read_csv(spool, dtypes, engine='pyarrow' if PYARROW_AVAILABLE else 'c')
+            if PYARROW_AVAILABLE:
+                # The pyarrow engine leaves na_values alone in text columns
+                for column in df.columns:
+                    if pd.api.types.is_string_dtype(df[column]):
+                        df[column] = df[column].mask(df[column] == DatabaseConnection.COPY_NULL)
+            annotate(rows=len(df))
+            return DatabaseConnection._typed(df, dtypes)
+
+    @staticmethod
+    @traced('db')
+    def read_chunks(conn, query: str, dtypes: Optional[Dict[str, object]] = None,
+                    params=None, chunk_rows: Optional[int] = None) -> Iterator[pd.DataFrame]:
+        """Like read_frame, but yield the result `chunk_rows` rows at a time.
+
+        The COPY runs to completion before this returns, into a buffer that
+        spills to disk past COPY_SPOOL_MAX_BYTES, so the connection can go
+        back to the pool while the chunks are still being consumed.
+        """
+        spool = DatabaseConnection._copy_to_spool(conn, query, params)
+
+        def chunks():
+            with spool:
+                with DatabaseConnection._read_csv(spool, dtypes, chunk_rows or settings.COPY_CHUNK_ROWS) as reader:
+                    for chunk in reader:
+                        yield DatabaseConnection._typed(chunk, dtypes)
+        return chunks()
+
+    @staticmethod
+    def _copy_to_spool(conn, query: str, params=None):
+        with conn.cursor() as cur:
+            if params:
+                # COPY takes no bind parameters; mogrify quotes them client-side
+                query = cur.mogrify(query, params).decode(extensions.encodings.get(conn.encoding, 'utf-8'))
+            if not (conn.info.parameter_status('DateStyle') or '').startswith('ISO'):
+                # Timestamps in the CSV must be ISO 8601 for _typed to parse them
+                cur.execute("SET DateStyle = 'ISO, YMD'")
+            spool = tempfile.SpooledTemporaryFile(max_size=settings.COPY_SPOOL_MAX_BYTES)
+            try:
+                cur.copy_expert(DatabaseConnection.COPY_SQL.format(query=query.strip().rstrip(';')), spool)
+            except Exception:
+                spool.close()
+                raise
+        # Bytes go to the caller's span (read_frame/read_chunks)
+        annotate(bytes=spool.tell())
+        spool.seek(0)
+        return spool
+
+    @staticmethod
+    def _read_csv(buffer, dtypes: Optional[Dict[str, object]] = None, chunk_rows: Optional[int] = None,
+                  engine: str = 'c'):
+        # bool and datetime columns are read as text and converted by _typed
+        csv_dtypes = {
+            column: 'str' if DatabaseConnection._converted(dtype) else dtype
+            for column, dtype in (dtypes or {}).items()
+        }
+        return pd.read_csv(buffer, dtype=csv_dtypes, na_values=[DatabaseConnection.COPY_NULL],
+                           keep_default_na=False, chunksize=chunk_rows, engine=engine)
+
+    @staticmethod
+    def _converted(dtype) -> bool:
+        name = str(pd.api.types.pandas_dtype(dtype))
+        return name in ('bool', 'boolean') or name.startswith('datetime64')
+
+    @staticmethod
+    def _typed(df: pd.DataFrame, dtypes: Optional[Dict[str, object]]) -> pd.DataFrame:
+        for column, dtype in (dtypes or {}).items():
+            if column not in df or not DatabaseConnection._converted(dtype):
+                continue
+            if str(pd.api.types.pandas_dtype(dtype)).startswith('datetime64'):
+                # Postgres drops zero fractional seconds, so formats vary row to row
+                df[column] = pd.to_datetime(df[column], utc='UTC' in str(dtype), format='ISO8601')
+            else:
+                df[column] = df[column].map({'t': True, 'f': False}).astype(dtype)
+        return df
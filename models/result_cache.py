@@ -0,0 +1,120 @@
+# models/result_cache.py
+import threading
+import time
+import pandas as pd
+from typing import Callable, Dict, Hashable, Optional, Tuple, TypeVar
+from config.settings import settings
+from core.tracing import annotate
+
+T = TypeVar('T')
+
+
+class _Flight:
+    """A load in progress; callers asking for the same key wait on it"""
+
+    def __init__(self, generation: int):
+        self.generation = generation
+        self.done = threading.Event()
+        self.value = None
+        self.error: Optional[BaseException] = None
+
+
+class ResultCache:
+    """Query results shared by every session watching the same database.
+
+    Entries are keyed by method name plus arguments and expire after
+    RESULT_CACHE_TTLS[method] seconds. Concurrent misses for one key run a
+    single load (single-flight): ten viewers opening the same page cost the
+    database one query. Failed loads are never cached.
+    """
+
+    _registry: Dict[str, 'ResultCache'] = {}
+    _registry_lock = threading.Lock()
+
+    def __init__(self, ttls: Optional[Dict[str, float]] = None):
+        self.ttls = settings.RESULT_CACHE_TTLS if ttls is None else ttls
+        self._entries: Dict[Tuple, Tuple[object, float]] = {}  # key -> (value, expires_at)
+        self._flights: Dict[Tuple, _Flight] = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_dsn(cls, dsn: Optional[str]) -> 'ResultCache':
+        """Return the shared cache for a DSN (defaults to settings.DATABASE_URL)"""
+        dsn = dsn or settings.DATABASE_URL or ''
+        with cls._registry_lock:
+            cache = cls._registry.get(dsn)
+            if cache is None:
+                cache = cls()
+                cls._registry[dsn] = cache
+            return cache
+
+    @classmethod
+    def drop_dsn(cls, dsn: Optional[str]):
+        """Forget everything cached for a DSN (e.g. when switching databases)"""
+        with cls._registry_lock:
+            cache = cls._registry.pop(dsn or settings.DATABASE_URL or '', None)
+        if cache is not None:
+            cache.invalidate()
+
+    def get(self, method: str, load: Callable[[], T], *args: Hashable) -> T:
+        """Return the cached result of `method` for `args`, calling load() on a miss"""
+        ttl = self.ttls.get(method, 0)
+        if ttl <= 0:
+            return load()
+
+        key = (method, args)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > time.monotonic():
+                annotate(cache='hit')
+                return self._detached(entry[0])
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight(self._generation)
+
+        # 'wait': another session's load for the same key was already running
+        annotate(cache='miss' if leader else 'wait')
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return self._detached(flight.value)
+
+        try:
+            flight.value = load()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                # A load that started before an invalidation may hold stale data
+                if flight.error is None and flight.generation == self._generation:
+                    now = time.monotonic()
+                    self._prune_locked(now)
+                    self._entries[key] = (flight.value, now + ttl)
+            flight.done.set()
+        return self._detached(flight.value)
+
+    def invalidate(self, *methods: str):
+        """Drop cached results for `methods` (all of them if none given)"""
+        with self._lock:
+            self._generation += 1
+            for table in (self._entries, self._flights):
+                for key in [key for key in table if not methods or key[0] in methods]:
+                    del table[key]
+
+    def _prune_locked(self, now: float):
+        # Search and paging arguments make keys open-ended; drop expired ones
+        for key in [key for key, (_, expires_at) in self._entries.items() if expires_at <= now]:
+            del self._entries[key]
+
+    @staticmethod
+    def _detached(value):
+        # Results are shared across sessions; hand out copies of mutable ones
+        if isinstance(value, (pd.DataFrame, dict)):
+            return value.copy()
+        return value
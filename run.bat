@@ -1,3 +1,3 @@
-python -m streamlit run app.py
-
-
+python -m streamlit run app.py
+
+
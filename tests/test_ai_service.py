@@ -0,0 +1,153 @@
+# tests/test_ai_service.py
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from config.settings import settings
+from core.ai_cache import AnalysisCache
+from core.ai_service import AIService, TokenBucket
+
+
+class StubServer(ThreadingHTTPServer):
+    """Answers POSTs with scripted (status, headers, body) responses, in order"""
+
+    daemon_threads = True
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.requests = 0
+        self.connections = set()
+        super().__init__(('127.0.0.1', 0), _StubHandler)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/chat"
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, so connection reuse is observable
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.server.requests += 1
+        self.server.connections.add(self.client_address)
+        status, headers, body = self.server.responses.pop(0)
+        body = body.encode()
+        self.send_response(status)
+        for key, value in {'Content-Length': str(len(body)), **headers}.items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def stub():
+    servers = []
+
+    def start(*responses):
+        server = StubServer(responses)
+        threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+        servers.append(server)
+        return server
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def sse(*chunks, done=True) -> str:
+    events = [f"data: {json.dumps({'choices': [{'delta': {'content': chunk}}]})}\n\n" for chunk in chunks]
+    return ''.join(events) + ("data: [DONE]\n\n" if done else '')
+
+
+def completion(content: str) -> str:
+    return json.dumps({'choices': [{'message': {'role': 'assistant', 'content': content}}]})
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Backoff and rate-limit waits, recorded instead of slept"""
+    recorded = []
+    monkeypatch.setattr('core.ai_service.time.sleep', recorded.append)
+    return recorded
+
+
+def service_for(server, tmp_path) -> AIService:
+    return AIService(api_key='test', cache=AnalysisCache(str(tmp_path / 'cache.sqlite3')), base_url=server.url,
+                     rate_limiter=TokenBucket(1000, capacity=10))
+
+
+def test_completed_stream_is_cached(stub, tmp_path):
+    server = stub((200, {'Content-Type': 'text/event-stream'}, sse('Use ', 'an index')))
+    service = service_for(server, tmp_path)
+
+    assert ''.join(service.stream_deep_analyze_query('SELECT 1')) == 'Use an index'
+    assert ''.join(service.stream_deep_analyze_query('SELECT 1')) == 'Use an index'
+    assert server.requests == 1
+
+
+def test_stream_cut_off_before_done_is_not_cached(stub, tmp_path):
+    server = stub((200, {'Content-Type': 'text/event-stream'}, sse('Use ', done=False)))
+    service = service_for(server, tmp_path)
+
+    assert ''.join(service.stream_deep_analyze_query('SELECT 1')) == 'Use '
+    assert service.cached_deep_analysis('SELECT 1') is None
+
+
+def test_retries_429_and_5xx_honouring_retry_after(stub, tmp_path, sleeps, monkeypatch):
+    monkeypatch.setattr(settings, 'AI_BACKOFF_BASE', 1.0)
+    server = stub(
+        (429, {'Retry-After': '7'}, ''),
+        (503, {}, ''),
+        (200, {'Content-Type': 'application/json'}, completion('ok')),
+    )
+    result = service_for(server, tmp_path).analyze_query('SELECT 1')
+
+    assert result['choices'][0]['message']['content'] == 'ok'
+    assert server.requests == 3
+    assert sleeps[0] == 7
+    assert 1.0 <= sleeps[1] <= 2.0  # second attempt: base * 2 with jitter
+
+
+def test_gives_up_after_max_retries_and_does_not_retry_client_errors(stub, tmp_path, sleeps):
+    server = stub((503, {}, ''), (503, {}, ''), (400, {}, ''))
+    service = service_for(server, tmp_path)
+    service.max_retries = 1
+
+    assert 'error' in service.analyze_query('SELECT 1')
+    assert server.requests == 2
+    assert 'error' in service.analyze_query('SELECT * FROM t2')
+    assert server.requests == 3
+
+
+def test_exhausted_server_limit_pauses_later_requests(stub, tmp_path):
+    server = stub(
+        (200, {'x-ratelimit-remaining-requests': '0', 'x-ratelimit-reset-requests': '2.5s'}, completion('a')),
+    )
+    service = service_for(server, tmp_path)
+    service.analyze_query('SELECT 1')
+
+    assert 2.0 < service.rate_limiter._paused_until - time.monotonic() <= 2.5
+
+
+def test_requests_reuse_one_pooled_connection(stub, tmp_path):
+    server = stub(*[(200, {}, completion(str(i))) for i in range(3)])
+    service = service_for(server, tmp_path)
+    for i in range(3):
+        service.analyze_query(f'SELECT * FROM t{i}')
+
+    assert server.requests == 3
+    assert len(server.connections) == 1
+
+
+def test_zero_rate_means_no_client_side_limit(sleeps):
+    bucket = TokenBucket(0, capacity=1)
+    for _ in range(100):
+        bucket.acquire()
+    assert sleeps == []
+    with pytest.raises(ValueError):
+        TokenBucket(-1)
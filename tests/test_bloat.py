@@ -0,0 +1,60 @@
+# tests/test_bloat.py
+import pandas as pd
+from core.bloat import BLOAT_DTYPES, BloatEstimator
+
+MB = 1024 ** 2
+
+
+def estimate(kind: str, name: str, **values) -> dict:
+    row = {column: None for column in BLOAT_DTYPES}
+    row.update({
+        'kind': kind, 'table_name': 'public.orders' if kind == 'index' else f'public.{name}',
+        'index_name': name if kind == 'index' else None,
+        'qualified_name': f'public.{name}', 'tuple_bytes': 100.0, 'n_dead_tup': 0.0, 'vacuum_threshold': 1000.0,
+        'autovacuum_enabled': True, 'bloat_bytes': 0.0, 'bloat_ratio': 0.0,
+    })
+    row.update(values)
+    return row
+
+
+def test_worklist_ranks_actions_by_reclaimable_bytes():
+    estimates = pd.DataFrame([
+        estimate('table', 'orders', n_dead_tup=50000.0),
+        estimate('table', 'events', bloat_bytes=400 * MB, bloat_ratio=0.6),
+        estimate('index', 'orders_pkey', bloat_bytes=80 * MB, bloat_ratio=0.5),
+        # Under the thresholds: no action
+        estimate('table', 'users', n_dead_tup=10.0, bloat_bytes=2 * MB, bloat_ratio=0.9),
+        estimate('index', 'users_pkey', bloat_bytes=50 * MB, bloat_ratio=0.1),
+    ])
+    worklist = BloatEstimator('dsn').worklist(estimates)
+
+    assert worklist['action'].tolist() == [
+        'VACUUM FULL public.events; -- or pg_repack, without the exclusive lock',
+        'REINDEX INDEX CONCURRENTLY public.orders_pkey;',
+        'VACUUM (ANALYZE) public.orders;',
+    ]
+    assert worklist['priority'].tolist() == [1, 2, 3]
+    assert worklist['reclaimable_bytes'].iloc[2] == 50000 * 100.0
+    assert 'never autovacuumed' in worklist['reason'].iloc[2]
+    assert BloatEstimator.summarize(worklist) == {
+        'actions': 3, 'reclaimable_bytes': 480 * MB + 5e6, 'overdue_vacuums': 1
+    }
+
+
+def test_relations_being_vacuumed_go_last_with_their_progress():
+    estimates = pd.DataFrame([
+        estimate('table', 'orders', n_dead_tup=900000.0, vacuum_phase='scanning heap', vacuum_progress=0.25),
+        estimate('table', 'events', n_dead_tup=2000.0, autovacuum_enabled=False),
+    ])
+    worklist = BloatEstimator('dsn').worklist(estimates)
+
+    assert worklist['table_name'].tolist() == ['public.events', 'public.orders']
+    assert worklist['action'].tolist() == ['VACUUM (ANALYZE) public.events;', 'VACUUM (ANALYZE) public.orders;']
+    assert '(autovacuum is disabled for this table)' in worklist['reason'].iloc[0]
+    assert worklist['reason'].iloc[1].endswith('vacuum running: scanning heap (25% scanned)')
+
+
+def test_empty_worklist():
+    worklist = BloatEstimator('dsn').worklist(pd.DataFrame([estimate('table', 'orders')]))
+    assert worklist.empty
+    assert BloatEstimator.summarize(worklist) == {'actions': 0, 'reclaimable_bytes': 0.0, 'overdue_vacuums': 0}
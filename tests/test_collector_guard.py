@@ -0,0 +1,68 @@
+# tests/test_collector_guard.py
+from datetime import datetime
+import pandas as pd
+from psycopg2 import errors
+from config.settings import settings
+from core.ash import ActiveSessionHistory
+from core.collector_guard import CollectorGuard
+from core.history_store import HistoryStore
+from core.plan_history import PlanTracker
+from core.sampler import MetricsSampler
+from core.snapshot import Snapshot
+
+
+def test_levels_alternate_interval_and_subsets():
+    guard = CollectorGuard(max_level=6, budget=0.01, relax_after=2)
+    guard.observe(400, 30)  # budget 300 ms
+    assert (guard.level, guard.interval_factor, guard.relation_subsets) == (1, 2, 1)
+    guard.observe(5, 60, errors.QueryCanceled())
+    assert (guard.level, guard.interval_factor, guard.relation_subsets) == (2, 2, 2)
+    assert [guard.next_subset() for _ in range(3)] == [(2, 0), (2, 1), (2, 0)]
+    guard.observe(10, 60)
+    guard.observe(10, 60)
+    assert guard.level == 1
+
+
+def test_slowed_session_samples_keep_their_database_time():
+    ash = ActiveSessionHistory('guard-test-ash', interval=1.0, capacity=100)
+    row = (42, 'active', 'IO', 'DataFileRead', 'client backend', 'select 1', None)
+    ash.buffer.append(1000.0, [row], seconds=1.0)
+    ash.buffer.append(1004.0, [row], seconds=4.0)  # guarded: one sample per 4 s
+    by_wait = ash.db_time_by_wait_class()
+    assert by_wait['db_time_seconds'].sum() == 5.0
+    assert by_wait['avg_active_sessions'].sum() == 1.0
+    assert ash.top_waiting_fingerprints()['wait_seconds'].sum() == 5.0
+
+
+def test_plan_capture_pauses_while_backing_off(tmp_path):
+    class Analyzer:
+        explained = []
+
+        def explain(self, query):
+            self.explained.append(query)
+            raise ValueError("not reached")
+
+    dsn = 'guard-test-plans'
+    CollectorGuard.for_dsn(dsn).level = 1
+    analyzer = Analyzer()
+    tracker = PlanTracker(dsn, history=HistoryStore(str(tmp_path / 'history.sqlite3')), plan_analyzer=analyzer)
+    snapshot = Snapshot(
+        collected_at=datetime(2024, 1, 1), capabilities={'pg_stat_statements_enabled': True}, basic_stats={},
+        statements=pd.DataFrame({'queryid': [1], 'query_preview': ['select 1'], 'avg_exec_time': [1.0]}),
+        table_stats=pd.DataFrame(), index_usage=pd.DataFrame(),
+    )
+    assert tracker.capture_top(snapshot) == []
+    assert analyzer.explained == []
+
+
+def test_guard_is_charged_server_time_not_network_latency(monkeypatch):
+    monkeypatch.setattr(settings, 'HISTORY_ENABLED', False)
+    sampler = MetricsSampler('guard-test-latency', interval=30)
+    sampler.guard = CollectorGuard(budget=0.01)  # 300 ms
+    # 2 s on the client, almost all of it round trips over a slow link
+    sampler._collect = lambda: Snapshot(
+        collected_at=datetime(2024, 1, 1), capabilities={}, basic_stats={}, statements=pd.DataFrame(),
+        table_stats=pd.DataFrame(), index_usage=pd.DataFrame(), query_ms={'snapshot': 2000.0}, server_ms=20.0,
+    )
+    sampler.run_once()
+    assert (sampler.guard.level, sampler.guard.last_cost_ms) == (0, 20.0)
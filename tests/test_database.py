@@ -0,0 +1,30 @@
+# tests/test_database.py
+import io
+import pandas as pd
+from models.database import DatabaseConnection
+
+DTYPES = {'captured_at': 'datetime64[ns, UTC]', 'is_valid': 'bool'}
+
+
+def test_mixed_fractional_seconds_parse():
+    # COPY output: Postgres omits a zero fractional part
+    csv = io.BytesIO(
+        b"captured_at,is_valid\n"
+        b"2024-01-02 10:00:00+00,t\n"
+        b"2024-01-02 10:00:00.123456+00,f\n"
+        b"2024-01-02 12:30:00.5+02,\\N\n"
+    )
+    df = DatabaseConnection._typed(DatabaseConnection._read_csv(csv, DTYPES), DTYPES)
+    assert list(df['captured_at']) == [
+        pd.Timestamp('2024-01-02 10:00:00', tz='UTC'),
+        pd.Timestamp('2024-01-02 10:00:00.123456', tz='UTC'),
+        pd.Timestamp('2024-01-02 10:30:00.5', tz='UTC'),
+    ]
+    assert list(df['is_valid'][:2]) == [True, False]
+
+
+def test_fractional_first_then_whole_seconds_parse():
+    df = DatabaseConnection._typed(
+        pd.DataFrame({'captured_at': ['2024-01-02 10:00:00.123456+00', '2024-01-02 10:00:01+00']}), DTYPES
+    )
+    assert df['captured_at'].iloc[1] == pd.Timestamp('2024-01-02 10:00:01', tz='UTC')
@@ -0,0 +1,49 @@
+# tests/test_db_monitor.py
+import os
+import psycopg2
+import pytest
+from core.db_monitor import DBMonitor
+
+# Ties on row_count, so pages must fall back to the key to stay disjoint;
+# always run with a params dict, hence the %% escape
+RELATIONS_SQL = """
+    SELECT * FROM (VALUES
+        (11::oid, 'public.orders', 500::bigint), (12::oid, 'public.order_items', 500::bigint),
+        (13::oid, 'public.users', 300::bigint), (14::oid, 'audit.events', 500::bigint),
+        (15::oid, 'public.sessions', 100::bigint), (16::oid, 'public.order_100%%_done', 50::bigint)
+    ) v(key, table_name, row_count)
+"""
+
+
+def test_page_sql_adds_keyset_and_escaped_search():
+    sql, params = DBMonitor.relation_page_sql(RELATIONS_SQL, 'row_count', 2, 'table_name',
+                                              search='100%_', after=(500.0, 12))
+    assert "WHERE table_name ILIKE %(search)s" in sql
+    assert "WHERE (row_count, key) < (%(after_value)s, %(after_key)s::oid)" in sql
+    assert params == {'search': '%100\\%\\_%', 'after_value': 500.0, 'after_key': 12}
+    assert DBMonitor.relation_page_sql(RELATIONS_SQL, 'row_count', 2, 'table_name')[1] == {}
+
+
+@pytest.mark.skipif(not os.getenv('TEST_DATABASE_URL'), reason="set TEST_DATABASE_URL to run against PostgreSQL")
+def test_keyset_pages_cover_every_row_once():
+    with psycopg2.connect(os.environ['TEST_DATABASE_URL']) as conn, conn.cursor() as cur:
+        def page(after=None, search=None):
+            cur.execute(*DBMonitor.relation_page_sql(RELATIONS_SQL, 'row_count', 2, 'table_name', search, after))
+            return cur.fetchall()
+
+        pages, after = [], None
+        while True:
+            rows = page(after)
+            if not rows:
+                break
+            pages.append([row[0] for row in rows])
+            # (sort value, key) of the last row, as DBMonitor.next_page_after builds it
+            after = (float(rows[-1][2]), int(rows[-1][0]))
+            assert (rows[0][3], rows[0][4]) == (6, 1950.0)
+
+        assert pages == [[14, 12], [11, 13], [15, 16]]
+        matching = page(search='order')
+        assert [row[1] for row in matching] == ['public.order_items', 'public.orders']
+        assert (matching[0][3], matching[0][4]) == (3, 1050.0)
+        assert [row[1] for row in page(search='100%')] == ['public.order_100%_done']
+        conn.rollback()
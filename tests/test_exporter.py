@@ -0,0 +1,32 @@
+# tests/test_exporter.py
+import argparse
+from config.settings import settings
+from exporter import build_registry
+
+SECRETS = """
+[targets]
+orders = "postgresql://primary/orders"
+
+[standbys]
+orders = "postgresql://replica/orders"
+"""
+
+
+def arguments(*targets) -> argparse.Namespace:
+    return argparse.Namespace(target=list(targets), standby=[])
+
+
+def test_targets_come_from_secrets_toml_without_the_ui(tmp_path, monkeypatch):
+    (tmp_path / '.streamlit').mkdir()
+    (tmp_path / '.streamlit' / 'secrets.toml').write_text(SECRETS)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('HOME', str(tmp_path / 'home'))
+    monkeypatch.setattr(settings, 'STANDBY_URLS', {})
+
+    registry = build_registry(arguments())
+    assert [(t.name, t.dsn) for t in registry.all()] == [('orders', 'postgresql://primary/orders')]
+    assert settings.standby_for('postgresql://primary/orders') == 'postgresql://replica/orders'
+
+    # --target replaces the configured targets
+    registry = build_registry(arguments('billing=postgresql://primary/billing', 'postgresql://primary/app'))
+    assert registry.names() == ['billing', 'default']
@@ -0,0 +1,31 @@
+# tests/test_fingerprint.py
+import pytest
+from core.fingerprint import fingerprint, normalize_query
+
+
+def test_in_lists_of_any_length_share_a_fingerprint():
+    assert normalize_query("SELECT * FROM t WHERE id IN (1, 2, 3)") == "select * from t where id in ( ? )"
+    assert fingerprint("SELECT * FROM t WHERE id NOT IN (1, 2)") == \
+        fingerprint("select * from t where id not in (4, 5, 6, 7)")
+
+
+@pytest.mark.parametrize('first, second', [
+    ("SELECT coalesce(1, 2) FROM t", "SELECT coalesce(1, 2, 3) FROM t"),
+    ("SELECT f(1, 2) FROM t", "SELECT f(1) FROM t"),
+    ("INSERT INTO t VALUES (1, 2), (3, 4)", "INSERT INTO t VALUES (1, 2, 3), (4, 5, 6)"),
+])
+def test_other_constant_lists_keep_their_arity(first, second):
+    assert fingerprint(first) != fingerprint(second)
+
+
+def test_multi_row_values_collapse_to_one_row():
+    assert normalize_query("INSERT INTO t VALUES (1, 'a'), (2, 'b'), (3, 'c')") == \
+        "insert into t values ( ? , ? )"
+
+
+@pytest.mark.parametrize('query', [
+    "SELECT * FROM t WHERE a = E'it\\'s' AND b = 1",
+    "SELECT * FROM t /* c */ WHERE a = E'it\\'s' AND b = 1",
+])
+def test_escape_strings_end_at_an_unescaped_quote(query):
+    assert normalize_query(query) == "select * from t where a = ? and b = ?"
@@ -0,0 +1,72 @@
+# tests/test_history_store.py
+import time
+from datetime import datetime, timedelta
+import pandas as pd
+from core.history_store import MINUTE, HistoryStore
+from core.snapshot import Snapshot, SnapshotCollector
+
+
+def empty_frame(columns) -> pd.DataFrame:
+    return pd.DataFrame({c: pd.Series(dtype=str if c.endswith('_name') else 'float64') for c in columns})
+
+
+def make_snapshot(collected_at: datetime) -> Snapshot:
+    return Snapshot(
+        collected_at=collected_at, capabilities={}, basic_stats={}, statements=pd.DataFrame(),
+        table_stats=empty_frame(SnapshotCollector.TABLE_COLUMNS),
+        index_usage=empty_frame(SnapshotCollector.INDEX_COLUMNS),
+    )
+
+
+def make_delta(queryid: int, calls: float, exec_ms: float, interval: float) -> pd.DataFrame:
+    delta = pd.DataFrame({
+        'queryid': [queryid] if calls else [], 'query': ['select 1'] if calls else [],
+        'calls': [calls] if calls else [], 'total_exec_time': [exec_ms] if calls else [],
+    })
+    delta.attrs['interval_seconds'] = interval
+    return delta
+
+
+def test_rollup_rates_of_intermittent_statements_cover_the_whole_bucket(tmp_path):
+    store = HistoryStore(str(tmp_path / 'history.sqlite3'))
+    store._last_compaction = time.monotonic()  # samples are back-dated; compact once they are all in
+    store.retention[0] = timedelta(seconds=1)  # read the minute rollup
+    minute = int(time.time() // MINUTE) * MINUTE - 2 * MINUTE
+    # Six 10 s samples; the statement only runs during one of them
+    for i in range(6):
+        calls, exec_ms = (10, 100.0) if i == 2 else (0, 0.0)
+        store.record('dsn', make_snapshot(datetime.fromtimestamp(minute + 5 + 10 * i)),
+                     make_delta(1, calls, exec_ms, 10.0))
+    store.compact()
+
+    series = store.statement_series('dsn', datetime.fromtimestamp(minute - 1))
+    assert len(series) == 1
+    assert series['interval_seconds'].iloc[0] == 60.0
+    assert series['exec_ms_per_sec'].iloc[0] == 100.0 / 60
+    assert series['calls_per_sec'].iloc[0] == 10 / 60
+
+
+def test_statement_text_is_pruned_with_its_history(tmp_path):
+    store = HistoryStore(str(tmp_path / 'history.sqlite3'))
+    store._last_compaction = time.monotonic()
+    store.record('dsn', make_snapshot(datetime.now() - timedelta(days=400)), make_delta(7, 1, 1.0, 10.0))
+    store.record('dsn', make_snapshot(datetime.now()), make_delta(8, 1, 1.0, 10.0))
+    store.compact()
+    assert [q for q, in store._conn.execute("SELECT queryid FROM statement_text")] == [8]
+
+
+def test_table_history_follows_the_largest_tables_not_the_sampled_top_n(tmp_path):
+    store = HistoryStore(str(tmp_path / 'history.sqlite3'))
+    store._last_compaction = time.monotonic()
+    snapshot = make_snapshot(datetime.now())
+    snapshot.table_stats = pd.DataFrame({
+        'table_name': ['public.events'], 'row_count': [10 ** 9], 'dead_tuples': [5], 'total_size': [8192]
+    })
+    snapshot.largest_tables = pd.DataFrame({
+        'table_name': ['public.archive', 'public.events'], 'row_count': [0, 10 ** 9],
+        'dead_tuples': [700, 5], 'total_size': [10 ** 12, 8192], 'pages': [10 ** 8, 1]
+    })
+    store.record('dsn', snapshot)
+
+    series = store.table_series('dsn', datetime.now() - timedelta(minutes=1), datetime.now() + timedelta(minutes=1))
+    assert sorted(series['table_name']) == ['public.archive', 'public.events']
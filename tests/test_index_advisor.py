@@ -0,0 +1,121 @@
+# tests/test_index_advisor.py
+import contextlib
+import pandas as pd
+from core.index_advisor import IndexAdvisor
+from core.query_analyzer import QueryAnalyzer, quote_ident
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, vars=None):
+        self.conn.executed.append(query)
+        if query.startswith('SELECT hypopg_reset') and self.conn.fail_reset:
+            raise RuntimeError("connection lost")
+        if query.startswith('SELECT indexname FROM hypopg_create_index'):
+            self.conn.hypothetical = vars[0]
+            self.result = ('<13337>btree_t_a',)
+        if query.startswith('EXPLAIN'):
+            if self.conn.explain_fails(query, self.conn.hypothetical):
+                raise RuntimeError("canceling statement due to statement timeout")
+            plan = {'Node Type': 'Seq Scan', 'Total Cost': 100.0}
+            if self.conn.hypothetical:
+                plan = {'Node Type': 'Index Scan', 'Index Name': '<13337>btree_t_a', 'Total Cost': 10.0}
+            self.result = ([{'Plan': plan}],)
+        if query.startswith('SELECT hypopg_reset'):
+            self.conn.hypothetical = None
+
+    def fetchone(self):
+        return self.result
+
+
+class FakeConnection:
+    def __init__(self, fail_reset=False, explain_fails=lambda query, index: True):
+        self.fail_reset = fail_reset
+        self.explain_fails = explain_fails
+        self.hypothetical = None
+        self.executed = []
+        self.closed = False
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+def advisor_on(conn) -> IndexAdvisor:
+    advisor = IndexAdvisor('dsn')
+
+    class Connections:
+        @staticmethod
+        @contextlib.contextmanager
+        def get_connection(dsn=None):
+            yield conn
+
+    advisor.db_connection = Connections
+    return advisor
+
+
+CANDIDATES = [{'table': 'public.t', 'columns': ['a'], 'queries': [(10.0, 'SELECT * FROM t WHERE a = 1', 1, 1)]}]
+
+
+def test_hypothetical_indexes_are_reset_when_explain_fails():
+    conn = FakeConnection()
+    advisor_on(conn)._validate_with_hypopg([dict(c) for c in CANDIDATES])
+    assert conn.executed[-1] == "SELECT hypopg_reset();"
+    assert not conn.closed
+
+
+def test_connection_is_discarded_when_reset_fails():
+    conn = FakeConnection(fail_reset=True)
+    advisor_on(conn)._validate_with_hypopg([dict(c) for c in CANDIDATES])
+    assert conn.closed
+
+
+def test_a_failing_candidate_leaves_the_others_validated():
+    conn = FakeConnection(explain_fails=lambda query, index: index is not None and '(b)' in index)
+    candidates = [
+        {'table': 'public.t', 'columns': ['b'], 'queries': [(20.0, 'SELECT * FROM t WHERE b = 1', 1, 1)]},
+        {'table': 'public.t', 'columns': ['a'], 'queries': [(10.0, 'SELECT * FROM t WHERE a = 1', 1, 1)]},
+    ]
+    advisor_on(conn)._validate_with_hypopg(candidates)
+    assert (candidates[0]['validated_benefit_ms'], candidates[0]['uses_index']) == (None, None)
+    assert (candidates[1]['validated_benefit_ms'], candidates[1]['uses_index']) == (9.0, True)
+    assert "ROLLBACK TO SAVEPOINT index_check;" in conn.executed
+    assert conn.executed[-1] == "SELECT hypopg_reset();"
+
+
+def test_mixed_case_identifiers_are_quoted():
+    advisor = IndexAdvisor('dsn')
+    looked_up = []
+
+    def load_catalog(names):
+        looked_up.extend(names)
+        relation = {'relname': '"Sales"."Orders"', 'reltuples': 1e6, 'relpages': 1e4, 'indexes': [],
+                    'stats': {'CustomerId': {'n_distinct': 5000.0, 'null_frac': 0.0}}}
+        return {'by_name': {'"Sales"."Orders"': relation}, 'hypopg': False}
+
+    advisor._load_catalog = load_catalog
+    recommendations = advisor.recommend(pd.DataFrame([{
+        'query': 'SELECT * FROM "Sales"."Orders" o WHERE o."CustomerId" = 42', 'calls': 10, 'total_exec_time': 500.0,
+    }]))
+    assert looked_up == ['"Sales"."Orders"']
+    assert recommendations['definition'].tolist() == ['CREATE INDEX CONCURRENTLY ON "Sales"."Orders" ("CustomerId")']
+
+
+def test_unquoted_names_fold_to_lower_case():
+    usage = QueryAnalyzer().extract_columns('SELECT * FROM Orders WHERE CustomerId = 1 ORDER BY "order"')
+    assert usage['tables'] == {'orders': 'orders'}
+    assert usage['equality'] == [(None, 'customerid')]
+    assert quote_ident('order') == '"order"' and quote_ident('customer_id') == 'customer_id'
@@ -0,0 +1,59 @@
+# tests/test_index_health.py
+from datetime import datetime, timedelta
+import pandas as pd
+from core.history_store import HistoryStore
+from core.index_health import INDEX_DEFINITIONS_DTYPES, IndexHealth
+
+
+def index_definition(index_name: str, number_of_scans: int) -> dict:
+    row = {column: '' for column, dtype in INDEX_DEFINITIONS_DTYPES.items() if dtype is str}
+    row.update({
+        'table_name': 'public.orders', 'index_name': index_name, 'qualified_name': f'public.{index_name}',
+        'table_oid': 1, 'columns': index_name, 'number_of_scans': number_of_scans, 'index_bytes': 8192,
+        'is_unique': False, 'is_primary': False, 'is_valid': True, 'backs_constraint': False,
+        'access_method': 'btree', 'key_count': 1, 'indkey': str(number_of_scans % 7 + 1),
+        'indclass': '1', 'indcollation': '0', 'index_writes': 0, 'stats_age_seconds': 400 * 86400.0
+    })
+    return row
+
+
+def record_checks(store, now, days, hours=6):
+    """Hourly-style checks every `hours` over `days`; orders_pkey is used throughout"""
+    written = 0
+    for step in range(int(days * 24 / hours) + 1):
+        checked_at = now - timedelta(days=days) + timedelta(hours=step * hours)
+        written += store.record_index_scans('dsn', pd.DataFrame({
+            'table_name': ['public.orders', 'public.orders'],
+            'index_name': ['orders_pkey', 'orders_legacy_idx'],
+            'number_of_scans': [90000 + step * 100, 5000],
+        }), checked_at)
+    return written
+
+
+def test_unused_check_uses_scan_history_of_indexes_outside_the_top_n(tmp_path):
+    store = HistoryStore(str(tmp_path / 'history.sqlite3'))
+    now = datetime.now()
+    # Heavily used before the checks started, idle for the 10 days since
+    written = record_checks(store, now, days=10)
+    # orders_pkey changes on every check; the idle index only gets a daily heartbeat
+    assert written == 41 + 11
+
+    indexes = pd.DataFrame([index_definition('orders_legacy_idx', 5000), index_definition('orders_pkey', 94000)])
+    health = IndexHealth('dsn', store)
+    findings = health.find_issues(indexes, now + timedelta(seconds=1))
+
+    assert findings['index_name'].tolist() == ['orders_legacy_idx']
+    assert findings['scans'].iloc[0] == 0
+    assert round(findings['observed_days'].iloc[0]) == 10
+    scans, _ = health._window_scans(indexes, now + timedelta(seconds=1))
+    assert scans.tolist() == [0, 4000]
+
+
+def test_window_starts_at_the_baseline_before_it(tmp_path):
+    store = HistoryStore(str(tmp_path / 'history.sqlite3'))
+    now = datetime.now()
+    record_checks(store, now, days=40, hours=12)
+
+    indexes = pd.DataFrame([index_definition('orders_legacy_idx', 5000)])
+    findings = IndexHealth('dsn', store).find_issues(indexes, now + timedelta(seconds=1))
+    assert round(findings['observed_days'].iloc[0]) == 30
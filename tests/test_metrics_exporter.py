@@ -0,0 +1,38 @@
+# tests/test_metrics_exporter.py
+from datetime import datetime
+from types import SimpleNamespace
+import pandas as pd
+from config.settings import settings
+from core.metrics_exporter import OTHER_LABEL, OpenMetricsExporter
+from tests.test_history_store import make_snapshot
+
+
+def exposition_for(snapshot, monkeypatch) -> str:
+    monkeypatch.setattr(settings, 'EXPORTER_MAX_TABLES', 1)
+    monkeypatch.setattr(settings, 'EXPORTER_MAX_INDEXES', 1)
+    store = SimpleNamespace(latest=lambda: snapshot, last_error=None, error_count=0)
+    exporter = OpenMetricsExporter()
+    exporter.update('db', store)
+    return exporter.exposition().decode()
+
+
+def test_tail_is_folded_for_gauges_only(monkeypatch):
+    snapshot = make_snapshot(datetime.now())
+    snapshot.table_stats = pd.DataFrame({
+        'table_name': ['public.big', 'public.other', 'public.small'], 'row_count': [1, 2, 3],
+        'dead_tuples': [10, 20, 30], 'total_size': [300, 200, 100], 'table_size': [30, 20, 10]
+    })
+    snapshot.index_usage = pd.DataFrame({
+        'table_name': ['public.big', 'public.big'], 'index_name': ['big_pkey', 'other'],
+        'number_of_scans': [50, 5], 'tuples_read': [500, 50]
+    })
+    text = exposition_for(snapshot, monkeypatch)
+
+    assert f'dbmindful_table_dead_tuples{{target="db",table="{OTHER_LABEL}"}} 50' in text
+    assert f'dbmindful_table_total_size_bytes{{target="db",table="{OTHER_LABEL}"}} 300' in text
+    counters = [line for line in text.splitlines() if line.startswith(('dbmindful_table_seq', 'dbmindful_index'))]
+    assert counters == [
+        'dbmindful_table_seq_tuples_read_total{target="db",table="public.big"} 1',
+        'dbmindful_index_scans_total{target="db",table="public.big",index="big_pkey"} 50',
+        'dbmindful_index_tuples_read_total{target="db",table="public.big",index="big_pkey"} 500',
+    ]
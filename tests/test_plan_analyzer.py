@@ -0,0 +1,36 @@
+# tests/test_plan_analyzer.py
+import pytest
+from core.plan_analyzer import PlanAnalyzer
+
+
+class RecordingCursor:
+    """Stands in for a psycopg2 cursor and records what would have run"""
+
+    def __init__(self):
+        self.executed = []
+
+    def execute(self, query, vars=None):
+        self.executed.append(query)
+
+    def fetchone(self):
+        return [[{'Plan': {'Node Type': 'Result', 'Plan Rows': 1, 'Total Cost': 0.01}}]]
+
+
+@pytest.mark.parametrize('query', [
+    "SELECT 1; COMMIT; DROP TABLE t",
+    "SELECT 1; DELETE FROM t",
+    "WITH x AS (SELECT 1) SELECT * FROM x; COMMIT",
+])
+@pytest.mark.parametrize('analyze', [False, True])
+def test_multi_statement_text_is_rejected_before_anything_runs(query, analyze):
+    cur = RecordingCursor()
+    with pytest.raises(ValueError):
+        PlanAnalyzer.explain_with(cur, query, analyze=analyze)
+    assert cur.executed == []
+
+
+def test_single_statement_with_semicolons_in_literals_is_explained():
+    cur = RecordingCursor()
+    PlanAnalyzer.explain_with(cur, "SELECT ';' AS a, $$x;y$$ AS b;", analyze=True)
+    assert len(cur.executed) == 1
+    assert cur.executed[0].startswith("EXPLAIN (FORMAT JSON, VERBOSE, ANALYZE, BUFFERS) SELECT ';'")
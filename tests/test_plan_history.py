@@ -0,0 +1,121 @@
+# tests/test_plan_history.py
+import contextlib
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+import pandas as pd
+from core.db_monitor import DBMonitor
+from core.history_store import HistoryStore
+from core.plan_analyzer import Plan, PlanNode
+from core.plan_history import PlanTracker
+from core.snapshot import Snapshot
+from core.statement_deltas import COUNTER_COLUMNS, StatementDeltaEngine
+
+
+def make_plan(node_type: str) -> Plan:
+    document = {'Plan': {'Node Type': node_type, 'Relation Name': 't', 'Plan Rows': 10, 'Total Cost': 1.0}}
+    return Plan(root=PlanNode.from_json(document['Plan']), analyzed=False, planning_time=None,
+                execution_time=None, generic=False, raw=[document])
+
+
+class FakeAnalyzer:
+    def __init__(self):
+        self.explained = []
+
+    def explain(self, query):
+        self.explained.append(query)
+        return make_plan('Seq Scan')
+
+
+def test_flip_back_to_an_older_plan_alerts(tmp_path):
+    tracker = PlanTracker('dsn', history=HistoryStore(str(tmp_path / 'history.sqlite3')),
+                          plan_analyzer=FakeAnalyzer())
+    start = datetime(2024, 1, 1)
+    index_scan, seq_scan = make_plan('Index Scan'), make_plan('Seq Scan')
+    assert tracker.record(1, 'select', index_scan, 1.0, start) is None
+    assert tracker.record(1, 'select', seq_scan, 50.0, start + timedelta(minutes=5)) is not None
+    assert tracker.record(1, 'select', index_scan, 1.0, start + timedelta(minutes=10)) is None
+    # A -> B -> A -> B: B was seen before, but it is a change from the previous plan
+    alert = tracker.record(1, 'select', seq_scan, 50.0, start + timedelta(minutes=15))
+    assert alert is not None and alert['previous_hash'] == index_scan.structural_hash
+    # Same plan again is not a flip
+    assert tracker.record(1, 'select', seq_scan, 80.0, start + timedelta(minutes=20)) is None
+
+
+def test_basic_mode_texts_are_never_explained(tmp_path):
+    analyzer = FakeAnalyzer()
+    tracker = PlanTracker('dsn', history=HistoryStore(str(tmp_path / 'history.sqlite3')), plan_analyzer=analyzer)
+    snapshot = Snapshot(
+        collected_at=datetime(2024, 1, 1),
+        capabilities={'pg_stat_statements_enabled': False},
+        basic_stats={},
+        statements=pd.DataFrame({'queryid': [123], 'query_preview': ['select * from t where id = ?'],
+                                 'avg_exec_time': [5.0]}),
+        table_stats=pd.DataFrame(),
+        index_usage=pd.DataFrame(),
+    )
+    assert tracker.capture_top(snapshot) == []
+    assert analyzer.explained == []
+
+
+class FakeTexts:
+    """DatabaseConnection stand-in answering STATEMENT_TEXTS_SQL"""
+
+    def __init__(self, texts):
+        self.texts = texts
+
+    @contextlib.contextmanager
+    def get_connection(self, dsn):
+        texts = self.texts
+
+        class Cursor:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def execute(self, sql, params):
+                self.rows = [(q, texts[q]) for q in params['queryids'] if q in texts]
+
+            def fetchall(self):
+                return self.rows
+        yield SimpleNamespace(cursor=Cursor)
+
+
+def capture(tracker, queries, means):
+    delta = pd.DataFrame({'queryid': list(queries), 'query': list(queries.values()), 'mean_exec_time': means})
+    snapshot = Snapshot(collected_at=datetime(2024, 1, 1), capabilities={'pg_stat_statements_enabled': True},
+                        basic_stats={}, statements=pd.DataFrame(), table_stats=pd.DataFrame(),
+                        index_usage=pd.DataFrame())
+    tracker._last_capture = float('-inf')
+    return tracker.capture_top(snapshot, delta)
+
+
+def test_cut_off_texts_are_explained_in_full_or_skipped(tmp_path):
+    analyzer = FakeAnalyzer()
+    tracker = PlanTracker('dsn', history=HistoryStore(str(tmp_path / 'history.sqlite3')), plan_analyzer=analyzer)
+    long_text = 'select * from t where ' + ' and '.join(['a = 1'] * 500)
+    cut = long_text[:DBMonitor.QUERY_TEXT_LIMIT]
+    tracker.db_connection = FakeTexts({1: long_text})
+    capture(tracker, {1: cut, 2: cut, 3: 'select 1'}, [1.0, 2.0, 3.0])
+    # queryid 2's full text couldn't be read, so it isn't explained cut off
+    assert analyzer.explained == [long_text, 'select 1']
+
+
+def test_recent_mean_comes_from_the_latest_delta_window(tmp_path, monkeypatch):
+    tracker = PlanTracker('dsn', history=HistoryStore(str(tmp_path / 'history.sqlite3')),
+                          plan_analyzer=FakeAnalyzer())
+    engine = StatementDeltaEngine()
+    monkeypatch.setattr(StatementDeltaEngine, 'for_dsn', classmethod(lambda cls, dsn: engine))
+    assert tracker.recent_mean(1) is None
+
+    def sample(calls, exec_ms):
+        counters = pd.DataFrame({'userid': [10, 11], 'dbid': [1, 1], 'queryid': [1, 1]})
+        for column in COUNTER_COLUMNS:
+            counters[column] = 0.0
+        counters['calls'], counters['total_exec_time'] = calls, exec_ms
+        return counters
+    engine.add_sample(sample([100, 100], [10000.0, 10000.0]), datetime(2024, 1, 1))
+    engine.add_sample(sample([110, 130], [10020.0, 10100.0]), datetime(2024, 1, 1, 0, 1))
+    # 40 calls, 120 ms in the window; the all-time mean is about 84 ms
+    assert tracker.recent_mean(1) == 3.0
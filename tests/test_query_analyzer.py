@@ -0,0 +1,18 @@
+# tests/test_query_analyzer.py
+import pandas as pd
+from core.query_analyzer import QueryAnalyzer
+
+
+def test_workload_findings_are_ranked_by_execution_time():
+    statements = pd.DataFrame({
+        'queryid': [1, 2, 3, 4],
+        'query': ['SELECT * FROM orders WHERE id = $1', 'DELETE FROM sessions',
+                  'SELECT id FROM users WHERE id = 1', None],
+        'calls': [10, 1, 5, 1],
+        'total_exec_time': [30.0, 60.0, 9.0, 1.0],
+    })
+    findings = QueryAnalyzer().analyze_many(statements)
+
+    assert findings[['finding', 'queryid']].values.tolist() == [['missing_where', 2], ['select_star', 1]]
+    assert findings['workload_share'].tolist() == [0.6, 0.3]
+    assert QueryAnalyzer().analyze_many(statements.iloc[:0]).empty
@@ -0,0 +1,118 @@
+# tests/test_result_cache.py
+import threading
+import time
+import pandas as pd
+from models.result_cache import ResultCache
+
+
+def test_concurrent_misses_run_one_load():
+    cache = ResultCache({'heavy': 60})
+    calls, started, release = [], threading.Event(), threading.Event()
+
+    def load():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return pd.DataFrame({'calls': [1]})
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(cache.get('heavy', load)))
+    leader.start()
+    started.wait(5)
+    waiters = [threading.Thread(target=lambda: results.append(cache.get('heavy', load))) for _ in range(5)]
+    for waiter in waiters:
+        waiter.start()
+    time.sleep(0.05)
+    release.set()
+    for thread in [leader, *waiters]:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert len(results) == 6 and all(result['calls'].tolist() == [1] for result in results)
+    # Every caller gets its own copy of the shared frame
+    assert len({id(result) for result in results}) == 6
+
+
+def test_failed_loads_reach_waiters_and_are_not_cached():
+    cache = ResultCache({'heavy': 60})
+    started, release = threading.Event(), threading.Event()
+
+    def failing():
+        started.set()
+        release.wait(5)
+        raise RuntimeError("connection refused")
+
+    errors = []
+
+    def call():
+        try:
+            cache.get('heavy', failing)
+        except RuntimeError as e:
+            errors.append(e)
+
+    leader = threading.Thread(target=call)
+    leader.start()
+    started.wait(5)
+    waiter = threading.Thread(target=call)
+    waiter.start()
+    time.sleep(0.05)
+    release.set()
+    leader.join(5)
+    waiter.join(5)
+
+    assert [str(e) for e in errors] == ["connection refused"] * 2
+    assert cache.get('heavy', lambda: 'recovered') == 'recovered'
+
+
+def test_entries_expire_and_uncached_methods_always_load():
+    cache = ResultCache({'heavy': 0.05})
+    assert cache.get('heavy', lambda: 1) == 1
+    assert cache.get('heavy', lambda: 2) == 1
+    time.sleep(0.06)
+    assert cache.get('heavy', lambda: 3) == 3
+    assert cache.get('other', lambda: 4) == 4
+    assert cache.get('other', lambda: 5) == 5
+
+
+def test_arguments_are_part_of_the_key():
+    cache = ResultCache({'page': 60})
+    assert cache.get('page', lambda: 'first', 0) == 'first'
+    assert cache.get('page', lambda: 'second', 1) == 'second'
+    assert cache.get('page', lambda: 'ignored', 0) == 'first'
+
+
+def test_invalidate_drops_only_the_given_methods():
+    cache = ResultCache({'heavy': 60, 'probe': 60})
+    cache.get('heavy', lambda: 'old')
+    cache.get('probe', lambda: 'capability')
+    cache.invalidate('heavy')
+    assert cache.get('heavy', lambda: 'new') == 'new'
+    assert cache.get('probe', lambda: 'reloaded') == 'capability'
+
+
+def test_a_load_started_before_invalidation_is_not_stored():
+    cache = ResultCache({'heavy': 60})
+
+    def stale_load():
+        # The database changed (e.g. a stats reset) while this load ran
+        cache.invalidate()
+        return 'stale'
+
+    assert cache.get('heavy', stale_load) == 'stale'
+    assert cache.get('heavy', lambda: 'fresh') == 'fresh'
+
+
+def test_drop_dsn_forgets_the_shared_cache():
+    cache = ResultCache.for_dsn('postgresql://a/db')
+    assert ResultCache.for_dsn('postgresql://a/db') is cache
+    ResultCache.drop_dsn('postgresql://a/db')
+    assert ResultCache.for_dsn('postgresql://a/db') is not cache
+
+
+def test_callers_cannot_mutate_cached_values():
+    cache = ResultCache({'frame': 60, 'document': 60})
+    frame, document = cache.get('frame', lambda: pd.DataFrame({'a': [1]})), cache.get('document', lambda: {'a': 1})
+    frame['a'] = 2
+    document['a'] = 2
+    assert cache.get('frame', lambda: None)['a'].tolist() == [1]
+    assert cache.get('document', lambda: None) == {'a': 1}
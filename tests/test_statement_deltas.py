@@ -0,0 +1,83 @@
+# tests/test_statement_deltas.py
+from datetime import datetime, timedelta
+import pandas as pd
+from core.statement_deltas import COUNTER_COLUMNS, StatementDeltaEngine
+
+
+def counters(*rows) -> pd.DataFrame:
+    """(queryid, calls, total_exec_time) rows as a pg_stat_statements sample"""
+    return pd.DataFrame([{column: 0 for column in COUNTER_COLUMNS} | {
+        'userid': 10, 'dbid': 5, 'queryid': queryid, 'query': f'SELECT {queryid}',
+        'calls': calls, 'total_exec_time': total_exec_time, 'rows': calls,
+    } for queryid, calls, total_exec_time in rows])
+
+
+def test_deltas_between_the_latest_two_samples():
+    engine = StatementDeltaEngine()
+    start = datetime(2026, 1, 1)
+    engine.add_sample(counters((1, 100, 1000.0), (2, 50, 50.0)), start)
+    assert engine.window_delta() is None
+    engine.add_sample(counters((1, 110, 1500.0), (2, 50, 50.0)), start + timedelta(seconds=10))
+
+    delta = engine.window_delta()
+    # Unchanged statements have no calls in the interval and are left out
+    assert delta['queryid'].tolist() == [1]
+    row = delta.iloc[0]
+    assert (row['calls'], row['total_exec_time'], row['mean_exec_time']) == (10, 500.0, 50.0)
+    assert row['calls_per_sec'] == 1.0 and not row['restarted']
+
+
+def test_counters_that_went_backwards_count_from_zero():
+    # The entry was evicted and re-added (or reset) between samples
+    delta = StatementDeltaEngine.diff(
+        counters((1, 500, 5000.0)).set_index(['userid', 'dbid', 'queryid']),
+        counters((1, 20, 100.0)).set_index(['userid', 'dbid', 'queryid']), 10.0
+    )
+    assert delta['calls'].tolist() == [20] and delta['total_exec_time'].tolist() == [100.0]
+    assert delta['restarted'].tolist() == [True]
+
+
+def test_new_and_evicted_entries():
+    previous = counters((1, 100, 100.0), (2, 100, 100.0)).set_index(['userid', 'dbid', 'queryid'])
+    current = counters((1, 150, 150.0), (3, 7, 70.0)).set_index(['userid', 'dbid', 'queryid'])
+    delta = StatementDeltaEngine.diff(previous, current, 10.0).set_index('queryid')
+
+    assert delta.loc[3, 'calls'] == 7 and delta.loc[3, 'restarted']
+    assert delta.loc[1, 'calls'] == 50 and not delta.loc[1, 'restarted']
+    assert 2 not in delta.index
+    assert delta.attrs['evicted'] == 1
+
+
+def test_stats_reset_drops_older_samples():
+    engine = StatementDeltaEngine()
+    start = datetime(2026, 1, 1)
+    first_reset, second_reset = datetime(2025, 12, 1), datetime(2026, 1, 1, 0, 0, 15)
+    engine.add_sample(counters((1, 100, 1000.0)), start, first_reset)
+    engine.add_sample(counters((1, 120, 1200.0)), start + timedelta(seconds=10), first_reset)
+    engine.add_sample(counters((1, 3, 30.0)), start + timedelta(seconds=20), second_reset)
+
+    assert engine.sample_count() == 1
+    assert engine.window_delta() is None
+    engine.add_sample(counters((1, 8, 80.0)), start + timedelta(seconds=30), second_reset)
+    assert engine.window_delta()['calls'].tolist() == [5]
+
+
+def test_window_delta_uses_the_newest_sample_at_or_before_the_window():
+    engine = StatementDeltaEngine()
+    start = datetime(2026, 1, 1)
+    for minute in range(6):
+        engine.add_sample(counters((1, 100 * minute, 10.0 * minute)), start + timedelta(minutes=minute))
+
+    delta = engine.window_delta(timedelta(minutes=3))
+    assert delta['calls'].tolist() == [300]
+    assert delta.attrs['interval_seconds'] == 180
+    # A window longer than the history falls back to the oldest sample
+    assert engine.window_delta(timedelta(hours=1))['calls'].tolist() == [500]
+
+
+def test_nested_rows_of_one_statement_are_summed():
+    engine = StatementDeltaEngine()
+    start = datetime(2026, 1, 1)
+    engine.add_sample(counters((1, 10, 10.0), (1, 5, 5.0)), start)
+    engine.add_sample(counters((1, 20, 20.0), (1, 5, 5.0)), start + timedelta(seconds=10))
+    assert engine.window_delta()['calls'].tolist() == [10]
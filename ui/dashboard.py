@@ -1,246 +1,886 @@
-# ui/dashboard.py
-import streamlit as st
-import plotly.express as px
-from datetime import datetime
-from core.db_monitor import DBMonitor
-from core.query_analyzer import QueryAnalyzer
-from core.ai_service import AIService
-
-class Dashboard:
-    def __init__(self):
-        self.db_monitor = DBMonitor()
-        self.query_analyzer = QueryAnalyzer()
-        self.ai_service = AIService()
-        self.init_session_state()
-
-    def init_session_state(self):
-        """Initialize session state variables"""
-        if 'last_refresh' not in st.session_state:
-            st.session_state.last_refresh = datetime.now()
-
-    def render_header(self):
-        """Render the dashboard header"""
-        col1, col2, col3, col4 = st.columns([2,1,1,1])
-        with col1:
-            st.title("🔍 Database AI Monitor")
-        with col2:
-            st.write("")
-            st.write("Last refresh:", st.session_state.last_refresh.strftime("%H:%M:%S"))
-        with col3:
-            st.write("")
-            if st.button("🔄 Refresh Data"):
-                st.session_state.last_refresh = datetime.now()
-                st.rerun()
-        with col4:
-            st.write("")
-            if st.button("🗑️ Reset Stats"):
-                self.db_monitor.reset_query_stats()
-                st.success("Query statistics reset successfully!")
-                st.rerun()
-
-
-    def render_monitoring_status(self):
-        """Render monitoring prerequisites status"""
-        st.subheader("Monitoring Status")
-        status = self.db_monitor.get_monitoring_status()
-        
-        if 'error' in status:
-            st.error(f"Error checking monitoring status: {status['error']}")
-            return
-            
-        # Display monitoring level
-        cols = st.columns(4)
-        with cols[0]:
-            st.metric(
-                "Monitoring Level",
-                status.get('monitoring_level', 'Unknown')
-            )
-        with cols[1]:
-            st.metric(
-                "Database Size",
-                status.get('database_size', 'Unknown')
-            )
-        with cols[2]:
-            st.metric(
-                "Table Count",
-                status.get('table_count', 'Unknown')
-            )
-        with cols[3]:
-            st.metric(
-                "Active Connections",
-                status.get('active_connections', 'Unknown')
-            )
-        
-        # Show appropriate message based on monitoring level
-        if status.get('monitoring_level') == 'Basic':
-            st.info("""
-                Running in basic monitoring mode. Some advanced features are limited.
-                Basic statistics and active query monitoring are available.
-            """)
-        elif status.get('monitoring_level') == 'Full':
-            st.success("Full monitoring capabilities are enabled.")
-
-    def render_query_analysis(self):
-        """Render the query analysis section"""
-        st.header("Query Analysis")
-        
-        # Add monitoring status at the top
-        self.render_monitoring_status()
-        
-        try:
-            df = self.db_monitor.get_heavy_queries()
-            
-            # Metrics summary
-            col1, col2, col3 = st.columns(3)
-            with col1:
-                st.metric("Total Queries Analyzed", len(df))
-            with col2:
-                if not df.empty:
-                    st.metric("Slowest Query Time", f"{df['total_exec_time'].max():.2f}ms")
-            with col3:
-                if not df.empty:
-                    st.metric("Avg Query Time", f"{df['avg_exec_time'].mean():.2f}ms")
-
-            # Heavy queries table with AI analysis
-            st.subheader("Heavy Queries")
-            for idx, row in df.iterrows():
-                with st.expander(f"Query {idx + 1}: {row['query_preview']}"):
-                    st.code(row['query_preview'], language='sql')
-                    
-                    # Basic stats and analysis
-                    col1, col2 = st.columns(2)
-                    with col1:
-                        st.write(f"Calls: {row['calls']}")
-                        st.write(f"Total Time: {row['total_exec_time']:.2f}ms")
-                        st.write(f"Avg Time: {row['avg_exec_time']:.2f}ms")
-                    with col2:
-                        analysis = self.query_analyzer.analyze_query(row['query_preview'])
-                        st.write(f"Complexity: {analysis['complexity']}")
-                        st.write("Suggestions:")
-                        for suggestion in analysis['suggested_improvements']:
-                            st.write(f"- {suggestion}")
-                    
-                    # Deep analysis button
-                    if st.button("🔍 Analisi Approfondita", key=f"deep_analysis_{idx}"):
-                        with st.spinner("Analisi approfondita in corso..."):
-                            try:
-                                ai_analysis = self.ai_service.deep_analyze_query(
-                                    row['query_preview'], 
-                                    row['total_exec_time']
-                                )
-                                
-                                if 'error' in ai_analysis:
-                                    st.error(f"Errore nell'analisi: {ai_analysis['error']}")
-                                else:
-                                    response = ai_analysis['choices'][0]['message']['content']
-                                    st.markdown("### 🔍 Analisi Dettagliata")
-                                    st.markdown(response)
-                                    
-                                    # Add a divider for better readability
-                                    st.markdown("---")
-                                    
-                                    # Add disclaimer about AI-generated content
-                                    st.info("Questa analisi è generata da un modello AI e dovrebbe essere " 
-                                        "considerata come uno strumento di supporto alla decisione, "
-                                        "non come una raccomandazione definitiva.")
-                                    
-                            except Exception as e:
-                                st.error(f"Errore durante l'analisi approfondita: {str(e)}")
-
-            # Query execution time chart
-            if not df.empty:
-                fig = px.bar(
-                    df,
-                    x='query_preview',
-                    y='total_exec_time',
-                    title='Query Execution Times',
-                    labels={'query_preview': 'Query', 'total_exec_time': 'Total Execution Time (ms)'}
-                )
-                st.plotly_chart(fig, use_container_width=True)
-
-        except Exception as e:
-            st.error(f"Error fetching query data: {str(e)}")
-
-    def render_table_analysis(self):
-        """Render the table analysis section"""
-        st.header("Table Analysis")
-        try:
-            df = self.db_monitor.get_table_stats()
-            
-            # Table statistics
-            st.subheader("Table Statistics")
-            st.dataframe(
-                df,
-                column_config={
-                    "table_name": "Table Name",
-                    "row_count": "Live Rows",
-                    "dead_tuples": "Dead Tuples",
-                    "total_size": "Total Size",
-                    "table_size": "Table Size",
-                    "index_size": "Index Size"
-                },
-                hide_index=True
-            )
-
-            # Table size distribution chart
-            fig = px.pie(
-                df,
-                names='table_name',
-                values='row_count',
-                title='Table Size Distribution (by row count)'
-            )
-            st.plotly_chart(fig, use_container_width=True)
-
-        except Exception as e:
-            st.error(f"Error fetching table data: {str(e)}")
-
-    def render_index_analysis(self):
-        """Render the index analysis section"""
-        st.header("Index Analysis")
-        try:
-            df = self.db_monitor.get_index_usage()
-            
-            # Index statistics
-            st.subheader("Index Usage Statistics")
-            st.dataframe(
-                df,
-                column_config={
-                    "table_name": "Table",
-                    "index_name": "Index",
-                    "number_of_scans": "Scans",
-                    "tuples_read": "Tuples Read",
-                    "tuples_fetched": "Tuples Fetched",
-                    "index_size": "Size"
-                },
-                hide_index=True
-            )
-
-            # Index usage chart
-            fig = px.bar(
-                df,
-                x='index_name',
-                y='number_of_scans',
-                color='table_name',
-                title='Index Usage Frequency',
-                labels={'index_name': 'Index', 'number_of_scans': 'Number of Scans'}
-            )
-            st.plotly_chart(fig, use_container_width=True)
-
-        except Exception as e:
-            st.error(f"Error fetching index data: {str(e)}")
-
-    def render(self):
-        """Main render method"""
-        self.render_header()
-        
-        # Create tabs
-        tab1, tab2, tab3 = st.tabs(["Query Analysis", "Table Analysis", "Index Analysis"])
-        
-        with tab1:
-            self.render_query_analysis()
-        
-        with tab2:
-            self.render_table_analysis()
-            
-        with tab3:
-            self.render_index_analysis()
\ No newline at end of file
+# ui/dashboard.py
+import streamlit as st
+import pandas as pd
+import json
+import plotly.express as px
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+from core.db_monitor import DBMonitor
+from core.sampler import MetricsSampler
+from core.history_store import HistoryStore
+from core.query_analyzer import QueryAnalyzer
+from core.ai_service import AIService
+from core.plan_analyzer import PlanAnalyzer
+from core.plan_history import PlanTracker
+from core.index_advisor import IndexAdvisor
+from core.index_health import IndexHealth
+from core.bloat import BloatEstimator
+from core.ash import ActiveSessionHistory
+from core.tracing import Tracer, traced
+from config.settings import settings
+from utils.helpers import OTHER, fold_tail
+
+TABLE_COLUMN_LABELS = {
+    "table_name": "Table Name",
+    "partitions": "Partitions",
+    "row_count": "Live Rows",
+    "dead_tuples": "Dead Tuples",
+    "total_size": "Total Size",
+    "table_size": "Table Size",
+    "index_size": "Index Size"
+}
+
+# Label -> panel name (render_<name>, PANEL_REFRESH_SECONDS key)
+PANELS = {
+    "Query Analysis": 'query_analysis',
+    "Table Analysis": 'table_analysis',
+    "Index Analysis": 'index_analysis',
+    "Trends": 'trends'
+}
+DEFAULT_PANEL = "Query Analysis"
+# Hidden unless the dashboard is opened with ?diagnostics=1
+DIAGNOSTICS_PANEL = {"Diagnostics": 'diagnostics'}
+
+INDEX_COLUMN_LABELS = {
+    "table_name": "Table",
+    "index_name": "Index",
+    "partitions": "Partitions",
+    "number_of_scans": "Scans",
+    "tuples_read": "Tuples Read",
+    "tuples_fetched": "Tuples Fetched",
+    "index_size": "Size",
+    "index_size_bytes": "Size (bytes)"
+}
+
+class Dashboard:
+    def __init__(self, dsn: Optional[str] = None):
+        # The DSN is passed in rather than read from settings, so sessions
+        # watching different databases don't race on a process-wide value
+        self.dsn = dsn or settings.DATABASE_URL
+        self.db_monitor = DBMonitor(self.dsn)
+        self.sampler = MetricsSampler.for_dsn(self.dsn)
+        self.delta_engine = self.sampler.store.delta_engine
+        self.ash = ActiveSessionHistory.for_dsn(self.dsn) if settings.ASH_ENABLED else None
+        self.snapshot = None
+        self.query_analyzer = QueryAnalyzer()
+        self.plan_analyzer = PlanAnalyzer(self.dsn)
+        self.index_advisor = IndexAdvisor(self.dsn)
+        self.bloat_estimator = BloatEstimator(self.dsn)
+        self.index_health = IndexHealth(
+            self.dsn, HistoryStore.shared() if settings.HISTORY_ENABLED else None
+        )
+        self.ai_service = AIService()
+
+    @traced('ui')
+    def render_header(self):
+        """Render the dashboard header"""
+        col1, col2, col3, col4 = st.columns([2,1,1,1])
+        with col1:
+            st.title("🔍 Database AI Monitor")
+        with col2:
+            st.write("")
+            if self.snapshot is not None:
+                st.write("Last sample:", self.snapshot.collected_at.strftime("%H:%M:%S"))
+        with col3:
+            st.write("")
+            if st.button("🔄 Refresh Data"):
+                # Ask the sampler for a fresh sample and wait briefly for it
+                self.sampler.trigger()
+                self.sampler.store.wait_for_sample(newer_than=self.snapshot, timeout=15)
+                st.rerun()
+        with col4:
+            st.write("")
+            if st.button("🗑️ Reset Stats"):
+                self.db_monitor.reset_query_stats()
+                self.sampler.trigger()
+                st.success("Query statistics reset successfully!")
+                st.rerun()
+
+
+    @traced('ui')
+    def render_monitoring_status(self):
+        """Render monitoring prerequisites status"""
+        st.subheader("Monitoring Status")
+        status = self.snapshot.monitoring_status
+        
+        if 'error' in status:
+            st.error(f"Error checking monitoring status: {status['error']}")
+            return
+            
+        # Display monitoring level
+        cols = st.columns(4)
+        with cols[0]:
+            st.metric(
+                "Monitoring Level",
+                status.get('monitoring_level', 'Unknown')
+            )
+        with cols[1]:
+            st.metric(
+                "Database Size",
+                status.get('database_size', 'Unknown')
+            )
+        with cols[2]:
+            st.metric(
+                "Table Count",
+                status.get('table_count', 'Unknown')
+            )
+        with cols[3]:
+            st.metric(
+                "Active Connections",
+                status.get('active_connections', 'Unknown')
+            )
+        if self.sampler.guard is not None:
+            st.caption(self.sampler.guard.describe())
+        
+        # Show appropriate message based on monitoring level
+        if status.get('monitoring_level') == 'Basic':
+            st.info("""
+                Running in basic monitoring mode. Some advanced features are limited.
+                Basic statistics and active query monitoring are available.
+            """)
+        elif status.get('monitoring_level') == 'Full':
+            st.success("Full monitoring capabilities are enabled.")
+
+    @traced('ui')
+    def render_query_analysis(self):
+        """Render the query analysis section"""
+        st.header("Query Analysis")
+        
+        # Add monitoring status at the top
+        self.render_monitoring_status()
+        self.render_plan_alerts()
+        
+        try:
+            df = self.snapshot.statements
+            
+            # Metrics summary
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                st.metric("Total Queries Analyzed", len(df))
+            with col2:
+                if not df.empty:
+                    st.metric("Slowest Query Time", f"{df['total_exec_time'].max():.2f}ms")
+            with col3:
+                if not df.empty:
+                    st.metric("Avg Query Time", f"{df['avg_exec_time'].mean():.2f}ms")
+
+            if self.snapshot.monitoring_status.get('pg_stat_statements_enabled'):
+                self.render_statement_rates()
+            self.run_fragment('session_activity', self.render_session_activity)
+
+            # Heavy queries table with AI analysis; each expander is its own
+            # fragment, so its buttons rerun just that query
+            st.subheader("Heavy Queries")
+            for idx, row in df.iterrows():
+                with st.expander(f"Query {idx + 1}: {row['query_preview']}"):
+                    self.run_fragment('heavy_query', self.render_heavy_query, idx, row)
+
+            # Query execution time chart
+            if not df.empty:
+                fig = px.bar(
+                    df,
+                    x='query_preview',
+                    y='total_exec_time',
+                    title='Query Execution Times',
+                    labels={'query_preview': 'Query', 'total_exec_time': 'Total Execution Time (ms)'}
+                )
+                st.plotly_chart(fig, use_container_width=True)
+
+            self.render_workload_audit()
+
+        except Exception as e:
+            st.error(f"Error fetching query data: {str(e)}")
+
+    @traced('ui')
+    def render_heavy_query(self, idx: int, row):
+        """Render one heavy query: stats, static analysis, plan and AI deep analysis"""
+        st.code(row['query_preview'], language='sql')
+        
+        # Basic stats and analysis
+        col1, col2 = st.columns(2)
+        with col1:
+            st.write(f"Calls: {row['calls']}")
+            st.write(f"Total Time: {row['total_exec_time']:.2f}ms")
+            st.write(f"Avg Time: {row['avg_exec_time']:.2f}ms")
+        with col2:
+            analysis = self.query_analyzer.analyze_query(row['query_preview'])
+            st.write(f"Complexity: {analysis['complexity']}")
+            st.write("Suggestions:")
+            for suggestion in analysis['suggested_improvements']:
+                st.write(f"- {suggestion}")
+        
+        plan_summary = self.render_plan(idx, row)
+
+        # Deep analysis button; the result is kept so panel refreshes don't clear it
+        result_key = f"deep_analysis_result_{idx}"
+        if st.button("🔍 Analisi Approfondita", key=f"deep_analysis_{idx}"):
+            try:
+                st.markdown("### 🔍 Analisi Dettagliata")
+                cached = self.ai_service.cached_deep_analysis(row['query_preview'], row['total_exec_time'],
+                                                              plan_summary)
+                if cached:
+                    st.caption("Risultato dalla cache delle analisi")
+                    response = cached['choices'][0]['message']['content']
+                    st.markdown(response)
+                else:
+                    # Render chunks as they arrive instead of waiting for the full completion
+                    placeholder = st.empty()
+                    placeholder.caption("Analisi approfondita in corso...")
+                    response = ""
+                    for chunk in self.ai_service.stream_deep_analyze_query(
+                        row['query_preview'],
+                        row['total_exec_time'],
+                        plan_summary,
+                        check_cache=False
+                    ):
+                        response += chunk
+                        placeholder.markdown(response + "▌")
+                    placeholder.markdown(response)
+                st.session_state[result_key] = (row['query_preview'], response)
+                self.render_ai_disclaimer()
+
+            except Exception as e:
+                st.error(f"Errore durante l'analisi approfondita: {str(e)}")
+
+        elif st.session_state.get(result_key, (None, None))[0] == row['query_preview']:
+            st.markdown("### 🔍 Analisi Dettagliata")
+            st.markdown(st.session_state[result_key][1])
+            self.render_ai_disclaimer()
+
+    @staticmethod
+    def render_ai_disclaimer():
+        # Add a divider for better readability
+        st.markdown("---")
+
+        # Add disclaimer about AI-generated content
+        st.info("Questa analisi è generata da un modello AI e dovrebbe essere " 
+            "considerata come uno strumento di supporto alla decisione, "
+            "non come una raccomandazione definitiva.")
+
+    @traced('ui')
+    def render_plan(self, idx: int, row) -> Optional[str]:
+        """Render plan capture for one heavy query; returns the plan summary for the AI prompt"""
+        query = row['query_preview']
+        analyze = st.checkbox(
+            "Run EXPLAIN ANALYZE (executes the query inside a rolled-back transaction)",
+            key=f"plan_analyze_{idx}"
+        )
+        if st.button("📋 Explain Plan", key=f"explain_{idx}"):
+            try:
+                plan = self.plan_analyzer.explain(query, analyze=analyze)
+                hotspots = self.plan_analyzer.find_hotspots(plan)
+                st.session_state[f"plan_{idx}"] = (query, plan, hotspots)
+                # Plain EXPLAINs are what the sampler records too, so they share the
+                # history; like the sampler's, the mean is the latest delta window's
+                if not analyze and settings.HISTORY_ENABLED and pd.notna(row.get('queryid')):
+                    tracker = PlanTracker.for_dsn(self.dsn)
+                    alert = tracker.record(int(row['queryid']), query, plan, tracker.recent_mean(int(row['queryid'])))
+                    if alert is not None:
+                        st.warning("New plan with a jump in mean execution time: possible plan regression.")
+            except Exception as e:
+                st.error(f"Error capturing plan: {str(e)}")
+
+        captured = st.session_state.get(f"plan_{idx}")
+        if captured is None or captured[0] != query:
+            return None
+        _, plan, hotspots = captured
+
+        if settings.HISTORY_ENABLED and pd.notna(row.get('queryid')):
+            plans = HistoryStore.shared().plan_history(self.dsn, int(row['queryid']))
+            st.caption(f"Plan {plan.structural_hash} - {len(plans)} distinct plan(s) recorded for this statement")
+        if plan.generic:
+            st.caption("Generic plan for the parameterized statement (estimates only)")
+        elif plan.execution_time is not None:
+            st.caption(f"Planning {plan.planning_time:.1f}ms, execution {plan.execution_time:.1f}ms")
+        for hotspot in hotspots:
+            (st.error if hotspot.severity == 'high' else st.warning)(f"**{hotspot.node}**: {hotspot.message}")
+        if not hotspots:
+            st.success("No plan hotspots found.")
+        st.dataframe(
+            plan.to_frame(),
+            column_config={
+                "node": "Node",
+                "estimated_rows": st.column_config.NumberColumn("Est. Rows", format="%.0f"),
+                "actual_rows": st.column_config.NumberColumn("Actual Rows", format="%.0f"),
+                "loops": "Loops",
+                "self_time": st.column_config.NumberColumn("Self Time (ms)", format="%.2f"),
+                "total_cost": st.column_config.NumberColumn("Cost", format="%.1f"),
+                "shared_hit": "Buffers Hit",
+                "shared_read": "Buffers Read"
+            },
+            hide_index=True
+        )
+        return self.plan_analyzer.summarize(plan, hotspots)
+
+    @traced('ui')
+    def render_workload_audit(self):
+        """Render the workload-wide audit of every tracked statement"""
+        st.subheader("Workload Audit")
+        if st.button("🧪 Run Workload Audit"):
+            with st.spinner("Analyzing the full statement set..."):
+                statements = self.db_monitor.get_workload_statements()
+                findings = self.query_analyzer.analyze_many(statements)
+                st.session_state.workload_audit = (len(statements), findings)
+
+        if 'workload_audit' not in st.session_state:
+            st.caption("Audits every statement in pg_stat_statements, ranked by execution time.")
+            return
+
+        analyzed, findings = st.session_state.workload_audit
+        st.caption(f"{analyzed} statements analyzed, {findings['query'].nunique()} with findings")
+        if findings.empty:
+            st.success("No findings in the current workload.")
+            return
+
+        st.dataframe(
+            self.query_analyzer.summarize_findings(findings),
+            column_config={
+                "finding": None,
+                "description": "Finding",
+                "statements": "Statements",
+                "calls": "Calls",
+                "total_exec_time": st.column_config.NumberColumn("Total Time (ms)", format="%.2f"),
+                "workload_share": st.column_config.ProgressColumn("Share of Workload", min_value=0.0, max_value=1.0)
+            },
+            hide_index=True
+        )
+        st.dataframe(
+            findings[['description', 'query', 'calls', 'total_exec_time', 'workload_share', 'complexity']].head(200),
+            column_config={
+                "description": "Finding",
+                "query": "Query",
+                "calls": "Calls",
+                "total_exec_time": st.column_config.NumberColumn("Total Time (ms)", format="%.2f"),
+                "workload_share": st.column_config.NumberColumn("Share", format="%.3f"),
+                "complexity": "Complexity"
+            },
+            hide_index=True
+        )
+
+        # Batch AI review of the statements behind most of the flagged time
+        top = findings.drop_duplicates('query').head(5)
+        if st.button("🤖 Analisi AI delle query principali"):
+            with st.spinner("Analisi AI in corso..."):
+                results = self.ai_service.analyze_many(top['query'].tolist(), top['total_exec_time'].tolist())
+            for query, result in zip(top['query'], results):
+                with st.expander(query[:100]):
+                    if 'error' in result:
+                        st.error(f"Errore nell'analisi: {result['error']}")
+                    else:
+                        st.markdown(result['choices'][0]['message']['content'])
+
+    @traced('ui')
+    def render_plan_alerts(self):
+        """Render plan regressions detected in the last 24 hours"""
+        if not (settings.HISTORY_ENABLED and settings.PLAN_TRACKING_ENABLED):
+            return
+        try:
+            alerts = HistoryStore.shared().plan_alerts(self.dsn, datetime.now() - timedelta(hours=24))
+        except Exception as e:
+            st.error(f"Error reading plan alerts: {str(e)}")
+            return
+        for alert in alerts.itertuples():
+            st.warning(
+                f"**Plan regression** (queryid {alert.queryid}, {alert.detected_at:%Y-%m-%d %H:%M}): "
+                f"plan {alert.previous_hash} → {alert.plan_hash}, mean time "
+                f"{alert.previous_mean_exec_time:.2f}ms → {alert.mean_exec_time:.2f}ms\n\n`{alert.query[:200]}`"
+            )
+
+    @traced('ui')
+    def render_statement_rates(self):
+        """Render per-interval statement rates computed from counter deltas"""
+        st.subheader("Statement Rates")
+        windows = {
+            "Since last refresh": None,
+            "Last 5 minutes": timedelta(minutes=5),
+            "Last 15 minutes": timedelta(minutes=15),
+            "Last hour": timedelta(hours=1),
+        }
+        window = st.selectbox("Rate window", list(windows), key="rate_window")
+        delta = self.delta_engine.window_delta(windows[window])
+
+        if delta is None:
+            st.info("Rates will appear after the next refresh (two samples are needed).")
+            return
+
+        st.caption(
+            f"Interval: {delta.attrs['interval_seconds']:.0f}s - "
+            f"{len(delta)} active statements, {delta.attrs['evicted']} evicted since baseline"
+        )
+        st.dataframe(
+            delta[['query', 'calls', 'calls_per_sec', 'exec_ms_per_sec', 'mean_exec_time',
+                   'rows_per_sec', 'blks_read_per_sec']].head(50),
+            column_config={
+                "query": "Query",
+                "calls": "Calls",
+                "calls_per_sec": st.column_config.NumberColumn("Calls/s", format="%.2f"),
+                "exec_ms_per_sec": st.column_config.NumberColumn("Exec ms/s", format="%.2f"),
+                "mean_exec_time": st.column_config.NumberColumn("Mean Time (ms)", format="%.2f"),
+                "rows_per_sec": st.column_config.NumberColumn("Rows/s", format="%.1f"),
+                "blks_read_per_sec": st.column_config.NumberColumn("Blocks Read/s", format="%.1f")
+            },
+            hide_index=True
+        )
+
+    @traced('ui')
+    def render_session_activity(self):
+        """Render where database time goes, from the 1 Hz session samples"""
+        if self.ash is None:
+            return
+        st.subheader("Session Activity")
+        windows = {"Last 5 minutes": 300, "Last 15 minutes": 900, "Last hour": 3600, "Everything sampled": None}
+        window = windows[st.selectbox("Activity window", list(windows), key="ash_window")]
+        if self.ash.last_error:
+            st.warning(f"Session sampling is failing: {self.ash.last_error}")
+
+        by_wait = self.ash.db_time_by_wait_class(window)
+        if by_wait.empty:
+            st.info("No active sessions sampled yet.")
+            return
+
+        col1, col2 = st.columns(2)
+        col1.metric("Avg Active Sessions", f"{by_wait['avg_active_sessions'].sum():.2f}")
+        col2.metric("DB Time", f"{by_wait['db_time_seconds'].sum():,.0f}s")
+        fig = px.bar(
+            by_wait.groupby('wait_class', as_index=False)['db_time_seconds'].sum(),
+            x='wait_class',
+            y='db_time_seconds',
+            title='DB Time by Wait Class',
+            labels={'wait_class': 'Wait Class', 'db_time_seconds': 'Seconds'}
+        )
+        st.plotly_chart(fig, use_container_width=True)
+
+        st.dataframe(
+            self.ash.top_waiting_fingerprints(window),
+            column_config={
+                "fingerprint": None,
+                "query": "Query",
+                "db_time_seconds": st.column_config.NumberColumn("DB Time (s)", format="%.0f"),
+                "wait_seconds": st.column_config.NumberColumn("Waiting (s)", format="%.0f"),
+                "top_wait_event": "Top Wait Event",
+                "wait_share": st.column_config.NumberColumn("Wait Share", format="%.2f")
+            },
+            hide_index=True
+        )
+
+        blocking = self.ash.blocking_summary(window)
+        if not blocking.empty:
+            st.markdown("**Blocking sessions**")
+            st.dataframe(
+                blocking,
+                column_config={
+                    "root_pid": "Blocker PID",
+                    "root_state": "Blocker State",
+                    "root_query": "Blocker Query",
+                    "blocked_seconds": st.column_config.NumberColumn("Session Time Blocked (s)", format="%.0f"),
+                    "max_blocked_sessions": "Max Sessions Blocked",
+                    "last_seen": "Last Seen"
+                },
+                hide_index=True
+            )
+            tree = self.ash.blocking_tree()
+            if not tree.empty:
+                st.caption("Current blocking tree")
+                st.code('\n'.join(
+                    f"{'    ' * row.depth}{row.pid} [{row.state}, {row.wait_event}] {row.query[:120]}"
+                    for row in tree.itertuples()
+                ))
+
+    @traced('ui')
+    def render_table_analysis(self):
+        """Render the table analysis section"""
+        st.header("Table Analysis")
+        try:
+            # Table statistics
+            st.subheader("Table Statistics")
+            df, sort = self.render_relation_page(
+                'tables', TABLE_COLUMN_LABELS, DBMonitor.TABLE_SORT_COLUMNS,
+                self.snapshot.table_stats, self.db_monitor.get_table_stats
+            )
+            st.dataframe(
+                df,
+                column_config=TABLE_COLUMN_LABELS,
+                column_order=[c for c in TABLE_COLUMN_LABELS if c in df],
+                hide_index=True
+            )
+
+            # Table size distribution chart; the long tail becomes one "other" slice
+            if not df.empty:
+                chart = fold_tail(df, 'table_name', sort, settings.CHART_MAX_CATEGORIES,
+                                  total=df['total_value'].iloc[0])
+                fig = px.pie(
+                    chart,
+                    names='table_name',
+                    values=sort,
+                    title=f'Table Distribution (by {TABLE_COLUMN_LABELS[sort].lower()})'
+                )
+                st.plotly_chart(fig, use_container_width=True)
+
+        except Exception as e:
+            st.error(f"Error fetching table data: {str(e)}")
+
+        self.render_maintenance()
+
+    @traced('ui')
+    def render_maintenance(self):
+        """Render estimated bloat as a prioritized vacuum/reindex worklist"""
+        st.subheader("Bloat & Vacuum Worklist")
+        if st.button("🧽 Estimate Bloat"):
+            with st.spinner("Estimating table and index bloat..."):
+                try:
+                    st.session_state.maintenance_worklist = self.bloat_estimator.worklist()
+                except Exception as e:
+                    st.error(f"Error estimating bloat: {str(e)}")
+
+        worklist = st.session_state.get('maintenance_worklist')
+        if worklist is None:
+            st.caption("Estimates bloat from catalog statistics and ranks VACUUM/REINDEX work by the space it frees.")
+            return
+        if worklist.empty:
+            st.success("No overdue vacuums or significant bloat found.")
+            return
+
+        summary = BloatEstimator.summarize(worklist)
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Actions", summary['actions'])
+        col2.metric("Reclaimable Space", f"{summary['reclaimable_bytes'] / 1024 ** 2:,.1f} MB")
+        col3.metric("Overdue Vacuums", summary['overdue_vacuums'])
+        st.caption("Estimates assume average tuple widths from pg_stats; ANALYZE tables for accurate figures.")
+        st.dataframe(
+            worklist,
+            column_config={
+                "priority": "Priority",
+                "kind": "Type",
+                "table_name": "Table",
+                "index_name": "Index",
+                "action": "Action",
+                "reason": "Reason",
+                "reclaimable_bytes": st.column_config.NumberColumn("Reclaimable (bytes)", format="%.0f"),
+                "bloat_ratio": st.column_config.NumberColumn("Bloat", format="%.2f"),
+                "n_dead_tup": st.column_config.NumberColumn("Dead Tuples", format="%.0f"),
+                "vacuum_threshold": st.column_config.NumberColumn("Autovacuum Threshold", format="%.0f"),
+                "last_autovacuum": "Last Autovacuum",
+                "vacuum_phase": "Vacuum Running"
+            },
+            hide_index=True
+        )
+
+    @traced('ui')
+    def render_relation_page(self, kind: str, labels: Dict[str, str], sort_columns: List[str],
+                             sampled: pd.DataFrame, fetch: Callable[..., pd.DataFrame]) -> Tuple[pd.DataFrame, str]:
+        """Search/sort/partition controls plus keyset paging for a statistics table.
+
+        The first page in the default order comes from the sample; anything
+        else is one bounded query, so the page size, not the schema, sets
+        the cost of a render.
+        """
+        col1, col2, col3 = st.columns([2, 1, 1])
+        search = col1.text_input("Search", key=f"{kind}_search", placeholder="schema.name")
+        sort = col2.selectbox("Sort by", sort_columns, format_func=labels.get, key=f"{kind}_sort")
+        with col3:
+            st.write("")
+            rollup = st.checkbox("Roll up partitions", key=f"{kind}_rollup")
+
+        # Keyset cursors of the pages visited so far; a new query starts over
+        query = (self.dsn, search, sort, rollup)
+        if st.session_state.get(f"{kind}_query") != query:
+            st.session_state[f"{kind}_query"] = query
+            st.session_state[f"{kind}_cursors"] = [None]
+        cursors = st.session_state[f"{kind}_cursors"]
+
+        page_size = settings.STATS_PAGE_SIZE
+        if cursors[-1] is None and not search and not rollup and sort == sort_columns[0] and 'key' in sampled:
+            df = sampled.head(page_size)
+            if self.snapshot.relation_subsets > 1:
+                st.caption(f"Guarded collector: each sample reads 1/{self.snapshot.relation_subsets} of "
+                           f"relations, so rows can be up to {self.snapshot.relation_subsets} samples old")
+        else:
+            df = fetch(sort=sort, limit=page_size, search=search or None, after=cursors[-1],
+                       rollup_partitions=rollup)
+
+        total = int(df['total_count'].iloc[0]) if not df.empty else 0
+        first = (len(cursors) - 1) * page_size
+        col1, col2, col3 = st.columns([1, 4, 1])
+        # Callbacks move the cursor before the panel reruns, so a click costs
+        # one page query and no extra rerun
+        col1.button("◀ Previous", key=f"{kind}_previous", disabled=len(cursors) == 1, on_click=cursors.pop)
+        col2.caption(f"Rows {first + 1 if total else 0}–{first + len(df)} of {total}")
+        col3.button("Next ▶", key=f"{kind}_next", disabled=first + len(df) >= total,
+                    on_click=lambda: cursors.append(DBMonitor.next_page_after(df, sort)))
+        return df, sort
+
+    @traced('ui')
+    def render_index_analysis(self):
+        """Render the index analysis section"""
+        st.header("Index Analysis")
+        try:
+            # Index statistics
+            st.subheader("Index Usage Statistics")
+            df, sort = self.render_relation_page(
+                'indexes', INDEX_COLUMN_LABELS, DBMonitor.INDEX_SORT_COLUMNS,
+                self.snapshot.index_usage, self.db_monitor.get_index_usage
+            )
+            st.dataframe(
+                df,
+                column_config=INDEX_COLUMN_LABELS,
+                column_order=[c for c in INDEX_COLUMN_LABELS if c in df and c != 'index_size_bytes'],
+                hide_index=True
+            )
+
+            # Index usage chart; indexes past the top few are summed into "other"
+            if not df.empty:
+                chart = fold_tail(df, 'index_name', sort, settings.CHART_MAX_CATEGORIES,
+                                  total=df['total_value'].iloc[0])
+                chart['table_name'] = chart['table_name'].fillna(OTHER)
+                fig = px.bar(
+                    chart,
+                    x='index_name',
+                    y=sort,
+                    color='table_name',
+                    title=f'Index Usage ({INDEX_COLUMN_LABELS[sort]})',
+                    labels={'index_name': 'Index', sort: INDEX_COLUMN_LABELS[sort], 'table_name': 'Table'}
+                )
+                st.plotly_chart(fig, use_container_width=True)
+
+        except Exception as e:
+            st.error(f"Error fetching index data: {str(e)}")
+
+        self.render_index_health()
+        self.render_index_advisor()
+
+    @traced('ui')
+    def render_index_health(self):
+        """Render invalid, duplicate, redundant and unused indexes"""
+        st.subheader("Index Health")
+        if st.button("🧹 Find Unneeded Indexes"):
+            with st.spinner("Comparing index definitions and usage..."):
+                try:
+                    st.session_state.index_health = self.index_health.find_issues()
+                except Exception as e:
+                    st.error(f"Error checking index health: {str(e)}")
+
+        issues = st.session_state.get('index_health')
+        if issues is None:
+            st.caption("Finds indexes that slow down writes and take space without serving reads.")
+            return
+        if issues.empty:
+            st.success("No invalid, duplicate, redundant or unused indexes found.")
+            return
+
+        summary = IndexHealth.summarize(issues)
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Indexes to Review", summary['indexes'])
+        col2.metric("Reclaimable Space", f"{summary['bytes_reclaimable'] / 1024 ** 2:,.1f} MB")
+        col3.metric("Index Writes Saved / Day", f"{summary['writes_per_day_saved']:,.0f}")
+        st.caption("Usage counts come from this server only; check replicas before dropping an unused index.")
+        st.dataframe(
+            issues.drop(columns=['index_bytes']),
+            column_config={
+                "kind": "Issue",
+                "table_name": "Table",
+                "index_name": "Index",
+                "columns": "Columns",
+                "covered_by": "Covered By",
+                "scans": st.column_config.NumberColumn("Scans", format="%.0f"),
+                "observed_days": st.column_config.NumberColumn("Observed (days)", format="%.1f"),
+                "index_size": "Size",
+                "writes_per_day": st.column_config.NumberColumn("Writes / Day", format="%.0f"),
+                "reason": "Reason",
+                "action": "Action"
+            },
+            hide_index=True
+        )
+
+    @traced('ui')
+    def render_index_advisor(self):
+        """Render workload-weighted index recommendations"""
+        st.subheader("Index Advisor")
+        if st.button("💡 Recommend Indexes"):
+            with st.spinner("Analyzing workload predicates and column statistics..."):
+                try:
+                    statements = self.db_monitor.get_workload_statements()
+                    st.session_state.index_advice = self.index_advisor.recommend(statements)
+                except Exception as e:
+                    st.error(f"Error computing index recommendations: {str(e)}")
+
+        advice = st.session_state.get('index_advice')
+        if advice is None:
+            st.caption("Suggests indexes for the heaviest statements, ranked by the execution time they could save.")
+            return
+        if advice.empty:
+            st.success("No missing indexes found for the current workload.")
+            return
+        if advice['validated_benefit_ms'].isna().all():
+            st.caption("Estimates from column statistics; install hypopg to validate them against the planner.")
+        st.dataframe(
+            advice,
+            column_config={
+                "table": "Table",
+                "columns": "Columns",
+                "definition": "Definition",
+                "statements": "Statements",
+                "calls": "Calls",
+                "estimated_benefit_ms": st.column_config.NumberColumn("Est. Savings (ms)", format="%.0f"),
+                "validated_benefit_ms": st.column_config.NumberColumn("Validated Savings (ms)", format="%.0f"),
+                "uses_index": st.column_config.CheckboxColumn("Planner Uses It"),
+                "selectivity": st.column_config.NumberColumn("Selectivity", format="%.5f"),
+                "table_rows": st.column_config.NumberColumn("Table Rows", format="%.0f"),
+                "example_query": "Example Query"
+            },
+            hide_index=True
+        )
+
+    @traced('ui')
+    def render_trends(self):
+        """Render historical trends from the on-disk history store"""
+        st.header("Trends")
+        if not settings.HISTORY_ENABLED:
+            st.info("History recording is disabled (HISTORY_ENABLED).")
+            return
+
+        ranges = {
+            "Last hour": timedelta(hours=1),
+            "Last 6 hours": timedelta(hours=6),
+            "Last 24 hours": timedelta(hours=24),
+            "Last 7 days": timedelta(days=7),
+            "Last 30 days": timedelta(days=30),
+        }
+        selected = st.selectbox("Time range", list(ranges), key="trend_range")
+        start = datetime.now() - ranges[selected]
+
+        try:
+            history = HistoryStore.shared()
+            basic = history.basic_series(self.dsn, start)
+            if basic.empty:
+                st.info("No history recorded yet for this database.")
+                return
+
+            col1, col2 = st.columns(2)
+            with col1:
+                fig = px.line(basic, x='bucket', y='active_connections', title='Active Connections',
+                              labels={'bucket': 'Time', 'active_connections': 'Connections'})
+                st.plotly_chart(fig, use_container_width=True)
+            with col2:
+                fig = px.line(basic, x='bucket', y='database_size_bytes', title='Database Size',
+                              labels={'bucket': 'Time', 'database_size_bytes': 'Size (bytes)'})
+                st.plotly_chart(fig, use_container_width=True)
+
+            top = history.top_statements(self.dsn, start, limit=5)
+            if not top.empty:
+                st.subheader("Top Statements")
+                st.dataframe(
+                    top,
+                    column_config={
+                        "queryid": "Query ID",
+                        "query": "Query",
+                        "calls": "Calls",
+                        "total_exec_time": st.column_config.NumberColumn("Total Time (ms)", format="%.2f"),
+                        "mean_exec_time": st.column_config.NumberColumn("Mean Time (ms)", format="%.2f")
+                    },
+                    hide_index=True
+                )
+                series = history.statement_series(self.dsn, start, queryids=top['queryid'].tolist())
+                fig = px.line(
+                    series,
+                    x='bucket',
+                    y='exec_ms_per_sec',
+                    color=series['queryid'].astype(str),
+                    title='Execution Time Rate',
+                    labels={'bucket': 'Time', 'exec_ms_per_sec': 'Exec ms/s', 'color': 'Query ID'}
+                )
+                st.plotly_chart(fig, use_container_width=True)
+
+        except Exception as e:
+            st.error(f"Error reading history: {str(e)}")
+
+    @traced('ui')
+    def render(self):
+        """Main render method"""
+        # Render from the sampler's latest snapshot; only the very first
+        # render for a DSN has to wait for the database
+        store = self.sampler.store
+        self.snapshot = store.latest()
+        if self.snapshot is None:
+            with st.spinner("Collecting first sample..."):
+                self.snapshot = store.wait_for_sample(timeout=30)
+
+        self.render_header()
+
+        if self.snapshot is None:
+            st.error(f"Error collecting database snapshot: {store.last_error or 'timed out'}")
+            return
+        if store.last_error:
+            st.warning(f"Showing the last good sample; latest collection failed: {store.last_error}")
+        
+        # Only the selected panel runs: unlike st.tabs, whose bodies all
+        # execute on every rerun
+        panels = {**PANELS, **DIAGNOSTICS_PANEL} if st.query_params.get('diagnostics') else PANELS
+        panel = st.segmented_control(
+            "Panel", list(panels), default=DEFAULT_PANEL, key="dashboard_panel", label_visibility="collapsed"
+        )
+        name = panels.get(panel) or PANELS[DEFAULT_PANEL]
+        self.run_fragment(name, getattr(self, f"render_{name}"))
+
+    @traced('ui')
+    def render_diagnostics(self):
+        """Render where time goes in this process: DB, pandas, sqlparse, AI or the UI itself"""
+        st.header("Diagnostics")
+        tracer = Tracer.shared()
+        if not settings.TRACING_ENABLED:
+            st.info("Tracing is disabled (TRACING_ENABLED).")
+        summary = tracer.summary()
+        if summary.empty:
+            st.info("No spans recorded yet.")
+            return
+
+        st.caption(f"Last {len(tracer.spans())} spans (of at most {settings.TRACE_BUFFER_SPANS}) "
+                   "from every session in this process. Spans nest, so parents include their children.")
+        col1, col2 = st.columns([3, 1])
+        with col2:
+            st.download_button(
+                "⬇️ Chrome trace",
+                json.dumps(tracer.chrome_trace()),
+                file_name=f"dbmindful-trace-{datetime.now():%Y%m%d-%H%M%S}.json",
+                mime="application/json",
+                help="Open in chrome://tracing or ui.perfetto.dev"
+            )
+            st.button("Clear spans", on_click=tracer.clear)
+        with col1:
+            by_category = summary.groupby('category')['total_ms'].sum().sort_values(ascending=False)
+            st.bar_chart(by_category, y_label="Total ms")
+
+        st.subheader("By Span")
+        st.dataframe(
+            summary,
+            column_config={
+                "category": "Category",
+                "name": "Span",
+                "calls": "Calls",
+                "total_ms": st.column_config.NumberColumn("Total (ms)", format="%.1f"),
+                "mean_ms": st.column_config.NumberColumn("Mean (ms)", format="%.2f"),
+                "p95_ms": st.column_config.NumberColumn("p95 (ms)", format="%.2f"),
+                "max_ms": st.column_config.NumberColumn("Max (ms)", format="%.1f"),
+                "rows": st.column_config.NumberColumn("Rows", format="%.0f"),
+                "bytes": st.column_config.NumberColumn("Bytes", format="%.0f"),
+                "cache_hits": "Cache Hits",
+                "cache_misses": "Cache Misses"
+            },
+            hide_index=True
+        )
+
+        st.subheader("Slowest Recent Spans")
+        st.dataframe(tracer.frame().nlargest(50, 'duration_ms'), hide_index=True)
+
+    def run_fragment(self, name: str, render: Callable, *args):
+        """Run render(*args) as a fragment refreshed every PANEL_REFRESH_SECONDS[name].
+
+        Widgets inside a fragment rerun only that fragment, so using one
+        panel (or one heavy query) doesn't re-render the rest of the page.
+        """
+        interval = settings.PANEL_REFRESH_SECONDS.get(name) or None
+        st.fragment(self._fragment, run_every=interval)(render, *args)
+
+    def _fragment(self, render: Callable, *args):
+        # Fragment reruns skip render(), so pick up samples published since
+        self.snapshot = self.sampler.store.latest() or self.snapshot
+        render(*args)
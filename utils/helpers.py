@@ -0,0 +1,28 @@
+# utils/helpers.py
+import pandas as pd
+from typing import List, Optional
+
+OTHER = 'other'  # label of the row a long tail is folded into
+
+
+def fold_tail(df: pd.DataFrame, key: str, by: str, limit: int,
+              sums: Optional[List[str]] = None, total: Optional[float] = None,
+              label: str = OTHER) -> pd.DataFrame:
+    """Keep the top `limit` rows by `by` and fold the rest into one `label` row.
+
+    The folded row sums the `sums` columns (default: just `by`). When `df` is
+    itself a page of a larger set, pass the set's `total` of `by` so the
+    folded row covers the rows that were never fetched as well.
+    """
+    sums = sums or [by]
+    if len(df) <= limit and total is None:
+        return df
+    df = df.sort_values(by, ascending=False)
+    head, tail = df.head(limit), df.iloc[limit:]
+    other = {column: tail[column].sum() for column in sums}
+    if total is not None:
+        other[by] = total - head[by].sum()
+    if not any(other.values()):
+        return head
+    other[key] = label
+    return pd.concat([head, pd.DataFrame([other])], ignore_index=True)